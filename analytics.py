@@ -0,0 +1,225 @@
+from sqlalchemy import delete, select
+from models import MarketAggregate, Property, dialect_insert
+from ingest import OFF_MARKET_STATUS, SCRAPED_COLUMNS
+import numpy as np
+import pandas as pd
+
+# Property columns the aggregates are computed from
+ANALYTICS_COLUMNS = ['city', 'zip_code', 'property_type', 'estdist', 'list_price', 'sqft', 'status']
+
+# Ways listings are grouped; 'all' is a single group covering every listing
+DIMENSIONS = ('all', 'city', 'zip_code', 'property_type', 'estdist_band')
+
+# estdist bands are this many miles wide: 1-5, 6-10, ...
+ESTDIST_BAND_MILES = 5
+
+# Each price bucket spans a factor of this, so a median read from the buckets is
+# within about 1% of the exact one
+PRICE_BUCKET_RATIO = 1.02
+NO_PRICE_BUCKET = -1
+
+SUM_COLUMNS = ['listings', 'price_sum', 'sqft_listings', 'sqft_price_sum', 'sqft_sum']
+KEY_COLUMNS = ['dimension', 'group_key', 'price_bucket']
+
+# Rows per chunk when rebuilding from the properties table
+REBUILD_CHUNK_SIZE = 50_000
+
+def price_buckets(prices):
+    """Log-spaced bucket of each list price; NO_PRICE_BUCKET where there is none"""
+    prices = pd.to_numeric(prices, errors='coerce')
+    priced = prices > 0
+    buckets = np.full(len(prices), NO_PRICE_BUCKET, dtype=np.int64)
+    buckets[priced.to_numpy()] = np.rint(np.log(prices[priced].to_numpy(dtype=float)) / np.log(PRICE_BUCKET_RATIO))
+    return buckets
+
+def bucket_price(bucket):
+    """The price a bucket stands for (its geometric center)"""
+    return PRICE_BUCKET_RATIO ** bucket
+
+def estdist_bands(estdist):
+    """'1-5', '6-10', ... label of each estdist, or None"""
+    estdist = pd.to_numeric(estdist, errors='coerce')
+    start = ((estdist - 1) // ESTDIST_BAND_MILES).clip(lower=0) * ESTDIST_BAND_MILES + 1
+    labels = start.map(lambda value: None if pd.isna(value) else f"{int(value)}-{int(value) + ESTDIST_BAND_MILES - 1}")
+    return labels.astype(object)
+
+def aggregate_rows(properties):
+    """Aggregate rows (KEY_COLUMNS + SUM_COLUMNS) for a frame of ANALYTICS_COLUMNS.
+
+    Off-market listings are left out, as are listings missing a dimension's value
+    from that dimension's groups.
+    """
+    properties = properties[properties['status'].astype(object) != OFF_MARKET_STATUS]
+    if properties.empty:
+        return pd.DataFrame(columns=KEY_COLUMNS + SUM_COLUMNS)
+
+    price = pd.to_numeric(properties['list_price'], errors='coerce')
+    sqft = pd.to_numeric(properties['sqft'], errors='coerce')
+    priced = price > 0
+    with_sqft = priced & (sqft > 0)
+    values = pd.DataFrame({
+        'price_bucket': price_buckets(price),
+        'listings': 1,
+        'price_sum': price.where(priced, 0).astype('int64'),
+        'sqft_listings': with_sqft.astype('int64'),
+        'sqft_price_sum': price.where(with_sqft, 0).astype('int64'),
+        'sqft_sum': sqft.where(with_sqft, 0).astype('int64'),
+    }, index=properties.index)
+
+    keys = {
+        'all': pd.Series('', index=properties.index, dtype=object),
+        'city': properties['city'].astype(object),
+        'zip_code': properties['zip_code'].astype(object),
+        'property_type': properties['property_type'].astype(object),
+        'estdist_band': estdist_bands(properties['estdist']),
+    }
+    parts = []
+    for dimension in DIMENSIONS:
+        group_keys = keys[dimension]
+        present = group_keys.notna()
+        parts.append(values[present].assign(dimension=dimension, group_key=group_keys[present]))
+    rows = pd.concat(parts, ignore_index=True)
+    return rows.groupby(KEY_COLUMNS, as_index=False, sort=False)[SUM_COLUMNS].sum()
+
+def stored_values(changed, previous):
+    """ANALYTICS_COLUMNS of changed rows as upsert_properties stores them.
+
+    A missing scraped value keeps the stored one, and estdist keeps the stored
+    distance from when the listing was first seen.
+    """
+    merged = changed.reindex(columns=['property_id'] + ANALYTICS_COLUMNS).merge(
+        previous[['property_id'] + ANALYTICS_COLUMNS], on='property_id', suffixes=('', '_old'))
+    stored = pd.DataFrame({'property_id': merged['property_id']})
+    for column in ANALYTICS_COLUMNS:
+        new, old = merged[column], merged[f'{column}_old']
+        if column in SCRAPED_COLUMNS:
+            stored[column] = new.where(new.notna(), old)
+        else:
+            stored[column] = old.where(old.notna(), new)
+    return stored
+
+def update_market_aggregates(db, previous, current):
+    """Move listings' contributions from their previous values to their current ones, in db's transaction.
+
+    previous and current are frames of ANALYTICS_COLUMNS (previous is empty for new
+    listings). Call before db.commit() so the aggregates change atomically with the rows.
+    """
+    removed = aggregate_rows(previous)
+    removed[SUM_COLUMNS] = -removed[SUM_COLUMNS].astype('int64')
+    deltas = pd.concat([aggregate_rows(current), removed], ignore_index=True)
+    if deltas.empty:
+        return
+    deltas = deltas.groupby(KEY_COLUMNS, as_index=False, sort=False)[SUM_COLUMNS].sum()
+    deltas = deltas[(deltas[SUM_COLUMNS] != 0).any(axis=1)]
+    if deltas.empty:
+        return
+
+    table = MarketAggregate.__table__
+    stmt = dialect_insert(table, db.get_bind().dialect.name)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=KEY_COLUMNS,
+        set_={column: table.c[column] + stmt.excluded[column] for column in SUM_COLUMNS}
+    ), deltas.to_dict('records'))
+    db.execute(delete(table).where(table.c.listings <= 0))
+
+def compute_market_aggregates(conn):
+    """Aggregate rows for every stored listing, read from properties in chunks"""
+    table = Property.__table__
+    query = select(*[table.c[column] for column in ANALYTICS_COLUMNS])
+    parts = [aggregate_rows(chunk) for chunk in
+             pd.read_sql(query, conn, chunksize=REBUILD_CHUNK_SIZE, dtype=object)]
+    if not parts:
+        return pd.DataFrame(columns=KEY_COLUMNS + SUM_COLUMNS)
+    rows = pd.concat(parts, ignore_index=True)
+    return rows.groupby(KEY_COLUMNS, as_index=False)[SUM_COLUMNS].sum()
+
+def rebuild_market_aggregates(conn):
+    """Replace the stored aggregates with ones recomputed from every listing"""
+    rows = compute_market_aggregates(conn)
+    conn.execute(delete(MarketAggregate))
+    if not rows.empty:
+        conn.execute(MarketAggregate.__table__.insert(), rows.to_dict('records'))
+    return len(rows)
+
+def load_market_aggregates(conn, dimension=None):
+    """Stored aggregate rows, for one dimension or all of them"""
+    query = select(MarketAggregate.__table__)
+    if dimension is not None:
+        query = query.where(MarketAggregate.dimension == dimension)
+    result = conn.execute(query)
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+def check_market_aggregates(conn):
+    """Stored aggregate rows that differ from a full recomputation, with both values"""
+    expected = compute_market_aggregates(conn)
+    stored = load_market_aggregates(conn)
+    merged = expected.merge(stored, on=KEY_COLUMNS, how='outer', suffixes=('_expected', '_stored'))
+    merged = merged.fillna({f'{column}_{side}': 0 for column in SUM_COLUMNS for side in ('expected', 'stored')})
+    differs = np.zeros(len(merged), dtype=bool)
+    for column in SUM_COLUMNS:
+        differs |= (merged[f'{column}_expected'].astype('int64') != merged[f'{column}_stored'].astype('int64')).to_numpy()
+    return merged[differs]
+
+def _bucket_medians(priced):
+    """Median price of each group from its (price_bucket, listings) histogram rows"""
+    priced = priced.sort_values(['group_key', 'price_bucket'])
+    running = priced.groupby('group_key')['listings'].cumsum()
+    middle = (priced.groupby('group_key')['listings'].transform('sum') + 1) / 2
+    median_rows = priced[running >= middle].groupby('group_key')['price_bucket'].first()
+    return bucket_price(median_rows.astype(float))
+
+def market_groups(rows):
+    """Per-group analytics from a dimension's aggregate rows, computed across all groups at once"""
+    if rows.empty:
+        return []
+    totals = rows.groupby('group_key')[SUM_COLUMNS].sum()
+    priced = rows[rows['price_bucket'] != NO_PRICE_BUCKET]
+    priced_listings = priced.groupby('group_key')['listings'].sum().reindex(totals.index, fill_value=0)
+    medians = _bucket_medians(priced).reindex(totals.index)
+
+    groups = []
+    for group_key, total, priced_count, median in zip(totals.index, totals.itertuples(), priced_listings, medians):
+        groups.append({
+            'group': group_key,
+            'listings': int(total.listings),
+            'priced_listings': int(priced_count),
+            'median_list_price': int(round(median, -3)) if priced_count else None,
+            'mean_list_price': round(int(total.price_sum) / priced_count) if priced_count else None,
+            'price_per_sqft': round(int(total.sqft_price_sum) / int(total.sqft_sum), 2) if total.sqft_sum else None,
+        })
+    return groups
+
+def parse_group_by(group_by):
+    """The dimension to group analytics by, defaulting to city"""
+    group_by = group_by or 'city'
+    if group_by not in DIMENSIONS:
+        raise ValueError(f"group_by must be one of: {', '.join(DIMENSIONS)}")
+    return group_by
+
+def sort_groups(groups, dimension):
+    """estdist bands nearest first; other groups with the most listings first"""
+    if dimension == 'estdist_band':
+        return sorted(groups, key=lambda group: int(group['group'].split('-')[0]))
+    return sorted(groups, key=lambda group: (-group['listings'], group['group']))
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    from models import engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Check or rebuild the market analytics aggregates')
+    parser.add_argument('command', choices=('check', 'rebuild'))
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        with engine.begin() as conn:
+            print(f"Rebuilt {rebuild_market_aggregates(conn)} aggregate rows")
+    else:
+        with engine.connect() as conn:
+            mismatches = check_market_aggregates(conn)
+        if mismatches.empty:
+            print("Market aggregates match the properties table")
+        else:
+            print(mismatches.to_string(index=False))
+            raise SystemExit(f"{len(mismatches)} aggregate rows differ from the properties table")
@@ -1,183 +1,208 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file
 from flask_cors import CORS
-from models import Property, Settings, SessionLocal, create_tables
-from scraper import scraper
-import atexit
+from models import Property, PropertyHistory, ReadSessionLocal, ScrapeRun, SearchLocation, SessionLocal, create_tables
+from scraper import scraper, get_or_create_settings, LISTING_TYPES, SCRAPE_MODES
+from cache import cached_response, response_cache
+from metrics import PROPERTIES_STORED, observe_request_latency, render_metrics, start_request_timer
+from queries import CHANGES_DEFAULT_LIMIT, apply_property_filters, apply_sort_and_cursor, changes_since, paginate, parse_fields, parse_limit, parse_sort, rows_to_dicts, select_properties
+from responses import STREAM_BATCH_SIZE, compress_response, stream_properties, wants_ndjson
+from spatial import add_distance
+from photos import PHOTO_MAX_AGE, PHOTO_VERSIONED_MAX_AGE, PhotoFetchError, photo_cache, photo_mimetype
+from events import event_broadcaster, parse_last_event_id, record_favorite_event
+from export import parse_export_format, parse_export_table, stream_export
+from analytics import load_market_aggregates, market_groups, parse_group_by, sort_groups
+from stats import adjust_property_stats, parse_run_limit, property_counts, scrape_run_summary
+from search import decode_offset_cursor, encode_offset_cursor, parse_search_limit, search_properties, search_rows_to_dicts
 import logging
 import os
+import threading
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 CORS(app)  # Enable CORS for React frontend
+app.before_request(start_request_timer)
+app.after_request(observe_request_latency)  # Registered first so it runs last, timing compression too
+app.after_request(compress_response)  # gzip/brotli responses the client accepts
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize database and start scraper
-create_tables()
-
-def get_or_create_settings(db):
-    """Get settings from database or create default settings"""
-    settings = db.query(Settings).filter(Settings.id == 1).first()
-    if not settings:
-        # Create default settings
-        settings = Settings(
-            id=1,
-            update_interval=1,
-            search_radius=30,
-            search_time_range=365
-        )
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-    return settings
-
-# Load settings from database and update scraper
-db = SessionLocal()
-try:
-    settings = get_or_create_settings(db)
-    scraper.load_settings_from_db(settings.to_dict())
-finally:
-    db.close()
-
-scraper.start_scheduler()
-
-# Ensure scheduler stops when app shuts down
-def shutdown_scheduler():
-    scraper.stop_scheduler()
-
-atexit.register(shutdown_scheduler)
+# Database setup and settings are loaded on the first request rather than at import,
+# so web workers start fast. Scheduling happens in worker.py (or in the background when
+# run as python app.py), never in every web worker.
+_initialized = False
+_init_lock = threading.Lock()
+
+@app.before_request
+def ensure_initialized():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        create_tables()
+        db = SessionLocal()
+        try:
+            settings = get_or_create_settings(db)
+            scraper.load_settings_from_db(settings.to_dict())
+        finally:
+            db.close()
+        _initialized = True
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy"})
 
+def property_list_response(params, describe):
+    """Filter, sort, page and project properties into a JSON response.
+    
+    Paged requests (with a limit) are serialized in one go. Unpaged requests and
+    NDJSON requests are streamed from a server-side cursor so memory stays flat
+    however many rows match. describe(total) builds the response message.
+    """
+    fields = parse_fields(params.get('fields'))
+    sort_key, descending = parse_sort(params.get('sort'))
+    limit = parse_limit(params.get('limit'))
+    ndjson = wants_ndjson()
+    
+    db = ReadSessionLocal()
+    try:
+        query = apply_property_filters(select_properties(db, fields, sort_key), params)
+        query, fields, distance = add_distance(query, fields, params)
+        sort_column = None
+        if sort_key == 'distance':
+            if distance is None:
+                raise ValueError("Sorting by distance needs lat and lon")
+            # Properties without coordinates have no distance to sort by
+            query = query.filter(Property.latitude.isnot(None), Property.longitude.isnot(None))
+            sort_column = distance
+        
+        if limit is None or ndjson:
+            query = apply_sort_and_cursor(query, sort_key, descending, params.get('cursor'), sort_column)
+            if limit is not None:
+                query = query.limit(limit)
+            # The stream closes the session once it's done
+            return stream_properties(db, query.yield_per(STREAM_BATCH_SIZE), fields, describe, ndjson)
+        
+        try:
+            total_found = query.count()
+            rows, cursor = paginate(query, params, sort_column)
+        finally:
+            db.close()
+        
+        properties_list = rows_to_dicts(rows, fields)
+        return jsonify({
+            "properties": properties_list,
+            "total_found": total_found,
+            "next_cursor": cursor,
+            "message": describe(total_found)
+        })
+    except Exception:
+        db.close()
+        raise
+
 @app.route('/properties', methods=['GET'])
+@cached_response
 def get_all_properties():
-    """Get all properties from the database"""
+    """Get properties from the database, optionally filtered, sorted and paged"""
     try:
-        db = SessionLocal()
+        return property_list_response(request.args, lambda total: f"Loaded {total} properties from database")
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting all properties: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/properties/changes', methods=['GET'])
+@cached_response
+def get_property_changes():
+    """Get properties added, updated or taken off the market since a sync token, oldest change first"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit')) or CHANGES_DEFAULT_LIMIT
+        db = ReadSessionLocal()
         try:
-            # Get all properties
-            properties = db.query(Property).all()
-            properties_list = [prop.to_dict() for prop in properties]
-            
-            return jsonify({
-                "properties": properties_list,
-                "total_found": len(properties_list),
-                "message": f"Loaded {len(properties_list)} properties from database"
-            })
-            
+            rows, removed, next_token, has_more = changes_since(db, fields, request.args.get('since'), limit)
         finally:
             db.close()
         
+        return jsonify({
+            "properties": rows_to_dicts(rows, fields),
+            "removed": removed,
+            "next_token": next_token,
+            "has_more": has_more
+        })
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error getting all properties: {str(e)}")
+        logger.error(f"Error getting property changes: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/scrape', methods=['POST'])
 def get_properties():
     """Get filtered properties from the database"""
     try:
-        # Get filter parameters from request
-        data = request.get_json()
-        
-        # Extract filters with defaults
-        min_price = data.get('min_price', 0)
-        max_price = data.get('max_price', 10000000)
-        min_sqft = data.get('min_sqft', 0)
-        max_sqft = data.get('max_sqft', 10000)
-        min_lot_acre = data.get('min_lot_acre', 0)
-        max_lot_acre = data.get('max_lot_acre', 100)
-        min_beds = data.get('min_beds', 0)
-        max_beds = data.get('max_beds', 10)
-        min_baths = data.get('min_baths', 0)
-        max_baths = data.get('max_baths', 10)
-        min_stories = data.get('min_stories', 0)
-        max_stories = data.get('max_stories', 10)
-        min_garage = data.get('min_garage', 0)
-        max_garage = data.get('max_garage', 10)
-        min_distance = data.get('min_distance', 0)
-        max_distance = data.get('max_distance', 100)
-        
-        db = SessionLocal()
-        try:
-            # Build query with filters
-            query = db.query(Property)
-            
-            # Apply filters
-            if min_price > 0:
-                query = query.filter(Property.list_price >= min_price)
-            if max_price < 10000000:
-                query = query.filter(Property.list_price <= max_price)
-            if min_sqft > 0:
-                query = query.filter(Property.sqft >= min_sqft)
-            if max_sqft < 10000:
-                query = query.filter(Property.sqft <= max_sqft)
-            if min_lot_acre > 0:
-                query = query.filter(Property.lot_acre >= min_lot_acre)
-            if max_lot_acre < 100:
-                query = query.filter(Property.lot_acre <= max_lot_acre)
-            if min_beds > 0:
-                query = query.filter(Property.beds >= min_beds)
-            if max_beds < 10:
-                query = query.filter(Property.beds <= max_beds)
-            if min_baths > 0:
-                query = query.filter(Property.baths >= min_baths)
-            if max_baths < 10:
-                query = query.filter(Property.baths <= max_baths)
-            if min_stories > 0:
-                query = query.filter(Property.stories >= min_stories)
-            if max_stories < 10:
-                query = query.filter(Property.stories <= max_stories)
-            if min_garage > 0:
-                query = query.filter(Property.parking_garage >= min_garage)
-            if max_garage < 10:
-                query = query.filter(Property.parking_garage <= max_garage)
-            if min_distance > 0:
-                query = query.filter(Property.estdist >= min_distance)
-            if max_distance < 100:
-                query = query.filter(Property.estdist <= max_distance)
-            
-            # Execute query and convert to list of dictionaries
-            properties = query.all()
-            properties_list = [prop.to_dict() for prop in properties]
-            
-            return jsonify({
-                "properties": properties_list,
-                "total_found": len(properties_list),
-                "message": f"Found {len(properties_list)} properties matching your criteria from database"
-            })
-            
-        finally:
-            db.close()
+        # Filters, sort, limit and cursor come from the JSON body
+        data = request.get_json() or {}
+        return property_list_response(data, lambda total: f"Found {total} properties matching your criteria from database")
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting properties: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/manual-scrape', methods=['POST'])
 def manual_scrape():
-    """Manually trigger a property scrape"""
+    """Queue a manual property scrape and return its job id immediately"""
     try:
-        scraper.scrape_and_store_properties()
-        return jsonify({"message": "Manual scrape completed successfully"})
+        job, created = scraper.submit_scrape('manual')
+        message = "Manual scrape started" if created else f"A {job.trigger} scrape is already {job.status}"
+        return jsonify({
+            "message": message,
+            "job_id": job.id,
+            "created": created,
+            "job": job.to_dict()
+        }), 202
     except Exception as e:
         logger.error(f"Error during manual scrape: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/scrape-jobs', methods=['GET'])
+def list_scrape_jobs():
+    """Get recent scrape jobs, newest first"""
+    jobs = [job.to_dict() for job in scraper.list_jobs()]
+    return jsonify({"jobs": jobs, "total_found": len(jobs)})
+
+@app.route('/scrape-jobs/<job_id>', methods=['GET'])
+def get_scrape_job(job_id):
+    """Get the status and progress of a scrape job"""
+    job = scraper.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Scrape job not found"}), 404
+    return jsonify({"job": job.to_dict()})
+
 @app.route('/properties/favorite/<property_id>', methods=['PUT'])
 def toggle_favorite(property_id):
     """Toggle favorite status of a property"""
     try:
         db = SessionLocal()
         try:
+            # Bump first so the property row is stamped with (and locked after) the new generation
+            row_version = response_cache.bump_generation(db)
             property = db.query(Property).filter(Property.property_id == property_id).first()
             if not property:
+                db.rollback()
                 return jsonify({"error": "Property not found"}), 404
             
             # Toggle the favorite status
             property.favorited = not property.favorited
+            property.row_version = row_version
+            adjust_property_stats(db, favorited=1 if property.favorited else -1)
+            record_favorite_event(db, property.property_id, property.favorited)
             db.commit()
             
             return jsonify({
@@ -191,26 +216,135 @@ def toggle_favorite(property_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/properties/favorites', methods=['GET'])
+@cached_response
 def get_favorites():
     """Get all favorited properties"""
     try:
-        db = SessionLocal()
+        params = request.args.to_dict()
+        params['favorited'] = 'true'
+        return property_list_response(params, lambda total: f"Found {total} favorited properties")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting favorites: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/properties/search', methods=['GET'])
+@cached_response
+def search_properties_route():
+    """Full-text search of addresses, towns and descriptions, best match first.
+    
+    Accepts the same numeric and spatial filters as /properties, plus fields, limit and cursor.
+    """
+    try:
+        params = request.args.to_dict()
+        q = (params.get('q') or '').strip()
+        if not q:
+            return jsonify({"error": "Missing search query (q)"}), 400
+        fields = parse_fields(params.get('fields'))
+        limit = parse_search_limit(params.get('limit'))
+        offset = decode_offset_cursor(params.get('cursor'))
+        
+        db = ReadSessionLocal()
+        try:
+            query = search_properties(db, q, fields, params)
+            query, fields, _ = add_distance(query, fields, params)
+            total = query.order_by(None).count()
+            rows = query.offset(offset).limit(limit).all()
+            next_cursor = encode_offset_cursor(offset + limit) if offset + limit < total else None
+            return jsonify({
+                "properties": search_rows_to_dicts(rows, fields),
+                "total_found": total,
+                "next_cursor": next_cursor,
+                "message": f"Found {total} properties matching \"{q}\""
+            })
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching properties: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/properties/<property_id>', methods=['GET'])
+@cached_response
+def get_property(property_id):
+    """Get the full detail of a single property"""
+    try:
+        db = ReadSessionLocal()
+        try:
+            property = db.query(Property).filter(Property.property_id == property_id).first()
+            if not property:
+                return jsonify({"error": "Property not found"}), 404
+            
+            return jsonify({"property": property.to_dict()})
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Error getting property: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/properties/<property_id>/history', methods=['GET'])
+@cached_response
+def get_property_history(property_id):
+    """Get the recorded price/status changes of a property, oldest first"""
+    try:
+        db = ReadSessionLocal()
         try:
-            favorites = db.query(Property).filter(Property.favorited == True).all()
-            favorites_list = [prop.to_dict() for prop in favorites]
+            # Served from the (property_id, ts) index, no table scan
+            history = db.query(PropertyHistory).filter(
+                PropertyHistory.property_id == property_id
+            ).order_by(PropertyHistory.ts, PropertyHistory.id).all()
+            
+            if not history and not db.query(Property.property_id).filter(Property.property_id == property_id).first():
+                return jsonify({"error": "Property not found"}), 404
             
+            history_list = [entry.to_dict() for entry in history]
             return jsonify({
-                "properties": favorites_list,
-                "total_found": len(favorites_list),
-                "message": f"Found {len(favorites_list)} favorited properties"
+                "property_id": property_id,
+                "history": history_list,
+                "total_found": len(history_list)
             })
         finally:
             db.close()
     except Exception as e:
-        logger.error(f"Error getting favorites: {str(e)}")
+        logger.error(f"Error getting property history: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/photos/<property_id>', methods=['GET'])
+def get_photo(property_id):
+    """Serve a thumbnail of a property's primary photo from the local photo cache.
+    
+    Photos not cached yet are fetched on the spot. Responses may be cached by browsers
+    for PHOTO_MAX_AGE, or for good when requested with ?v=<version of the photo URL>.
+    """
+    try:
+        db = ReadSessionLocal()
+        try:
+            row = db.query(Property.primary_photo).filter(Property.property_id == property_id).first()
+        finally:
+            db.close()
+        if not row:
+            return jsonify({"error": "Property not found"}), 404
+        if not row.primary_photo:
+            return jsonify({"error": "Property has no photo"}), 404
+        
+        path, digest = photo_cache.get(row.primary_photo)
+        versioned = bool(request.args.get('v'))
+        response = send_file(path, mimetype=photo_mimetype(path), etag=digest, conditional=True,
+                             max_age=PHOTO_VERSIONED_MAX_AGE if versioned else PHOTO_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = versioned
+        return response
+    except PhotoFetchError as e:
+        logger.warning(f"Photo of property {property_id} unavailable: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        logger.error(f"Error serving photo of property {property_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/settings', methods=['GET'])
+@cached_response
 def get_settings():
     """Get current scraper settings"""
     try:
@@ -237,6 +371,7 @@ def update_settings():
         update_interval = data.get('updateInterval', 1)
         search_radius = data.get('searchRadius', 30)
         search_time_range = data.get('searchTimeRange', 365)
+        scrape_mode = data.get('scrapeMode')
         
         # Basic validation
         if not (1 <= update_interval <= 24):
@@ -245,6 +380,8 @@ def update_settings():
             return jsonify({"error": "Search radius must be between 1 and 100 miles"}), 400
         if not (1 <= search_time_range <= 1000):
             return jsonify({"error": "Search time range must be between 1 and 1000 days"}), 400
+        if scrape_mode is not None and scrape_mode not in SCRAPE_MODES:
+            return jsonify({"error": f"Scrape mode must be one of: {', '.join(SCRAPE_MODES)}"}), 400
         
         db = SessionLocal()
         try:
@@ -255,7 +392,10 @@ def update_settings():
             settings.update_interval = update_interval
             settings.search_radius = search_radius
             settings.search_time_range = search_time_range
+            if scrape_mode is not None:
+                settings.scrape_mode = scrape_mode
             
+            response_cache.bump_generation(db)
             db.commit()
             db.refresh(settings)
             
@@ -263,7 +403,8 @@ def update_settings():
             scraper.update_settings(
                 update_interval=update_interval,
                 search_radius=search_radius,
-                search_time_range=search_time_range
+                search_time_range=search_time_range,
+                scrape_mode=scrape_mode
             )
             
             return jsonify({
@@ -279,18 +420,27 @@ def update_settings():
 
 @app.route('/stats', methods=['GET'])
 def get_stats():
-    """Get database statistics"""
+    """Get database statistics from the stored counts and the scrape run ledger"""
     try:
-        db = SessionLocal()
+        db = ReadSessionLocal()
         try:
-            total_properties = db.query(Property).count()
-            recent_properties = db.query(Property).filter(
-                Property.last_updated >= Property.first_seen
-            ).count()
+            total_properties, favorited = property_counts(db)
+            last_run = db.query(ScrapeRun).order_by(ScrapeRun.started_at.desc(), ScrapeRun.id.desc()).first()
+            last_success = last_run
+            if last_run is not None and last_run.status != 'succeeded':
+                last_success = (db.query(ScrapeRun)
+                                .filter(ScrapeRun.status == 'succeeded')
+                                .order_by(ScrapeRun.started_at.desc(), ScrapeRun.id.desc())
+                                .first())
             
             return jsonify({
                 "total_properties": total_properties,
-                "recently_updated": recent_properties,
+                "favorited": favorited,
+                # Listings the last successful scrape added or changed
+                "recently_updated": (last_success.added + last_success.changed) if last_success else 0,
+                "last_run": last_run.to_dict() if last_run else None,
+                "last_successful_run": last_success.to_dict() if last_success else None,
+                "runs": scrape_run_summary(db),
                 "message": f"Database contains {total_properties} properties"
             })
         finally:
@@ -299,6 +449,239 @@ def get_stats():
         logger.error(f"Error getting stats: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/analytics', methods=['GET'])
+@cached_response
+def get_analytics():
+    """Market analytics per city, zip code, property type or estdist band, from the stored aggregates.
+    
+    Each group has its listing count, median and mean list price, and price per
+    square foot; off-market listings are left out. Medians are accurate to about 1%.
+    """
+    try:
+        group_by = parse_group_by(request.args.get('group_by'))
+        limit = parse_limit(request.args.get('limit'))
+        db = ReadSessionLocal()
+        try:
+            conn = db.connection()
+            overall = market_groups(load_market_aggregates(conn, 'all'))
+            groups = sort_groups(market_groups(load_market_aggregates(conn, group_by)), group_by)
+            return jsonify({
+                "group_by": group_by,
+                "overall": overall[0] if overall else None,
+                "groups": groups[:limit] if limit else groups,
+                "total_groups": len(groups)
+            })
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting analytics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of listing changes: added, changed, removed and favorite.
+    
+    Browsers resume after a dropped connection with the Last-Event-ID header; other
+    clients may pass last_event_id. Without either the stream starts from now.
+    """
+    try:
+        last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = Response(event_broadcaster.stream(last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/export', methods=['GET'])
+def export_snapshot():
+    """Stream a snapshot of the properties table (or table=history) as a Parquet, Arrow or CSV download"""
+    try:
+        export_format = parse_export_format(request.args.get('format'))
+        table_name = parse_export_table(request.args.get('table'))
+        return stream_export(ReadSessionLocal(), table_name, export_format)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/scrape-runs', methods=['GET'])
+def list_scrape_runs():
+    """List finished scrape runs from the ledger, most recent first"""
+    try:
+        limit = parse_run_limit(request.args.get('limit'))
+        db = ReadSessionLocal()
+        try:
+            runs = db.query(ScrapeRun).order_by(ScrapeRun.started_at.desc(), ScrapeRun.id.desc()).limit(limit).all()
+            return jsonify({
+                "runs": [run.to_dict() for run in runs],
+                "total_found": len(runs)
+            })
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error listing scrape runs: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/scrape-runs/<int:run_id>', methods=['GET'])
+def get_scrape_run(run_id):
+    """Get one scrape run's statistics, errors and parameters"""
+    try:
+        db = ReadSessionLocal()
+        try:
+            run = db.query(ScrapeRun).filter(ScrapeRun.id == run_id).first()
+            if not run:
+                return jsonify({"error": "Scrape run not found"}), 404
+            return jsonify({"run": run.to_dict()})
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Error getting scrape run {run_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def apply_search_location_fields(search_location, data):
+    """Validate a search location request body and copy its fields onto the row.
+
+    Raises ValueError for invalid values; fields missing from the body are left as they are.
+    """
+    if 'location' in data:
+        location = (data.get('location') or '').strip()
+        if not location:
+            raise ValueError("Location is required")
+        search_location.location = location
+    if 'radius' in data:
+        radius = data.get('radius')
+        if radius is not None and not (isinstance(radius, int) and 1 <= radius <= 100):
+            raise ValueError("Radius must be between 1 and 100 miles")
+        search_location.radius = radius
+    if 'timeRange' in data:
+        time_range = data.get('timeRange')
+        if time_range is not None and not (isinstance(time_range, int) and 1 <= time_range <= 1000):
+            raise ValueError("Time range must be between 1 and 1000 days")
+        search_location.time_range = time_range
+    if 'listingTypes' in data:
+        listing_types = data.get('listingTypes') or ['for_sale']
+        invalid = [t for t in listing_types if t not in LISTING_TYPES]
+        if invalid:
+            raise ValueError(f"Listing types must be among: {', '.join(LISTING_TYPES)}")
+        search_location.listing_types = ','.join(listing_types)
+    if 'enabled' in data:
+        search_location.enabled = bool(data.get('enabled'))
+
+@app.route('/search-locations', methods=['GET'])
+def get_search_locations():
+    """List the locations scraped on each run"""
+    try:
+        scraper.load_search_locations()  # Seeds the default location on first use
+        db = ReadSessionLocal()
+        try:
+            search_locations = db.query(SearchLocation).order_by(SearchLocation.id).all()
+            return jsonify({
+                "search_locations": [search_location.to_dict() for search_location in search_locations]
+            })
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Error getting search locations: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/search-locations', methods=['POST'])
+def create_search_location():
+    """Add a location to scrape; radius and timeRange default to the global settings"""
+    try:
+        data = request.get_json() or {}
+        search_location = SearchLocation(listing_types='for_sale', enabled=True)
+        apply_search_location_fields(search_location, {'location': None, **data})
+        
+        db = SessionLocal()
+        try:
+            db.add(search_location)
+            db.commit()
+            db.refresh(search_location)
+            return jsonify({
+                "message": "Search location added. It will be scraped on the next scrape cycle.",
+                "search_location": search_location.to_dict()
+            }), 201
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error adding search location: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/search-locations/<int:location_id>', methods=['PUT'])
+def update_search_location(location_id):
+    """Update a search location"""
+    try:
+        data = request.get_json() or {}
+        db = SessionLocal()
+        try:
+            search_location = db.query(SearchLocation).filter(SearchLocation.id == location_id).first()
+            if not search_location:
+                return jsonify({"error": "Search location not found"}), 404
+            
+            apply_search_location_fields(search_location, data)
+            db.commit()
+            db.refresh(search_location)
+            return jsonify({
+                "message": "Search location updated successfully",
+                "search_location": search_location.to_dict()
+            })
+        finally:
+            db.close()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating search location {location_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/search-locations/<int:location_id>', methods=['DELETE'])
+def delete_search_location(location_id):
+    """Stop scraping a location; properties already found there are kept"""
+    try:
+        db = SessionLocal()
+        try:
+            search_location = db.query(SearchLocation).filter(SearchLocation.id == location_id).first()
+            if not search_location:
+                return jsonify({"error": "Search location not found"}), 404
+            
+            db.delete(search_location)
+            db.commit()
+            return jsonify({"message": "Search location deleted successfully"})
+        finally:
+            db.close()
+    except Exception as e:
+        logger.error(f"Error deleting search location {location_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get response cache and photo cache hit/miss/size metrics"""
+    return jsonify({**response_cache.stats(), 'photos': photo_cache.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: request latencies, scrape stage timings, row and error counts"""
+    db = ReadSessionLocal()
+    try:
+        total, favorited = property_counts(db)
+        PROPERTIES_STORED.labels('true').set(favorited)
+        PROPERTIES_STORED.labels('false').set(total - favorited)
+    except Exception as e:
+        # Still report everything else
+        logger.error(f"Error counting properties for metrics: {str(e)}")
+    finally:
+        db.close()
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 # Serve React App
 @app.route('/')
 def serve_react_app():
@@ -309,7 +692,7 @@ def serve_react_app():
 def serve_react_app_files(path):
     """Serve React app files or fall back to index.html for client-side routing"""
     # Don't serve React app for API routes
-    if path.startswith('api/') or path in ['health', 'properties', 'scrape', 'manual-scrape', 'settings', 'stats']:
+    if path.startswith('api/') or path in ['health', 'properties', 'scrape', 'manual-scrape', 'settings', 'stats', 'cache-stats', 'scrape-jobs', 'scrape-runs', 'search-locations', 'metrics', 'analytics', 'photos', 'export', 'events']:
         return jsonify({"error": "Not Found"}), 404
     
     if os.path.exists(os.path.join(app.static_folder, path)):
@@ -321,4 +704,11 @@ def serve_react_app_files(path):
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV', 'development') == 'development'
+    
+    # Single-process deployment: run the scraper worker alongside the web server. Under
+    # the debug reloader only the serving child does; the lease covers anything else.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        import worker
+        worker.run_in_background()
+    
     app.run(debug=debug, host='0.0.0.0', port=port)
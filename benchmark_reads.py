@@ -0,0 +1,121 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Measure API-style read latency while a scrape-sized ingest is committing, against a
+# throwaway database. Run with --journal-mode DELETE to compare against rollback journaling.
+
+parser = argparse.ArgumentParser(description='Read latency percentiles with and without a concurrent ingest')
+parser.add_argument('--rows', type=int, default=20000, help='properties seeded before measuring')
+parser.add_argument('--batch', type=int, default=2000, help='rows per ingest commit')
+parser.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+parser.add_argument('--seconds', type=float, default=10, help='duration of each phase')
+parser.add_argument('--journal-mode', default='WAL')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_PATH'] = os.path.join(workdir, 'benchmark.db')
+
+import models
+models.SQLITE_PRAGMAS['journal_mode'] = args.journal_mode  # Engines connect lazily, so this still applies
+
+from models import ReadSessionLocal, SessionLocal, create_tables
+from ingest import normalize_properties, detect_changes, record_history, upsert_properties
+from queries import apply_property_filters, paginate, select_properties, SUMMARY_FIELDS
+
+rng = np.random.default_rng(0)
+
+def scraped_batch(start, count, price_offset=0):
+    """A DataFrame shaped like homeharvest output"""
+    ids = np.arange(start, start + count)
+    return pd.DataFrame({
+        'property_id': ids.astype(str),
+        'street': [f"{i} Main St" for i in ids],
+        'city': 'Lewisburg', 'state': 'PA', 'zip_code': '17837',
+        'list_price': rng.integers(50_000, 900_000, count) + price_offset,
+        'sqft': rng.integers(600, 5000, count),
+        'beds': rng.integers(1, 6, count),
+        'full_baths': rng.integers(1, 4, count),
+        'lot_sqft': rng.integers(2000, 200_000, count),
+        'style': 'SINGLE_FAMILY',
+        'status': 'FOR_SALE',
+        'text': 'A lovely home. ' * 20,
+        'estdist': rng.integers(1, 30, count),
+    })
+
+def ingest(properties, known_hashes):
+    db = SessionLocal()
+    try:
+        normalized = normalize_properties(properties)
+        added, changed, _ = detect_changes(normalized, known_hashes)
+        record_history(db, added, changed)
+        upsert_properties(db, pd.concat([added, changed]))
+        db.commit()
+        known_hashes.update(zip(normalized['property_id'], normalized['content_hash']))
+    finally:
+        db.close()
+
+def read_once():
+    """The query behind GET /properties?fields=summary&sort=-list_price&limit=60&max_price=500000"""
+    params = {'sort': '-list_price', 'limit': '60', 'max_price': '500000'}
+    db = ReadSessionLocal()
+    try:
+        query = apply_property_filters(select_properties(db, SUMMARY_FIELDS, 'list_price'), params)
+        query.count()
+        paginate(query, params)
+    finally:
+        db.close()
+
+def measure(with_ingest, known_hashes):
+    stop = threading.Event()
+    latencies = []
+    commits = []
+    lock = threading.Lock()
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            read_once()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    def writer():
+        offset = 1
+        while not stop.is_set():
+            start = int(rng.integers(0, args.rows - args.batch))
+            started = time.perf_counter()
+            ingest(scraped_batch(start, args.batch, price_offset=offset), known_hashes)
+            commits.append(time.perf_counter() - started)
+            offset += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    if with_ingest:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ms = np.array(latencies) * 1000
+    label = 'during ingestion' if with_ingest else 'idle'
+    print(f"{label:>17}: {len(ms)} reads, p50 {np.percentile(ms, 50):.1f}ms, "
+          f"p95 {np.percentile(ms, 95):.1f}ms, p99 {np.percentile(ms, 99):.1f}ms, max {ms.max():.1f}ms")
+    if commits:
+        print(f"{'':>17}  {len(commits)} ingest commits of {args.batch} rows, mean {np.mean(commits) * 1000:.0f}ms")
+
+create_tables()
+known_hashes = {}
+for start in range(0, args.rows, args.batch):
+    ingest(scraped_batch(start, min(args.batch, args.rows - start)), known_hashes)
+
+print(f"journal_mode={args.journal_mode}, {args.rows} rows, {args.readers} readers")
+measure(False, known_hashes)
+measure(True, known_hashes)
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+# Offline benchmarks of the ingest, filter, serialization and listing hot paths, run
+# against a throwaway database through the Flask test client. Results are written as
+# JSON so runs on different commits can be compared:
+#
+#   python benchmarks.py --output before.json
+#   python benchmarks.py --compare before.json    # exits 1 on a regression
+
+parser = argparse.ArgumentParser(description='Benchmark ingest, filtering, serialization and /properties')
+parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated table sizes for the query benchmarks')
+parser.add_argument('--repeat', type=int, default=20, help='samples per query benchmark')
+parser.add_argument('--changed', type=float, default=0.05, help='share of listings re-priced in the changed ingest')
+parser.add_argument('--recording', help='ingest this recording (see recordings.py) instead of synthetic listings')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--output', help='write results here instead of stdout')
+parser.add_argument('--compare', help='results file from an earlier run to compare against')
+parser.add_argument('--threshold', type=float, default=0.25, help='relative slowdown reported as a regression')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_PATH'] = os.path.join(workdir, 'benchmark.db')
+os.environ.pop('DATABASE_URL', None)
+os.environ.pop('DATABASE_READ_URL', None)
+os.environ.pop('SCRAPE_RECORD_DIR', None)
+os.environ.pop('SCRAPE_REPLAY_DIR', None)
+
+import logging
+logging.disable(logging.INFO)  # The scraper logs every batch
+
+from flask import jsonify
+from sqlalchemy import text
+from models import Property, ScrapeJob, SessionLocal, create_tables, engine
+from app import app
+from cache import response_cache
+from photos import photo_cache
+from queries import SUMMARY_FIELDS, rows_to_dicts, select_properties
+from recordings import ScrapeRecorder, ScrapeReplayer, recording_params, synthetic_listings
+from scraper import scraper, LOCATION
+from stats import refresh_property_stats
+from analytics import rebuild_market_aggregates
+from worker import load_settings
+
+CENTER = (41.04, -76.86)
+
+# POST /scrape bodies, as the frontend sends them (summary fields, first page of 60)
+SCRAPE_FILTERS = {
+    'none': {},
+    'price': {'min_price': 150000, 'max_price': 400000},
+    'price_sqft_beds': {'min_price': 150000, 'max_price': 400000, 'min_sqft': 1200, 'max_sqft': 3000, 'min_beds': 3},
+    'lot_distance': {'min_lot_acre': 1, 'max_distance': 10},
+    'radius': {'lat': CENTER[0], 'lon': CENTER[1], 'radius_miles': 5},
+    'favorited': {'favorited': True},
+}
+
+# GET /properties requests timed end to end, including reading a streamed body
+PROPERTIES_REQUESTS = {
+    'paged': '/properties?fields=summary&sort=-list_price&limit=60',
+    'paged_cached': '/properties?fields=summary&sort=-list_price&limit=60',
+    'unpaged': '/properties?fields=summary',
+    'unpaged_ndjson': '/properties?fields=summary&format=ndjson',
+}
+
+# Metric each benchmark is compared on, and whether lower is better
+PRIMARY_METRICS = {
+    'ingest': ('rows_per_s', False),
+    'scrape_filter': ('p50_ms', True),
+    'serialize': ('p50_ms', True),
+    'properties': ('p50_ms', True),
+}
+
+results = []
+
+def _rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+class PeakRSS:
+    """Sample this process's resident set size on a thread while the block runs (Linux only)"""
+
+    def __enter__(self):
+        self.baseline = self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.002):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+def timings(run, repeat):
+    """Call run() repeat times after one warm-up call; latency percentiles in ms"""
+    run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples = np.array(samples)
+    return {
+        'samples': repeat,
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+    }
+
+def record(benchmark, case, **values):
+    result = {'benchmark': benchmark, 'case': case, **values}
+    results.append(result)
+    metric, _ = PRIMARY_METRICS[benchmark]
+    rows = f" @ {values['table_rows']} rows" if 'table_rows' in values else ''
+    print(f"{benchmark:>14} {case:<16}{rows:<16} {metric} {values[metric]}", file=sys.stderr)
+
+def table_rows():
+    with engine.connect() as conn:
+        return conn.execute(text('SELECT COUNT(*) FROM properties')).scalar()
+
+def bench_ingest(recording_dirs):
+    """scrape_and_store_properties throughput replaying each recording in turn"""
+    for case, directory in recording_dirs:
+        scraper.replayer = ScrapeReplayer(directory)
+        now = datetime.utcnow()
+        job = ScrapeJob(id=uuid.uuid4().hex, trigger='benchmark', status='running', submitted_at=now, started_at=now)
+        started = time.perf_counter()
+        scraper.run_scrape_job(job)
+        seconds = time.perf_counter() - started
+        if job.error or not job.rows_processed:
+            raise RuntimeError(f"Ingest benchmark failed: {job.error or f'no recorded properties for {LOCATION} in {directory}'}")
+        record('ingest', case, rows=job.rows_processed, added=job.added, changed=job.changed,
+               unchanged=job.unchanged, seconds=round(seconds, 3), rows_per_s=round(job.rows_processed / seconds, 1))
+
+def bench_scrape_filters(size):
+    client = app.test_client()
+    for case, filters in SCRAPE_FILTERS.items():
+        body = {'fields': 'summary', 'sort': '-list_price', 'limit': 60, **filters}
+        def run():
+            response = client.post('/scrape', json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        record('scrape_filter', case, table_rows=size, **timings(run, args.repeat))
+
+def bench_serialize(size, count=1000):
+    """Per-page serialization cost: ORM to_dict() versus the column rows used by the list endpoints"""
+    db = SessionLocal()
+    try:
+        properties = db.query(Property).order_by(Property.property_id).limit(count).all()
+        rows = select_properties(db, SUMMARY_FIELDS).order_by(Property.property_id).limit(count).all()
+    finally:
+        db.close()
+    with app.app_context():
+        record('serialize', 'to_dict', table_rows=size, objects=len(properties),
+               **timings(lambda: [p.to_dict() for p in properties], args.repeat))
+        record('serialize', 'to_dict_jsonify', table_rows=size, objects=len(properties),
+               **timings(lambda: jsonify({'properties': [p.to_dict() for p in properties]}).get_data(), args.repeat))
+        record('serialize', 'rows_jsonify', table_rows=size, objects=len(rows),
+               **timings(lambda: jsonify({'properties': rows_to_dicts(rows, SUMMARY_FIELDS)}).get_data(), args.repeat))
+
+def bench_properties(size):
+    client = app.test_client()
+    max_bytes = response_cache.max_bytes
+    for case, url in PROPERTIES_REQUESTS.items():
+        # Bodies over max_bytes aren't cached, so 0 measures the uncached path
+        response_cache.max_bytes = max_bytes if case.endswith('_cached') else 0
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return len(response.get_data())
+        with PeakRSS() as rss:
+            body_bytes = run()
+        # RSS rarely shrinks once the ingest has grown the heap, so also count the
+        # request's peak Python allocations
+        tracemalloc.start()
+        run()
+        peak_alloc = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        values = timings(run, args.repeat)
+        record('properties', case, table_rows=size, body_bytes=body_bytes,
+               peak_rss_delta_mb=round((rss.peak - rss.baseline) / 2 ** 20, 1),
+               peak_alloc_mb=round(peak_alloc / 2 ** 20, 1), **values)
+    response_cache.max_bytes = max_bytes
+
+def update_properties(statement, **params):
+    """Change stored properties directly, keeping counts and cached responses in step as the app would"""
+    db = SessionLocal()
+    try:
+        db.execute(text(statement), params)
+        refresh_property_stats(db)
+        rebuild_market_aggregates(db.connection())
+        response_cache.bump_generation(db)
+        db.commit()
+    finally:
+        db.close()
+
+def truncate(size):
+    """Keep the first size properties; the search and spatial index triggers follow the delete"""
+    update_properties('DELETE FROM properties WHERE property_id NOT IN '
+                      '(SELECT property_id FROM properties ORDER BY property_id LIMIT :size)', size=size)
+    with engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare(baseline_path):
+    """Print each shared result's change against the baseline; True if any regressed past --threshold"""
+    with open(baseline_path) as f:
+        baseline = {(r['benchmark'], r['case'], r.get('table_rows')): r for r in json.load(f)['results']}
+    regressed = False
+    for result in results:
+        before = baseline.get((result['benchmark'], result['case'], result.get('table_rows')))
+        if before is None:
+            continue
+        metric, lower_is_better = PRIMARY_METRICS[result['benchmark']]
+        old, new = before[metric], result[metric]
+        slowdown = (new / old - 1) if lower_is_better else (old / new - 1)
+        # A latency median still inside the baseline's p95 is within its noise
+        noisy = 'p95_ms' in before and new <= before['p95_ms']
+        flag = 'REGRESSION' if slowdown > args.threshold and not noisy else ''
+        regressed = regressed or bool(flag)
+        rows = result.get('table_rows', '')
+        print(f"{result['benchmark']:>14} {result['case']:<16} {rows!s:<8} {metric} {old} -> {new} ({slowdown:+.0%} time) {flag}")
+    return regressed
+
+sizes = sorted({int(size) for size in args.sizes.split(',')}, reverse=True)
+create_tables()
+load_settings()
+scraper.settings['scrape_mode'] = 'single_pass'
+scraper.reconcile_hours = 0  # Every ingest replays the whole recording
+photo_cache.prefetch_workers = 0  # Synthetic photo URLs point nowhere; ingest timings shouldn't include prefetching
+search_location = scraper.default_search_location()
+params = recording_params(LOCATION, search_location['listing_types'], search_location['time_range'], search_location['radius'])
+
+if args.recording:
+    recording_dirs = [('added', args.recording), ('unchanged', args.recording)]
+else:
+    recording_dirs = []
+    for case, changed in (('added', 0.0), ('changed', args.changed)):
+        directory = os.path.join(workdir, f'recording_{case}')
+        recorder = ScrapeRecorder(directory)
+        recorder.save_frame(params, synthetic_listings(sizes[0], CENTER, search_location['radius'], args.seed, changed))
+        recorder.save_geocode(LOCATION, CENTER)
+        recording_dirs.append((case, directory))
+    recording_dirs.insert(1, ('unchanged', recording_dirs[0][1]))
+
+bench_ingest(recording_dirs)
+
+# Some listings favorited, as a user would have
+update_properties('UPDATE properties SET favorited = 1 WHERE CAST(property_id AS INTEGER) % 50 = 0')
+
+# Largest table first, deleting rows down to each smaller size
+for size in sizes:
+    truncate(size)
+    size = table_rows()
+    bench_scrape_filters(size)
+    bench_serialize(size)
+    bench_properties(size)
+
+output = {
+    'commit': git_commit(),
+    'created_at': datetime.utcnow().isoformat(),
+    'python': platform.python_version(),
+    'sqlite': sqlite3.sqlite_version,
+    'platform': platform.platform(),
+    'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+    'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    'results': results,
+}
+if args.output:
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+else:
+    print(json.dumps(output, indent=2))
+
+if args.compare and compare(args.compare):
+    sys.exit(1)
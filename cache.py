@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from functools import wraps
+from flask import request, Response
+from sqlalchemy import event, update
+from models import DataGeneration, ReadSessionLocal
+from responses import encoded_etag, negotiate_encoding, wants_ndjson
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bounds for the in-memory response cache
+MAX_CACHE_ENTRIES = 512
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# How often the shared data generation is re-read from the database; changes made by
+# another process (e.g. the scraper worker) are picked up within this many seconds
+GENERATION_POLL_SECONDS = float(os.environ.get('CACHE_GENERATION_POLL_SECONDS', 1.0))
+
+class ResponseCache:
+    """In-memory LRU cache of serialized responses, keyed by route, query and data generation.
+
+    The generation is a counter in the database, bumped in the same transaction as
+    any change to stored data (scrape batches, favorite toggles, settings updates).
+    Every process polls it, so entries from an older generation are never served
+    and are dropped once a newer one is seen.
+    """
+
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES, poll_seconds=GENERATION_POLL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self.generation = 0
+        self._checked_at = None
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bump_generation(self, db):
+        """Mark all cached responses as stale once db's transaction commits, returning the new generation.
+
+        Call before db.commit() so the bump is atomic with the data change. Rows
+        changed in the transaction are stamped with the returned generation as their
+        row_version; call it before changing them, so on PostgreSQL writers take the
+        generation row lock first and commit in generation order.
+        """
+        generation = db.execute(update(DataGeneration).where(DataGeneration.id == 1)
+                                .values(generation=DataGeneration.generation + 1)
+                                .returning(DataGeneration.generation)).scalar()
+        event.listen(db, 'after_commit', lambda session: self.current_generation(refresh=True), once=True)
+        return generation
+
+    def current_generation(self, refresh=False):
+        """The data generation, re-read from the database at most every poll_seconds"""
+        now = time.monotonic()
+        if not refresh and self._checked_at is not None and now - self._checked_at < self.poll_seconds:
+            return self.generation
+
+        db = ReadSessionLocal()
+        try:
+            generation = db.query(DataGeneration.generation).filter(DataGeneration.id == 1).scalar() or 0
+        except Exception as e:
+            # Serve from the last known generation rather than failing the request
+            logger.error(f"Error reading data generation: {str(e)}")
+            return self.generation
+        finally:
+            db.close()
+
+        with self._lock:
+            self._checked_at = now
+            if generation != self.generation:
+                self.generation = generation
+                self._entries.clear()
+                self._size_bytes = 0
+            return self.generation
+
+    def get(self, key):
+        """Return the cached (body, etag, mimetype) for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, etag, mimetype):
+        """Store a serialized response, evicting least recently used entries to stay within bounds"""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            # Don't store results computed against a generation that has since been bumped
+            if key[0] != self.generation:
+                return
+            if key in self._entries:
+                self._size_bytes -= len(self._entries.pop(key)[0])
+            self._entries[key] = (body, etag, mimetype)
+            self._size_bytes += len(body)
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                _, (evicted_body, _, _) = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted_body)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss/size metrics for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+            }
+
+# Global response cache instance
+response_cache = ResponseCache()
+
+def cached_response(view):
+    """Cache a GET view's successful response and serve it with a strong ETag.
+
+    Requests carrying a matching If-None-Match get a 304 without a body. Streamed
+    responses are passed through uncached so they never get buffered in memory.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read the generation before running the view so a concurrent bump can't
+        # leave older data cached under the newer generation
+        generation = response_cache.current_generation()
+        query = tuple(sorted(request.args.items(multi=True)))
+        key = (generation, request.path, query, wants_ndjson())
+
+        entry = response_cache.get(key)
+        if entry is None:
+            response = view(*args, **kwargs)
+            if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = hashlib.sha1(body).hexdigest()
+            entry = (body, etag, response.mimetype)
+            response_cache.set(key, *entry)
+
+        body, etag, mimetype = entry
+        # The compression hook suffixes the ETag of compressed bodies, so either variant may come back
+        for tag in (encoded_etag(etag, negotiate_encoding()), etag):
+            if request.if_none_match.contains(tag):
+                response = Response(status=304)
+                response.set_etag(tag)
+                break
+        else:
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
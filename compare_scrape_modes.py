@@ -0,0 +1,27 @@
+from scraper import PropertyScraper, SCRAPE_MODES
+import time
+
+# Fetch with both scrape modes (no database writes) and compare results and timing
+
+scraper = PropertyScraper()
+results = {}
+
+for mode in SCRAPE_MODES:
+    started_at = time.perf_counter()
+    estdist = {}
+    for batch_label, properties in scraper.iter_property_batches(mode):
+        for property_id, dist in zip(properties['property_id'], properties['estdist']):
+            estdist.setdefault(property_id, int(dist))
+    results[mode] = (estdist, time.perf_counter() - started_at)
+    print(f"{mode}: {len(estdist)} properties in {results[mode][1]:.1f}s")
+
+single, _ = results['single_pass']
+sweep, _ = results['radius_sweep']
+common = single.keys() & sweep.keys()
+matching = sum(1 for pid in common if single[pid] == sweep[pid])
+within_one = sum(1 for pid in common if abs(single[pid] - sweep[pid]) <= 1)
+
+print(f"Only in single_pass: {len(single.keys() - sweep.keys())}")
+print(f"Only in radius_sweep: {len(sweep.keys() - single.keys())}")
+if common:
+    print(f"estdist identical for {matching}/{len(common)} ({matching / len(common):.1%}), within 1 mile for {within_one}/{len(common)}")
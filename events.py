@@ -0,0 +1,227 @@
+from sqlalchemy import delete, func, select
+from models import Property, PropertyEvent, ReadSessionLocal, SUMMARY_FIELDS
+from ingest import OFF_MARKET_STATUS, QUERY_CHUNK_SIZE
+from queries import rows_to_dicts
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Events are kept this long; a client resuming from an older one is told to reload instead
+EVENT_RETENTION_HOURS = float(os.environ.get('EVENT_RETENTION_HOURS', 72))
+
+# How often each process checks for new events while it has /events clients
+EVENT_POLL_SECONDS = float(os.environ.get('EVENT_POLL_SECONDS', 1.0))
+
+# An idle stream sends a comment this often so proxies keep it open and gone clients are noticed
+EVENT_KEEPALIVE_SECONDS = 15
+
+# How long browsers wait before reconnecting a dropped stream
+EVENT_RETRY_MS = 5000
+
+# Listings carried by one added/changed/removed event
+EVENT_BATCH_SIZE = 500
+
+# Recent events each process keeps in memory for its clients, and rows read per query
+EVENT_BUFFER_SIZE = 1000
+EVENT_READ_LIMIT = 500
+
+def record_event(db, event_type, payload, now=None):
+    """Append an event to the feed as part of db's transaction.
+
+    Call after response_cache.bump_generation(db), just before db.commit(). On
+    PostgreSQL the generation row lock then serializes event writers until they
+    commit, so events become visible in id order and pollers never skip one.
+    """
+    db.execute(PropertyEvent.__table__.insert().values(
+        created_at=now or datetime.utcnow(),
+        event_type=event_type,
+        payload=json.dumps(payload, separators=(',', ':'))
+    ))
+
+def record_listing_events(db, added_ids, changed_ids, now=None):
+    """Record 'added' and 'changed' events carrying the listings' stored summary fields.
+
+    Call after the listings are upserted, so the events carry what the API would return.
+    """
+    table = Property.__table__
+    for event_type, property_ids in (('added', list(added_ids)), ('changed', list(changed_ids))):
+        for start in range(0, len(property_ids), EVENT_BATCH_SIZE):
+            chunk = property_ids[start:start + EVENT_BATCH_SIZE]
+            rows = []
+            for query_start in range(0, len(chunk), QUERY_CHUNK_SIZE):
+                rows.extend(db.execute(select(*[table.c[field] for field in SUMMARY_FIELDS])
+                                       .where(table.c.property_id.in_(chunk[query_start:query_start + QUERY_CHUNK_SIZE]))).all())
+            record_event(db, event_type, {'properties': rows_to_dicts(rows, SUMMARY_FIELDS)}, now)
+
+def record_removed_events(db, property_ids, now=None):
+    """Record 'removed' events for listings marked off-market"""
+    property_ids = list(property_ids)
+    for start in range(0, len(property_ids), EVENT_BATCH_SIZE):
+        record_event(db, 'removed', {'property_ids': property_ids[start:start + EVENT_BATCH_SIZE], 'status': OFF_MARKET_STATUS}, now)
+
+def record_favorite_event(db, property_id, favorited):
+    """Record a 'favorite' event for a favorite toggle"""
+    record_event(db, 'favorite', {'property_id': property_id, 'favorited': favorited})
+
+def prune_events(db, now=None):
+    """Delete events older than EVENT_RETENTION_HOURS, in db's transaction.
+
+    The newest event is always kept, so a resuming client can tell whether it missed any.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=EVENT_RETENTION_HOURS)
+    newest = select(func.max(PropertyEvent.id)).scalar_subquery()
+    return db.execute(delete(PropertyEvent).where(PropertyEvent.created_at < cutoff, PropertyEvent.id < newest)).rowcount
+
+def load_events(db, after_id, limit=EVENT_READ_LIMIT):
+    """Up to limit (id, event_type, payload) events after after_id, oldest first"""
+    table = PropertyEvent.__table__
+    return db.execute(select(table.c.id, table.c.event_type, table.c.payload)
+                      .where(table.c.id > after_id).order_by(table.c.id).limit(limit)).all()
+
+def format_event(event_id, event_type, data):
+    """One event in text/event-stream form; data is a JSON string"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+def parse_last_event_id(value):
+    """The event id a client resumes after, or None to start from now"""
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid event id: {value}")
+    if value < 0:
+        raise ValueError("Event id must not be negative")
+    return value
+
+class EventBroadcaster:
+    """Fans the event feed out to this process's /events clients.
+
+    One thread polls the feed every poll_seconds while there are clients, however
+    many there are, and keeps the latest events in memory. Clients resuming from
+    further back read the events they missed from the database themselves.
+    """
+
+    def __init__(self, poll_seconds=EVENT_POLL_SECONDS, buffer_size=EVENT_BUFFER_SIZE):
+        self.poll_seconds = poll_seconds
+        self.buffer_size = buffer_size
+        self.last_id = None  # Newest event seen; None while nobody is listening
+        self._buffer = []  # (id, event_type, payload) after _buffer_after, oldest first
+        self._buffer_after = None
+        self._condition = threading.Condition()
+        self._subscribers = 0
+        self._thread = None
+
+    def _head_id(self):
+        db = ReadSessionLocal()
+        try:
+            return db.query(func.max(PropertyEvent.id)).scalar() or 0
+        finally:
+            db.close()
+
+    def _subscribe(self):
+        with self._condition:
+            if self.last_id is None:
+                # Start from the current end of the feed; events from while nobody listened are only in the database
+                self.last_id = self._buffer_after = self._head_id()
+                self._buffer = []
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll_loop, name='event-poller', daemon=True)
+                self._thread.start()
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def _poll_loop(self):
+        while True:
+            with self._condition:
+                if not self._subscribers:
+                    self.last_id = None
+                    self._condition.wait(self.poll_seconds)
+                    continue
+                after_id = self.last_id
+            try:
+                db = ReadSessionLocal()
+                try:
+                    events = load_events(db, after_id)
+                finally:
+                    db.close()
+            except Exception as e:
+                logger.error(f"Error polling events: {str(e)}")
+                events = []
+
+            with self._condition:
+                if events and self.last_id == after_id:
+                    self._buffer.extend(events)
+                    self.last_id = events[-1][0]
+                    if len(self._buffer) > self.buffer_size:
+                        dropped = len(self._buffer) - self.buffer_size
+                        self._buffer_after = self._buffer[dropped - 1][0]
+                        del self._buffer[:dropped]
+                    self._condition.notify_all()
+            if len(events) < EVENT_READ_LIMIT:
+                # Caught up; otherwise read the next page right away
+                with self._condition:
+                    self._condition.wait(self.poll_seconds)
+
+    def _events_after(self, cursor):
+        """Events after cursor: from memory when it reaches back that far, else a page from the database"""
+        with self._condition:
+            if self._buffer_after is not None and cursor >= self._buffer_after:
+                return [event for event in self._buffer if event[0] > cursor]
+        db = ReadSessionLocal()
+        try:
+            return load_events(db, cursor)
+        finally:
+            db.close()
+
+    def _resume_position(self, last_event_id):
+        """(cursor, needs reset) for a client resuming after last_event_id"""
+        db = ReadSessionLocal()
+        try:
+            oldest, newest = db.query(func.min(PropertyEvent.id), func.max(PropertyEvent.id)).one()
+        finally:
+            db.close()
+        # Ids are never reused and the newest event is never pruned, so a gap before the
+        # oldest event means some were pruned, and an id past the newest is from another database
+        if last_event_id > (newest or 0) or (oldest is not None and last_event_id < oldest - 1):
+            return newest or 0, True
+        return last_event_id, False
+
+    def stream(self, last_event_id=None):
+        """Yield the feed in text/event-stream form, after last_event_id or from now.
+
+        A client whose last event has been pruned gets a 'reset' event, telling it to
+        reload its listings, and continues from the current end of the feed.
+        """
+        self._subscribe()
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n"
+            cursor = self.last_id
+            if last_event_id is not None:
+                cursor, reset = self._resume_position(last_event_id)
+                if reset:
+                    yield format_event(cursor, 'reset', json.dumps({'reason': 'the events after your last one are no longer available; reload listings'}))
+            while True:
+                events = self._events_after(cursor)
+                for event_id, event_type, payload in events:
+                    yield format_event(event_id, event_type, payload)
+                    cursor = event_id
+                if events:
+                    continue
+                with self._condition:
+                    arrived = self._condition.wait_for(lambda: self.last_id is not None and self.last_id > cursor,
+                                                       timeout=EVENT_KEEPALIVE_SECONDS)
+                if not arrived:
+                    yield ": keepalive\n\n"
+        finally:
+            self._unsubscribe()
+
+# Global event broadcaster instance
+event_broadcaster = EventBroadcaster()
@@ -0,0 +1,276 @@
+from flask import Response
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+from models import Property, PropertyHistory, PROPERTY_FIELDS
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import io
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Rows read from the database and written at a time (a Parquet row group, an Arrow
+# record batch); only one chunk is in memory however large the table is
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 20_000))
+
+# format -> (file extension, content type)
+EXPORT_FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'csv': ('csv', 'text/csv'),
+}
+
+HISTORY_FIELDS = ['id', 'property_id', 'ts', 'changed_fields', 'old_price', 'new_price', 'old_status', 'new_status']
+
+# table -> (SQLAlchemy table, exported columns, low-cardinality columns stored dictionary-encoded).
+# Arrow files keep them as plain strings: an IPC file can't take a dictionary that changes
+# after the first batch, which a column that's all NULL in the first chunk would need
+EXPORT_TABLES = {
+    'properties': (Property.__table__, PROPERTY_FIELDS, ('city', 'state', 'property_type', 'status')),
+    'history': (PropertyHistory.__table__, HISTORY_FIELDS, ('changed_fields', 'old_status', 'new_status')),
+}
+
+def parse_export_format(value):
+    """The export format, defaulting to Parquet"""
+    value = value or 'parquet'
+    if value not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return value
+
+def parse_export_table(value):
+    """The table to export, defaulting to properties"""
+    value = value or 'properties'
+    if value not in EXPORT_TABLES:
+        raise ValueError(f"table must be one of: {', '.join(EXPORT_TABLES)}")
+    return value
+
+def _arrow_type(column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+def encoded_columns(table_name, export_format):
+    """Columns an export writes dictionary-encoded; none for Arrow files"""
+    return () if export_format == 'arrow' else EXPORT_TABLES[table_name][2]
+
+def export_schema(table_name, export_format='parquet'):
+    """Arrow schema of an export, with its low-cardinality string columns dictionary-encoded where the format allows"""
+    table, fields, _ = EXPORT_TABLES[table_name]
+    encoded = encoded_columns(table_name, export_format)
+    return pa.schema([
+        (name, pa.dictionary(pa.int32(), pa.string()) if name in encoded else _arrow_type(table.c[name]))
+        for name in fields
+    ])
+
+class DictionaryEncoder:
+    """Encodes a column chunk by chunk against one dictionary that only ever grows.
+
+    Every chunk's dictionary extends the previous one, so Parquet row groups share
+    their values' order.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.indices = {}
+
+    def encode(self, values):
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            index = self.indices.get(value)
+            if index is None:
+                index = self.indices[value] = len(self.values)
+                self.values.append(value)
+            indices.append(index)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what a writer produces until the response takes it"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _open_writer(export_format, sink, schema):
+    if export_format == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression='zstd')
+    if export_format == 'arrow':
+        return ipc.new_file(sink, schema, options=ipc.IpcWriteOptions(compression='zstd'))
+    return pcsv.CSVWriter(sink, schema)
+
+def iter_export(db, table_name, export_format, chunk_rows=EXPORT_CHUNK_ROWS, counts=None):
+    """Yield an export of a table in the given format as bytes, chunk_rows rows at a time.
+
+    Rows come from a single query streamed from a server-side cursor, so the export
+    is a consistent snapshot. counts, if given, gets 'rows' added as they're written.
+    """
+    table, fields, _ = EXPORT_TABLES[table_name]
+    schema = export_schema(table_name, export_format)
+    encoders = {name: DictionaryEncoder() for name in encoded_columns(table_name, export_format)}
+    query = select(*[table.c[name] for name in fields]).order_by(*table.primary_key.columns)
+
+    sink = _ChunkSink()
+    writer = _open_writer(export_format, sink, schema)
+    result = db.execute(query.execution_options(yield_per=chunk_rows))
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        arrays = [
+            encoders[name].encode(values) if name in encoders else pa.array(values, field.type)
+            for name, field, values in zip(fields, schema, columns)
+        ]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        if counts is not None:
+            counts['rows'] = counts.get('rows', 0) + len(rows)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+def export_filename(table_name, export_format, now=None):
+    """e.g. properties_2025-08-08_121905.parquet"""
+    extension, _ = EXPORT_FORMATS[export_format]
+    return f"{table_name}_{(now or datetime.utcnow()).strftime('%Y-%m-%d_%H%M%S')}.{extension}"
+
+def stream_export(db, table_name, export_format):
+    """Stream an export as a file download. db is closed when the stream finishes.
+
+    The first chunk is produced before the response starts, so a failure there is an
+    ordinary error response. A later failure is re-raised, which makes the server drop
+    the connection without ending the chunked body, so clients see an incomplete
+    download rather than a short file.
+    """
+    chunks = iter_export(db, table_name, export_format)
+    try:
+        first = next(chunks)
+    except Exception:
+        db.close()
+        raise
+
+    def generate():
+        try:
+            yield first
+            yield from chunks
+        except Exception as e:
+            logger.error(f"Error exporting {table_name}, aborting the download: {str(e)}")
+            raise
+        finally:
+            db.close()
+
+    _, mimetype = EXPORT_FORMATS[export_format]
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(table_name, export_format)}"'
+    # The generator's finally doesn't run if the client disconnects before it starts
+    response.call_on_close(db.close)
+    return response
+
+def check_round_trip(chunk_rows=2):
+    """Export a small generated history table in every format and read each file back.
+
+    The export spans several chunks and old_status is all NULL in the first, as in a
+    real history export (which starts with the 'listed' rows). Returns the formats
+    whose output failed to write or didn't read back as written.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    ts = datetime(2025, 8, 8, 12, 0)
+    rows = [
+        {'id': 1, 'property_id': '1', 'ts': ts, 'changed_fields': 'listed', 'old_price': None, 'new_price': 250000, 'old_status': None, 'new_status': 'FOR_SALE'},
+        {'id': 2, 'property_id': '2', 'ts': ts, 'changed_fields': 'listed', 'old_price': None, 'new_price': None, 'old_status': None, 'new_status': None},
+        {'id': 3, 'property_id': '1', 'ts': ts, 'changed_fields': 'list_price', 'old_price': 250000, 'new_price': 240000, 'old_status': 'FOR_SALE', 'new_status': 'FOR_SALE'},
+        {'id': 4, 'property_id': '2', 'ts': ts, 'changed_fields': 'status', 'old_price': None, 'new_price': None, 'old_status': 'FOR_SALE', 'new_status': 'PENDING'},
+        {'id': 5, 'property_id': '1', 'ts': ts, 'changed_fields': 'status', 'old_price': 240000, 'new_price': 240000, 'old_status': 'FOR_SALE', 'new_status': 'OFF_MARKET'},
+    ]
+    engine = create_engine('sqlite://')
+    PropertyHistory.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(PropertyHistory.__table__.insert(), rows)
+    expected = {name: [row[name] for row in rows] for name in HISTORY_FIELDS}
+
+    failed = []
+    for export_format in EXPORT_FORMATS:
+        try:
+            with Session(engine) as db:
+                data = b''.join(iter_export(db, 'history', export_format, chunk_rows))
+            if export_format == 'parquet':
+                table = pq.read_table(pa.BufferReader(data))
+            elif export_format == 'arrow':
+                table = ipc.open_file(pa.BufferReader(data)).read_all()
+            else:
+                # CSV has no schema; read it with the plain column types
+                table = pcsv.read_csv(pa.BufferReader(data), convert_options=pcsv.ConvertOptions(
+                    column_types=export_schema('history', 'arrow'), strings_can_be_null=True))
+            if {name: table.column(name).to_pylist() for name in HISTORY_FIELDS} != expected:
+                failed.append(export_format)
+        except Exception as e:
+            logger.error(f"Error checking the {export_format} export: {str(e)}")
+            failed.append(export_format)
+    return failed
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from models import ReadSessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Export the properties table (and optionally history) as columnar files')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='parquet')
+    parser.add_argument('--history', action='store_true', help='also export the property history')
+    parser.add_argument('--output', default='.', help='directory to write the files to')
+    parser.add_argument('--check', action='store_true', help='instead, export a small generated table in every format and read it back')
+    args = parser.parse_args()
+
+    if args.check:
+        failed = check_round_trip()
+        if failed:
+            raise SystemExit(f"Exports failed to read back as written: {', '.join(failed)}")
+        print(f"Exports read back as written in every format: {', '.join(EXPORT_FORMATS)}")
+        raise SystemExit(0)
+
+    os.makedirs(args.output, exist_ok=True)
+    now = datetime.utcnow()
+    for table_name in ['properties', 'history'] if args.history else ['properties']:
+        path = os.path.join(args.output, export_filename(table_name, args.format, now))
+        counts = {}
+        started_at = time.perf_counter()
+        db = ReadSessionLocal()
+        try:
+            # Written under a temporary name, so a failed export leaves no partial file behind
+            with open(f"{path}.partial", 'wb') as f:
+                for data in iter_export(db, table_name, args.format, counts=counts):
+                    f.write(data)
+            os.replace(f"{path}.partial", path)
+        except BaseException:
+            if os.path.exists(f"{path}.partial"):
+                os.remove(f"{path}.partial")
+            raise
+        finally:
+            db.close()
+        print(f"Wrote {counts.get('rows', 0)} {table_name} rows to {path} ({os.path.getsize(path)} bytes) in {time.perf_counter() - started_at:.1f}s")
@@ -1,10 +1,13 @@
-import React, { useState, useEffect, useCallback, useMemo } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 import './index.css';
 
 // Use relative URLs in production, localhost in development
 const API_BASE_URL = process.env.NODE_ENV === 'production' ? '' : 'http://localhost:5000';
 
+// Number of properties fetched per page from the server
+const PAGE_SIZE = 60;
+
 function App() {
   const [currentPage, setCurrentPage] = useState('home');
   const [filters, setFilters] = useState({
@@ -28,126 +31,151 @@ function App() {
     listing_age: ''
   });
 
-  const [allProperties, setAllProperties] = useState([]);
-  const [filteredProperties, setFilteredProperties] = useState([]);
+  const [properties, setProperties] = useState([]);
+  const [totalFound, setTotalFound] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [sort, setSort] = useState('property_id');
+  const [searchQuery, setSearchQuery] = useState('');
   const [favoriteProperties, setFavoriteProperties] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [filtersExpanded, setFiltersExpanded] = useState(false);
   const [scraperLoading, setScraperLoading] = useState(false);
+  const [scrapeProgress, setScrapeProgress] = useState(null);
+  const [newListings, setNewListings] = useState(0);
   
   // Settings state
   const [settings, setSettings] = useState({
     update_interval: 1, // hours
     search_radius: 20, // miles
-    search_time_range: 365 // days
+    search_time_range: 365, // days
+    scrape_mode: 'single_pass'
   });
 
-  // Load all properties on component mount
+  // Load favorites and settings on component mount
   useEffect(() => {
-    loadAllProperties();
     loadFavorites();
     loadSettings();
   }, []);
 
-  // Debounced filter application
-  const debouncedApplyFilters = useCallback(
-    useMemo(() => {
-      const timeouts = new Map();
-      
-      return (filtersToApply = filters) => {
-        // Clear any existing timeout
-        if (timeouts.has('filter')) {
-          clearTimeout(timeouts.get('filter'));
-        }
-        
-        // Set new timeout
-        const timeoutId = setTimeout(() => {
-          let filtered = [...allProperties];
-
-          // Apply each filter if it has a value
-          if (filtersToApply.min_price !== '') {
-            filtered = filtered.filter(prop => prop.list_price >= parseFloat(filtersToApply.min_price));
-          }
-          if (filtersToApply.max_price !== '') {
-            filtered = filtered.filter(prop => prop.list_price <= parseFloat(filtersToApply.max_price));
-          }
-          if (filtersToApply.min_sqft !== '') {
-            filtered = filtered.filter(prop => prop.sqft >= parseFloat(filtersToApply.min_sqft));
-          }
-          if (filtersToApply.max_sqft !== '') {
-            filtered = filtered.filter(prop => prop.sqft <= parseFloat(filtersToApply.max_sqft));
-          }
-          if (filtersToApply.min_lot_acre !== '') {
-            filtered = filtered.filter(prop => prop.lot_acre >= parseFloat(filtersToApply.min_lot_acre));
-          }
-          if (filtersToApply.max_lot_acre !== '') {
-            filtered = filtered.filter(prop => prop.lot_acre <= parseFloat(filtersToApply.max_lot_acre));
-          }
-          if (filtersToApply.min_beds !== '') {
-            filtered = filtered.filter(prop => prop.beds >= parseFloat(filtersToApply.min_beds));
-          }
-          if (filtersToApply.max_beds !== '') {
-            filtered = filtered.filter(prop => prop.beds <= parseFloat(filtersToApply.max_beds));
-          }
-          if (filtersToApply.min_baths !== '') {
-            filtered = filtered.filter(prop => prop.baths >= parseFloat(filtersToApply.min_baths));
-          }
-          if (filtersToApply.max_baths !== '') {
-            filtered = filtered.filter(prop => prop.baths <= parseFloat(filtersToApply.max_baths));
-          }
-          if (filtersToApply.min_stories !== '') {
-            filtered = filtered.filter(prop => prop.stories >= parseFloat(filtersToApply.min_stories));
-          }
-          if (filtersToApply.max_stories !== '') {
-            filtered = filtered.filter(prop => prop.stories <= parseFloat(filtersToApply.max_stories));
-          }
-          if (filtersToApply.min_garage !== '') {
-            filtered = filtered.filter(prop => prop.parking_garage >= parseFloat(filtersToApply.min_garage));
-          }
-          if (filtersToApply.max_garage !== '') {
-            filtered = filtered.filter(prop => prop.parking_garage <= parseFloat(filtersToApply.max_garage));
-          }
-          if (filtersToApply.min_distance !== '') {
-            filtered = filtered.filter(prop => prop.estdist >= parseFloat(filtersToApply.min_distance));
-          }
-          if (filtersToApply.max_distance !== '') {
-            filtered = filtered.filter(prop => prop.estdist <= parseFloat(filtersToApply.max_distance));
-          }
-
-          setFilteredProperties(filtered);
-          timeouts.delete('filter');
-        }, 300); // 300ms debounce delay
-        
-        timeouts.set('filter', timeoutId);
-      };
-    }, [allProperties]),
-    [allProperties]
-  );
+  // Keyword searches go to the full-text search endpoint, ranked by relevance
+  const listEndpoint = searchQuery.trim() ? '/properties/search' : '/properties';
 
-  // Apply filters whenever filters or properties change
-  useEffect(() => {
-    debouncedApplyFilters();
-  }, [filters, allProperties, debouncedApplyFilters]);
+  // Build query parameters from the filters that have a value
+  const buildQueryParams = useCallback((cursor = null) => {
+    const params = { limit: PAGE_SIZE, fields: 'summary' };
+    if (searchQuery.trim()) {
+      params.q = searchQuery.trim();
+    } else {
+      params.sort = sort;
+    }
+    Object.entries(filters).forEach(([name, value]) => {
+      if (value !== '') {
+        params[name] = value;
+      }
+    });
+    if (cursor) {
+      params.cursor = cursor;
+    }
+    return params;
+  }, [filters, sort, searchQuery]);
 
-  const loadAllProperties = async () => {
+  // Load the first page of properties matching the current filters
+  const loadProperties = useCallback(async () => {
     setLoading(true);
     setError(null);
+    setNewListings(0);
 
     try {
-      const response = await axios.get(`${API_BASE_URL}/properties`);
-      setAllProperties(response.data.properties);
-      setFilteredProperties(response.data.properties);
+      const response = await axios.get(`${API_BASE_URL}${listEndpoint}`, { params: buildQueryParams() });
+      setProperties(response.data.properties);
+      setTotalFound(response.data.total_found);
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to load properties. Please try again.');
     } finally {
       setLoading(false);
     }
+  }, [buildQueryParams, listEndpoint]);
+
+  // Append the next page of properties
+  const loadMoreProperties = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+
+    try {
+      const response = await axios.get(`${API_BASE_URL}${listEndpoint}`, { params: buildQueryParams(nextCursor) });
+      setProperties(prev => [...prev, ...response.data.properties]);
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      setError(err.response?.data?.error || 'Failed to load more properties. Please try again.');
+    } finally {
+      setLoadingMore(false);
+    }
   };
 
+  // Reload from the server whenever filters or sort change (debounced)
+  useEffect(() => {
+    const timeoutId = setTimeout(() => {
+      loadProperties();
+    }, 300); // 300ms debounce delay
+
+    return () => clearTimeout(timeoutId);
+  }, [loadProperties]);
+
+  // The live event stream outlives filter changes, so it reloads through a ref
+  const loadPropertiesRef = useRef(loadProperties);
+  useEffect(() => {
+    loadPropertiesRef.current = loadProperties;
+  }, [loadProperties]);
+
+  // Apply listing changes pushed by the server rather than re-fetching the whole list.
+  // EventSource reconnects by itself, resuming after the last event it received
+  useEffect(() => {
+    const events = new EventSource(`${API_BASE_URL}/events`);
+    const parse = (event) => JSON.parse(event.data);
+
+    // New listings may not match the current filters or sort, so offer a refresh instead
+    events.addEventListener('added', (event) => {
+      setNewListings(count => count + parse(event).properties.length);
+    });
+    events.addEventListener('changed', (event) => {
+      const changed = new Map(parse(event).properties.map(listing => [listing.property_id, listing]));
+      const applyChanges = (list) => list.map(prop =>
+        changed.has(prop.property_id) ? { ...prop, ...changed.get(prop.property_id) } : prop
+      );
+      setProperties(applyChanges);
+      setFavoriteProperties(applyChanges);
+    });
+    events.addEventListener('removed', (event) => {
+      const { property_ids, status } = parse(event);
+      const removed = new Set(property_ids);
+      setProperties(list => list.filter(prop => !removed.has(prop.property_id)));
+      // Favorites stay listed, marked off-market
+      setFavoriteProperties(list => list.map(prop =>
+        removed.has(prop.property_id) ? { ...prop, status } : prop
+      ));
+    });
+    events.addEventListener('favorite', (event) => {
+      const { property_id, favorited } = parse(event);
+      setProperties(list => list.map(prop =>
+        prop.property_id === property_id ? { ...prop, favorited } : prop
+      ));
+      loadFavorites();
+    });
+    // Sent when the events since we last heard are gone; start over from a fresh list
+    events.addEventListener('reset', () => {
+      loadPropertiesRef.current();
+      loadFavorites();
+    });
+
+    return () => events.close();
+  }, []);
+
   const loadFavorites = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/properties/favorites`);
+      const response = await axios.get(`${API_BASE_URL}/properties/favorites`, { params: { fields: 'summary' } });
       setFavoriteProperties(response.data.properties);
     } catch (err) {
       console.error('Failed to load favorites:', err);
@@ -170,16 +198,32 @@ function App() {
 
   const manualScrape = async () => {
     setScraperLoading(true);
+    setScrapeProgress(null);
     setError(null);
     
     try {
-      await axios.post(`${API_BASE_URL}/manual-scrape`);
-      // Reload properties after successful scrape
-      await loadAllProperties();
+      // The scrape runs in the background; poll its job until it finishes
+      const response = await axios.post(`${API_BASE_URL}/manual-scrape`);
+      const jobId = response.data.job_id;
+      let job = response.data.job;
+
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const jobResponse = await axios.get(`${API_BASE_URL}/scrape-jobs/${jobId}`);
+        job = jobResponse.data.job;
+        setScrapeProgress(job);
+      }
+
+      if (job.status === 'failed') {
+        setError(`Scrape failed: ${job.error}`);
+      }
+      // Reload properties after the scrape
+      await loadProperties();
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to start manual scrape. Please try again.');
     } finally {
       setScraperLoading(false);
+      setScrapeProgress(null);
     }
   };
 
@@ -194,8 +238,7 @@ function App() {
           : prop
       );
       
-      setAllProperties(updateProperty);
-      setFilteredProperties(updateProperty);
+      setProperties(updateProperty);
       
       // Reload favorites to ensure accuracy
       loadFavorites();
@@ -211,9 +254,6 @@ function App() {
       [name]: value
     };
     setFilters(newFilters);
-    
-    // Apply filters immediately with the new values
-    debouncedApplyFilters(newFilters);
   };
 
   const clearFilters = () => {
@@ -238,8 +278,6 @@ function App() {
       listing_age: ''
     };
     setFilters(clearedFilters);
-    // Apply cleared filters immediately
-    debouncedApplyFilters(clearedFilters);
   };
 
   const formatPrice = (price) => {
@@ -268,6 +306,16 @@ function App() {
     return new Date(lastUpdated) < sevenDaysAgo;
   };
 
+  // Thumbnails come from the backend's photo cache. The v parameter changes whenever the
+  // listing's photo URL does, which lets the browser keep each version for good
+  const photoSrc = (property) => {
+    let hash = 0;
+    for (let i = 0; i < property.primary_photo.length; i++) {
+      hash = (hash * 31 + property.primary_photo.charCodeAt(i)) | 0;
+    }
+    return `${API_BASE_URL}/photos/${encodeURIComponent(property.property_id)}?v=${(hash >>> 0).toString(36)}`;
+  };
+
   const StarIcon = ({ filled, onClick }) => (
     <svg 
       width="24" 
@@ -287,13 +335,24 @@ function App() {
 
   const PropertyCard = ({ property }) => {
     const [isExpanded, setIsExpanded] = useState(false);
+    const [description, setDescription] = useState(property.description);
     const primaryPhoto = property.primary_photo;
     const stale = isStale(property.last_updated);
 
-    const toggleExpanded = (e) => {
+    const toggleExpanded = async (e) => {
       // Don't toggle if clicking on star
       if (e.target.closest('svg')) return;
       setIsExpanded(!isExpanded);
+
+      // List views only carry the summary, so fetch the description on first expand
+      if (!isExpanded && description === undefined) {
+        try {
+          const response = await axios.get(`${API_BASE_URL}/properties/${property.property_id}`);
+          setDescription(response.data.property.description);
+        } catch (err) {
+          console.error('Failed to load property details:', err);
+        }
+      }
     };
 
     const handleStarClick = (e) => {
@@ -309,9 +368,10 @@ function App() {
       >
         {primaryPhoto ? (
           <img 
-            src={primaryPhoto} 
+            src={photoSrc(property)} 
             alt="Property" 
             className="property-image"
+            loading="lazy"
             onError={(e) => {
               e.target.style.display = 'none';
               e.target.nextSibling.style.display = 'flex';
@@ -336,6 +396,11 @@ function App() {
           <div className="property-address">
             {property.address}, {property.city}, {property.state} {property.zip_code}
           </div>
+
+          {property.snippet && (
+            // The server HTML-escapes snippets and only adds <mark> around matched words
+            <div className="property-snippet" dangerouslySetInnerHTML={{ __html: property.snippet }} />
+          )}
           
           <div className="property-dates">
             <div className="date-item">
@@ -387,7 +452,7 @@ function App() {
             </div>
           </div>
           
-          {property.description && property.description !== 'N/A' && isExpanded && (
+          {description && description !== 'N/A' && isExpanded && (
             <div className="property-description" style={{
               maxHeight: '150px',
               overflowY: 'auto',
@@ -397,7 +462,7 @@ function App() {
               borderRadius: '4px',
               marginTop: '10px'
             }}>
-              {property.description}
+              {description}
             </div>
           )}
           
@@ -445,6 +510,12 @@ function App() {
         >
           ⭐ Favorites ({favoriteProperties.length})
         </button>
+        <button 
+          className={`nav-button ${currentPage === 'history' ? 'active' : ''}`}
+          onClick={() => setCurrentPage('history')}
+        >
+          📊 Run History
+        </button>
         <button 
           className={`nav-button ${currentPage === 'settings' ? 'active' : ''}`}
           onClick={() => setCurrentPage('settings')}
@@ -477,10 +548,25 @@ function App() {
             fontWeight: 'bold'
           }}
         >
-          {scraperLoading ? 'Scraping...' : '🔄 Manual Scrape'}
+          {scraperLoading
+            ? (scrapeProgress?.current_batch
+                ? `Scraping ${scrapeProgress.current_batch} (${scrapeProgress.rows_processed} rows)...`
+                : 'Scraping...')
+            : '🔄 Manual Scrape'}
         </button>
       </div>
 
+      <div className="search-section" style={{ marginBottom: '15px' }}>
+        <input
+          type="search"
+          className="search-input"
+          placeholder="Search listings, e.g. pole barn, creek, &quot;stone farmhouse&quot;"
+          value={searchQuery}
+          onChange={(e) => setSearchQuery(e.target.value)}
+          style={{ width: '100%', padding: '10px', fontSize: '16px', boxSizing: 'border-box' }}
+        />
+      </div>
+
       <div className="filters-section">
         <div 
           className="filters-header" 
@@ -498,7 +584,7 @@ function App() {
           }}
         >
           <h2 className="filters-title" style={{ margin: 0 }}>
-            Search Filters ({filteredProperties.length} of {allProperties.length} properties)
+            Search Filters ({totalFound} matching properties)
           </h2>
           <span style={{ fontSize: '20px', fontWeight: 'bold' }}>
             {filtersExpanded ? '−' : '+'}
@@ -745,6 +831,23 @@ function App() {
               </div>
             </div>
 
+            {/* Sort Order */}
+            <div className="filter-row" style={{ display: 'flex', gap: '15px', marginBottom: '20px' }}>
+              <div className="filter-group" style={{ flex: 1 }}>
+                <label htmlFor="sort">Sort By</label>
+                <select id="sort" name="sort" value={sort} onChange={(e) => setSort(e.target.value)} disabled={!!searchQuery.trim()}
+                  title={searchQuery.trim() ? 'Search results are sorted by relevance' : undefined}>
+                  <option value="property_id">Default</option>
+                  <option value="list_price">Price (low to high)</option>
+                  <option value="-list_price">Price (high to low)</option>
+                  <option value="-sqft">Square Feet (largest first)</option>
+                  <option value="-lot_acre">Lot Acres (largest first)</option>
+                  <option value="-beds">Bedrooms (most first)</option>
+                  <option value="estdist">Distance (nearest first)</option>
+                </select>
+              </div>
+            </div>
+
             <div className="filter-actions" style={{ display: 'flex', gap: '10px' }}>
               <button 
                 className="clear-filters-button" 
@@ -762,7 +865,7 @@ function App() {
               </button>
               <button 
                 className="refresh-button" 
-                onClick={loadAllProperties}
+                onClick={loadProperties}
                 disabled={loading}
                 style={{
                   padding: '10px 20px',
@@ -793,32 +896,52 @@ function App() {
         </div>
       )}
 
-      {!loading && filteredProperties.length > 0 && (
+      {!loading && properties.length > 0 && (
         <div className="results-section">
           <div className="results-header">
             <h2>Properties</h2>
             <p className="results-count">
-              Showing {filteredProperties.length} of {allProperties.length} properties
+              Showing {properties.length} of {totalFound} properties
             </p>
           </div>
+
+          {newListings > 0 && (
+            <button className="new-listings-banner" onClick={loadProperties}>
+              {newListings} new {newListings === 1 ? 'listing' : 'listings'} found - click to refresh
+            </button>
+          )}
           
           <div className="properties-grid">
-            {filteredProperties.map((property, index) => (
+            {properties.map((property, index) => (
               <PropertyCard key={property.property_id || index} property={property} />
             ))}
           </div>
-        </div>
-      )}
 
-      {!loading && !error && allProperties.length === 0 && (
-        <div className="no-results">
-          <p>No properties found in the database. The scraper may still be collecting data.</p>
+          {nextCursor && (
+            <div style={{ textAlign: 'center', marginTop: '20px' }}>
+              <button
+                className="load-more-button"
+                onClick={loadMoreProperties}
+                disabled={loadingMore}
+                style={{
+                  padding: '10px 20px',
+                  backgroundColor: '#007bff',
+                  color: 'white',
+                  border: 'none',
+                  borderRadius: '4px',
+                  cursor: loadingMore ? 'not-allowed' : 'pointer'
+                }}
+              >
+                {loadingMore ? 'Loading...' : 'Load More'}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
-      {!loading && !error && allProperties.length > 0 && filteredProperties.length === 0 && (
+      {!loading && !error && properties.length === 0 && (
         <div className="no-results">
-          <p>No properties match your current filters. Try adjusting your criteria.</p>
+          <p>No properties match your current filters, or the scraper may still be collecting data.</p>
         </div>
       )}
     </div>
@@ -880,7 +1003,8 @@ function App() {
         const response = await axios.put(`${API_BASE_URL}/settings`, {
           updateInterval: localSettings.update_interval,
           searchRadius: localSettings.search_radius,
-          searchTimeRange: localSettings.search_time_range
+          searchTimeRange: localSettings.search_time_range,
+          scrapeMode: localSettings.scrape_mode
         });
         
         // Update global settings state
@@ -948,6 +1072,20 @@ function App() {
             <small>How far back to look for property listings</small>
           </div>
 
+          <div className="setting-group">
+            <label htmlFor="scrape_mode">Scrape Mode</label>
+            <select
+              id="scrape_mode"
+              name="scrape_mode"
+              value={localSettings.scrape_mode || 'single_pass'}
+              onChange={(e) => setLocalSettings(prev => ({ ...prev, scrape_mode: e.target.value }))}
+            >
+              <option value="single_pass">Single pass (one search, distance from coordinates)</option>
+              <option value="radius_sweep">Radius sweep (one search per mile of radius)</option>
+            </select>
+            <small>Single pass is much faster; radius sweep is the original behaviour</small>
+          </div>
+
           <button 
             onClick={saveSettings} 
             className="save-settings-button"
@@ -966,6 +1104,144 @@ function App() {
     );
   };
 
+  const RunHistoryPage = () => {
+    const [runs, setRuns] = useState([]);
+    const [stats, setStats] = useState(null);
+    const [historyLoading, setHistoryLoading] = useState(true);
+    const [historyError, setHistoryError] = useState(null);
+    const [expandedRun, setExpandedRun] = useState(null);
+
+    useEffect(() => {
+      const loadHistory = async () => {
+        try {
+          const [runsResponse, statsResponse] = await Promise.all([
+            axios.get(`${API_BASE_URL}/scrape-runs`, { params: { limit: 100 } }),
+            axios.get(`${API_BASE_URL}/stats`)
+          ]);
+          setRuns(runsResponse.data.runs || []);
+          setStats(statsResponse.data);
+        } catch (err) {
+          setHistoryError('Failed to load run history: ' + (err.response?.data?.error || err.message));
+        } finally {
+          setHistoryLoading(false);
+        }
+      };
+      loadHistory();
+    }, []);
+
+    const formatDuration = (seconds) => {
+      if (seconds === null || seconds === undefined) return '—';
+      if (seconds < 60) return `${seconds.toFixed(1)}s`;
+      return `${Math.floor(seconds / 60)}m ${Math.round(seconds % 60)}s`;
+    };
+
+    const formatTime = (timestamp) => timestamp ? new Date(timestamp + 'Z').toLocaleString() : '—';
+
+    return (
+      <div className="main-content">
+        <div className="header">
+          <h1>Run History</h1>
+          <p>Recent scrape runs and what each one found</p>
+        </div>
+
+        {historyLoading && <div className="loading">Loading run history...</div>}
+        {historyError && <div className="error-message">{historyError}</div>}
+
+        {stats && (
+          <div className="run-stats">
+            <div className="run-stat">
+              <span className="run-stat-value">{stats.total_properties.toLocaleString()}</span>
+              <span className="run-stat-label">Properties stored</span>
+            </div>
+            <div className="run-stat">
+              <span className="run-stat-value">{stats.recently_updated.toLocaleString()}</span>
+              <span className="run-stat-label">Added or changed by the last scrape</span>
+            </div>
+            <div className="run-stat">
+              <span className="run-stat-value">{stats.runs.succeeded} / {stats.runs.total}</span>
+              <span className="run-stat-label">Runs succeeded</span>
+            </div>
+            <div className="run-stat">
+              <span className="run-stat-value">{formatDuration(stats.runs.recent_average_seconds)}</span>
+              <span className="run-stat-label">Typical run time</span>
+            </div>
+          </div>
+        )}
+
+        {!historyLoading && !historyError && (
+          runs.length > 0 ? (
+            <div className="results-section">
+              <table className="run-table">
+                <thead>
+                  <tr>
+                    <th>Started</th>
+                    <th>Trigger</th>
+                    <th>Status</th>
+                    <th>Duration</th>
+                    <th>Fetched</th>
+                    <th>Added</th>
+                    <th>Changed</th>
+                    <th>Unchanged</th>
+                    <th>Errors</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {runs.map(run => (
+                    <React.Fragment key={run.id}>
+                      <tr className="run-row" onClick={() => setExpandedRun(expandedRun === run.id ? null : run.id)}>
+                        <td>{formatTime(run.started_at)}</td>
+                        <td>{run.trigger}</td>
+                        <td><span className={`run-status ${run.status}`}>{run.status}</span></td>
+                        <td>{formatDuration(run.duration_seconds)}</td>
+                        <td>{run.rows_fetched.toLocaleString()}</td>
+                        <td>{run.added.toLocaleString()}</td>
+                        <td>{run.changed.toLocaleString()}</td>
+                        <td>{run.unchanged.toLocaleString()}</td>
+                        <td>{run.error_count}</td>
+                      </tr>
+                      {expandedRun === run.id && (
+                        <tr className="run-details">
+                          <td colSpan="9">
+                            <div><strong>Mode:</strong> {run.scrape_mode || '—'}</div>
+                            <div><strong>Duplicates:</strong> {run.duplicates} · <strong>Skipped (no id):</strong> {run.skipped} · <strong>Marked off-market:</strong> {run.off_market}</div>
+                            {Object.keys(run.stage_timings).length > 0 && (
+                              <div>
+                                <strong>Stages:</strong>{' '}
+                                {Object.entries(run.stage_timings)
+                                  .sort((a, b) => b[1] - a[1])
+                                  .map(([stage, seconds]) => `${stage} ${formatDuration(seconds)}`)
+                                  .join(', ')}
+                              </div>
+                            )}
+                            {run.params?.search_locations && (
+                              <div>
+                                <strong>Locations:</strong>{' '}
+                                {run.params.search_locations
+                                  .map(location => `${location.location} (${location.radius} mi, ${location.updated_since ? `updated since ${formatTime(location.updated_since)}` : 'full'})`)
+                                  .join('; ')}
+                              </div>
+                            )}
+                            {run.errors.map((message, index) => (
+                              <div key={index} className="run-error">{message}</div>
+                            ))}
+                          </td>
+                        </tr>
+                      )}
+                    </React.Fragment>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          ) : (
+            <div className="no-results">
+              <p>No scrape runs recorded yet.</p>
+            </div>
+          )
+        )}
+      </div>
+    );
+  };
+
   const renderCurrentPage = () => {
     switch (currentPage) {
       case 'home':
@@ -974,6 +1250,8 @@ function App() {
         return <FavoritesPage />;
       case 'settings':
         return <SettingsPage />;
+      case 'history':
+        return <RunHistoryPage />;
       default:
         return <HomePage />;
     }
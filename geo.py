@@ -0,0 +1,58 @@
+import numpy as np
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.7613
+
+# Successful geocodes only, so a transient lookup failure is retried next run
+_geocode_cache = {}
+
+def haversine_miles(lat, lon, center_lat, center_lon):
+    """Vectorized great-circle distance in miles from (center_lat, center_lon).
+
+    lat/lon may be scalars, numpy arrays or pandas Series; NaN coordinates
+    produce NaN distances.
+    """
+    lat1 = np.radians(center_lat)
+    lon1 = np.radians(center_lon)
+    lat2 = np.radians(np.asarray(lat, dtype=float))
+    lon2 = np.radians(np.asarray(lon, dtype=float))
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+def geocode_location(location, use_env_override=True):
+    """Resolve a search location to (lat, lon).
+
+    LOCATION_LAT/LOCATION_LON environment variables take precedence unless
+    use_env_override is False (they describe the default location only). Otherwise
+    the location is resolved through the same Realtor search-suggestion lookup
+    homeharvest uses for radius searches, so the distances we compute are
+    measured from the same center point. Returns None if it can't be resolved.
+    """
+    env_lat = os.environ.get('LOCATION_LAT')
+    env_lon = os.environ.get('LOCATION_LON')
+    if use_env_override and env_lat and env_lon:
+        return float(env_lat), float(env_lon)
+
+    if location in _geocode_cache:
+        return _geocode_cache[location]
+
+    try:
+        from homeharvest.core.scrapers import ScraperInput
+        from homeharvest.core.scrapers.realtor import RealtorScraper
+
+        location_info = RealtorScraper(ScraperInput(location=location, listing_type=None)).handle_location()
+        centroid = (location_info or {}).get('centroid')
+        if not centroid:
+            logger.warning(f"Could not geocode location: {location}")
+            return None
+        _geocode_cache[location] = (float(centroid['lat']), float(centroid['lon']))
+        return _geocode_cache[location]
+    except Exception as e:
+        logger.error(f"Error geocoding location {location}: {str(e)}")
+        return None
@@ -0,0 +1,249 @@
+from sqlalchemy import func, select
+from models import Property, PropertyHistory, dialect_insert
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+SQFT_PER_ACRE = 43560
+
+# Status given to stored listings that a full fetch no longer returns
+OFF_MARKET_STATUS = 'OFF_MARKET'
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+# Property column -> scraped (homeharvest) column for fields copied as text
+TEXT_COLUMNS = {
+    'address': 'street',
+    'city': 'city',
+    'state': 'state',
+    'zip_code': 'zip_code',
+    'listing_date': 'list_date',
+    'primary_photo': 'primary_photo',
+    'description': 'text',
+    'url': 'property_url',
+    'status': 'status',
+}
+
+# Property column -> scraped column for integer fields (truncated like int())
+INT_COLUMNS = {
+    'sqft': 'sqft',
+    'list_price': 'list_price',
+    'beds': 'beds',
+    'year_built': 'year_built',
+    'stories': 'stories',
+}
+
+# Property column -> scraped column for float fields
+FLOAT_COLUMNS = {
+    'baths': 'full_baths',
+    'parking_garage': 'parking_garage',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+}
+
+# Columns refreshed from every scrape; a missing (NULL) scraped value keeps the stored one
+SCRAPED_COLUMNS = list(TEXT_COLUMNS) + list(INT_COLUMNS) + list(FLOAT_COLUMNS) + ['lot_acre', 'property_type']
+
+def _column(df, name):
+    """Return a scraped column, or an all-missing one if homeharvest didn't provide it"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def normalize_properties(df):
+    """Turn a scraped homeharvest DataFrame into Property column values, one column at a time.
+
+    Rows without a usable property_id are dropped. Missing values are None so they
+    can be written straight to the database.
+    """
+    property_ids = _column(df, 'property_id')
+    valid = property_ids.notna() & ~property_ids.astype(str).isin(['', 'N/A'])
+    df = df[valid]
+
+    out = pd.DataFrame({'property_id': df['property_id'].astype(str)}, index=df.index)
+
+    for column, source in TEXT_COLUMNS.items():
+        values = _column(df, source).astype(object)
+        # Dates and other non-string scalars are stored as their string form
+        out[column] = values.where(values.isna(), values.astype(str))
+
+    for column, source in INT_COLUMNS.items():
+        out[column] = np.trunc(pd.to_numeric(_column(df, source), errors='coerce')).astype('Int64')
+
+    for column, source in FLOAT_COLUMNS.items():
+        out[column] = pd.to_numeric(_column(df, source), errors='coerce')
+
+    lot_sqft = pd.to_numeric(_column(df, 'lot_sqft'), errors='coerce')
+    out['lot_acre'] = (lot_sqft / SQFT_PER_ACRE).round(2).where(lot_sqft != 0)
+
+    # Non-string styles come out of the .str accessor as NaN
+    style = _column(df, 'style').astype(object)
+    out['property_type'] = style.where(style != 'N/A').str.replace('_', ' ').str.title()
+
+    if 'estdist' in df.columns:
+        out['estdist'] = pd.to_numeric(df['estdist'], errors='coerce').astype('Int64')
+
+    out = out.astype(object).where(out.notna(), None)
+    out['content_hash'] = content_hashes(out)
+    return out
+
+def content_hashes(properties):
+    """Fingerprint the scraped fields of each normalized row as a 16-digit hex string"""
+    hashes = pd.util.hash_pandas_object(properties[SCRAPED_COLUMNS], index=False)
+    return hashes.map('{:016x}'.format)
+
+def detect_changes(properties, known_hashes):
+    """Split a normalized batch into (added, changed, unchanged) frames.
+
+    known_hashes maps property_id -> stored content_hash for every property already
+    in the database. Rows stored before fingerprinting existed have no hash and
+    count as changed.
+    """
+    is_new = ~properties['property_id'].isin(known_hashes.keys())
+    stored = properties['property_id'].map(known_hashes)
+    is_changed = ~is_new & (stored != properties['content_hash'])
+    return properties[is_new], properties[is_changed], properties[~is_new & ~is_changed]
+
+def load_properties(db, property_ids, columns):
+    """Load the given Property columns for a set of property IDs as a DataFrame"""
+    table = Property.__table__
+    selected = [table.c.property_id] + [table.c[column] for column in columns]
+    property_ids = list(property_ids)
+    rows = []
+    for start in range(0, len(property_ids), QUERY_CHUNK_SIZE):
+        chunk = property_ids[start:start + QUERY_CHUNK_SIZE]
+        rows.extend(db.execute(select(*selected).where(table.c.property_id.in_(chunk))).all())
+    return pd.DataFrame(rows, columns=['property_id'] + list(columns), dtype=object)
+
+def _to_records(df):
+    """Turn a DataFrame into a list of dicts; several times faster than to_dict('records')"""
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[column].tolist() for column in columns))]
+
+def record_history(db, added, changed, now=None, previous=None):
+    """Append property_history rows for new listings and for changed listings.
+
+    Must run before the batch is upserted, since the stored values are the "old"
+    side of each change; previous may pass them in if already loaded (at least
+    SCRAPED_COLUMNS). A changed field is one where the scrape supplied a value
+    that differs from the stored one (a missing value keeps the stored one, so it
+    is not a change). Returns the number of history rows appended.
+    """
+    now = now or datetime.utcnow()
+    history = []
+
+    if not added.empty:
+        history.append(pd.DataFrame({
+            'property_id': added['property_id'],
+            'changed_fields': 'listed',
+            'old_price': None,
+            'new_price': added['list_price'],
+            'old_status': None,
+            'new_status': added['status'],
+        }))
+
+    if not changed.empty:
+        if previous is None:
+            previous = load_properties(db, changed['property_id'], SCRAPED_COLUMNS)
+        merged = changed[['property_id'] + SCRAPED_COLUMNS].merge(previous, on='property_id', suffixes=('', '_old'))
+
+        diffs = pd.DataFrame({
+            column: merged[column].notna() & (merged[column] != merged[f'{column}_old'])
+            for column in SCRAPED_COLUMNS
+        }, index=merged.index)
+        # bool x str is the str itself or '', so this joins the changed column names row-wise
+        changed_fields = diffs.dot(pd.Index(SCRAPED_COLUMNS) + ',').str.rstrip(',')
+        merged = merged[changed_fields != '']
+
+        history.append(pd.DataFrame({
+            'property_id': merged['property_id'],
+            'changed_fields': changed_fields[changed_fields != ''],
+            'old_price': merged['list_price_old'],
+            'new_price': merged['list_price'].where(merged['list_price'].notna(), merged['list_price_old']),
+            'old_status': merged['status_old'],
+            'new_status': merged['status'].where(merged['status'].notna(), merged['status_old']),
+        }))
+
+    if not history:
+        return 0
+
+    history = pd.concat(history, ignore_index=True).assign(ts=now)
+    history = history.astype(object).where(history.notna(), None)
+    if history.empty:
+        return 0
+
+    db.execute(dialect_insert(PropertyHistory.__table__, db.get_bind().dialect.name), _to_records(history))
+    return len(history)
+
+def upsert_properties(db, properties, now=None, row_version=None):
+    """Insert or update a normalized batch with a single native INSERT ... ON CONFLICT statement.
+
+    Scraped fields use COALESCE(new, old) so missing values never erase stored data,
+    estdist keeps the distance from when the property was first seen, and favorited
+    is never touched by a scrape. Rows whose content_hash already matches are left
+    alone entirely. Rows written get row_version, if given (the generation from
+    response_cache.bump_generation). Returns the number of rows sent.
+    """
+    if properties.empty:
+        return 0
+
+    now = now or datetime.utcnow()
+    properties = properties.assign(favorited=False, first_seen=now, last_updated=now)
+    if row_version is not None:
+        properties = properties.assign(row_version=row_version)
+    records = _to_records(properties)
+
+    table = Property.__table__
+    stmt = dialect_insert(table, db.get_bind().dialect.name)
+    update_columns = {
+        column: func.coalesce(stmt.excluded[column], table.c[column])
+        for column in SCRAPED_COLUMNS
+    }
+    update_columns['estdist'] = func.coalesce(table.c.estdist, stmt.excluded.estdist)
+    update_columns['content_hash'] = stmt.excluded.content_hash
+    update_columns['last_updated'] = stmt.excluded.last_updated
+    if row_version is not None:
+        update_columns['row_version'] = stmt.excluded.row_version
+
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['property_id'],
+        set_=update_columns,
+        where=table.c.content_hash.is_distinct_from(stmt.excluded.content_hash)
+    ), records)
+    return len(records)
+
+def mark_off_market(db, vanished, now=None, row_version=None):
+    """Mark listings a full fetch no longer returned as OFF_MARKET, recording each status change.
+
+    vanished holds property_id, status and list_price of the stored rows. Their
+    content_hash is cleared so a listing that reappears counts as changed rather
+    than unchanged, and they get row_version, if given. Returns the number of rows marked.
+    """
+    if vanished.empty:
+        return 0
+
+    now = now or datetime.utcnow()
+    history = pd.DataFrame({
+        'property_id': vanished['property_id'],
+        'ts': now,
+        'changed_fields': 'status',
+        'old_price': vanished['list_price'],
+        'new_price': vanished['list_price'],
+        'old_status': vanished['status'],
+        'new_status': OFF_MARKET_STATUS,
+    })
+    history = history.astype(object).where(history.notna(), None)
+    db.execute(dialect_insert(PropertyHistory.__table__, db.get_bind().dialect.name), _to_records(history))
+
+    table = Property.__table__
+    values = {'status': OFF_MARKET_STATUS, 'content_hash': None, 'last_updated': now}
+    if row_version is not None:
+        values['row_version'] = row_version
+    property_ids = list(vanished['property_id'])
+    for start in range(0, len(property_ids), QUERY_CHUNK_SIZE):
+        chunk = property_ids[start:start + QUERY_CHUNK_SIZE]
+        db.execute(table.update()
+                   .where(table.c.property_id.in_(chunk))
+                   .values(**values))
+    return len(property_ids)
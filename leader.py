@@ -0,0 +1,78 @@
+from sqlalchemy import case, delete, or_, select
+from models import SchedulerLease, SessionLocal, dialect_insert
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# A lease not renewed within this many seconds is up for grabs
+LEASE_TTL_SECONDS = int(os.environ.get('LEADER_LEASE_TTL', 90))
+
+class LeaderLease:
+    """A named lease in the database that at most one process holds at a time.
+
+    The holder renews it by calling try_acquire() well within LEASE_TTL_SECONDS;
+    if the holder dies, another process takes over once the lease expires.
+    Expiry uses each host's clock, so hosts need roughly synchronized time.
+    """
+
+    def __init__(self, name, ttl_seconds=LEASE_TTL_SECONDS):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def try_acquire(self):
+        """Take or renew the lease; True if this process holds it afterwards"""
+        table = SchedulerLease.__table__
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            stmt = dialect_insert(table, db.get_bind().dialect.name).values(
+                name=self.name, holder=self.holder, acquired_at=now, expires_at=now + self.ttl
+            )
+            # Only renew our own lease or take over an expired one
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={
+                    'holder': stmt.excluded.holder,
+                    'acquired_at': case((table.c.holder == self.holder, table.c.acquired_at), else_=stmt.excluded.acquired_at),
+                    'expires_at': stmt.excluded.expires_at,
+                },
+                where=or_(table.c.holder == self.holder, table.c.expires_at < now)
+            ))
+            holder = db.execute(select(table.c.holder).where(table.c.name == self.name)).scalar()
+            db.commit()
+            return holder == self.holder
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error acquiring {self.name} lease: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+    def release(self):
+        """Give up the lease, if held, so another process can take over immediately"""
+        table = SchedulerLease.__table__
+        db = SessionLocal()
+        try:
+            db.execute(delete(table).where(table.c.name == self.name, table.c.holder == self.holder))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error releasing {self.name} lease: {str(e)}")
+        finally:
+            db.close()
+
+    def current_holder(self):
+        """Holder of an unexpired lease, or None"""
+        db = SessionLocal()
+        try:
+            lease = db.query(SchedulerLease).filter(SchedulerLease.name == self.name).first()
+            if lease is None or lease.expires_at < datetime.utcnow():
+                return None
+            return lease.holder
+        finally:
+            db.close()
@@ -0,0 +1,139 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, start_http_server
+from prometheus_client import multiprocess
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy.pool import QueuePool
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# With several processes (gunicorn workers, worker.py) point this at a directory they
+# all share, and /metrics reports the combined metrics of every process
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+# A separate worker.py on another host can serve its own metrics on this port
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 0))
+
+# Scrape stages run from seconds (a single radius fetch) to minutes (a full single pass)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_LATENCY = Histogram(
+    'homescraper_http_request_duration_seconds',
+    'Time to produce a response (streamed bodies excluded), by route',
+    ['method', 'route', 'status']
+)
+SCRAPE_STAGE_SECONDS = Histogram(
+    'homescraper_scrape_stage_duration_seconds',
+    'Time spent in each scrape stage: fetch (per radius), dedup, normalize, detect, upsert, aggregate, events, commit, reconcile',
+    ['stage'], buckets=STAGE_BUCKETS
+)
+SCRAPE_JOB_SECONDS = Histogram(
+    'homescraper_scrape_job_duration_seconds',
+    'Duration of whole scrape jobs',
+    ['trigger', 'status'], buckets=STAGE_BUCKETS
+)
+SCRAPE_ROWS = Counter(
+    'homescraper_scrape_rows_total',
+    'Scraped listings by outcome: fetched, duplicate, skipped (no id), added, changed, unchanged, off_market (vanished)',
+    ['outcome']
+)
+SCRAPE_ERRORS = Counter(
+    'homescraper_scrape_errors_total',
+    'Failed fetches (after retries), failed batch writes and skipped reconciliations (stage reconcile), by stage and radius',
+    ['stage', 'radius']
+)
+FETCH_RETRIES = Counter(
+    'homescraper_scrape_fetch_retries_total',
+    'Fetch attempts that failed and were retried'
+)
+DB_WRITER_WAIT_SECONDS = Histogram(
+    'homescraper_db_writer_wait_seconds',
+    'Time waiting for the single SQLite writer connection, i.e. for the database write lock',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+)
+PHOTO_CACHE_LOOKUPS = Counter(
+    'homescraper_photo_cache_lookups_total',
+    'Photo thumbnail lookups by result: hit, fetched (miss stored), failed (miss not fetched)',
+    ['result']
+)
+PHOTO_CACHE_EVICTIONS = Counter(
+    'homescraper_photo_cache_evictions_total',
+    'Cached photo thumbnails evicted to keep the cache within its size limit'
+)
+PROPERTIES_STORED = Gauge(
+    'homescraper_properties',
+    'Stored properties, by whether they are favorited',
+    ['favorited'], multiprocess_mode='mostrecent'
+)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waits in DB_WRITER_WAIT_SECONDS.
+
+    Used for the single-connection SQLite writer engine, where writers queue for the
+    connection instead of for SQLite's lock, so the wait is the lock wait.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_WRITER_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+class StageTimings:
+    """Per-scrape totals of the time spent in each stage, alongside SCRAPE_STAGE_SECONDS.
+
+    Stages may be timed from several fetch threads at once.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one span of the given stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            SCRAPE_STAGE_SECONDS.labels(name).observe(elapsed)
+            with self._lock:
+                self.totals[name] = self.totals.get(name, 0.0) + elapsed
+
+    def summary(self):
+        """Stage totals, longest first, e.g. 'fetch 41.2s, upsert 3.1s'"""
+        with self._lock:
+            stages = sorted(self.totals.items(), key=lambda item: item[1], reverse=True)
+        return ', '.join(f"{name} {seconds:.1f}s" for name, seconds in stages)
+
+def render_metrics():
+    """(body, content type) of every metric, combined across processes in multiprocess mode"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def start_worker_metrics_server():
+    """Serve this process's metrics on WORKER_METRICS_PORT, if set"""
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT)
+        logger.info(f"Serving worker metrics on port {WORKER_METRICS_PORT}")
+
+def start_request_timer():
+    """before_request hook: note when the request started"""
+    g.request_started_at = time.perf_counter()
+
+def observe_request_latency(response):
+    """after_request hook: record the request's latency under its route pattern"""
+    started_at = g.pop('request_started_at', None)
+    if started_at is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started_at)
+    return response
@@ -0,0 +1,173 @@
+from sqlalchemy import inspect, select, text, update, Column, DateTime, Integer, MetaData, String, Table
+from models import Base, DataGeneration, MarketAggregate, Property, PropertyEvent, PropertyStats, ScrapeJob, ScrapeRun, SchedulerLease, SearchLocation
+from search import create_search_index
+from spatial import create_spatial_index
+from stats import refresh_property_stats
+from analytics import rebuild_market_aggregates
+from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Applied migrations, one row per version
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes concurrent upgrades
+MIGRATION_LOCK_KEY = 7301
+
+def add_missing_columns(conn, table_names=None):
+    """Add columns that exist on the models but not yet in an existing database.
+
+    create_all only creates missing tables, so new nullable columns have to be
+    added to older databases by hand.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if table_names is not None and table.name not in table_names:
+            continue
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def add_missing_indexes(conn, table_names=None):
+    """Create indexes defined on the models that an existing database doesn't have yet"""
+    for table in Base.metadata.sorted_tables:
+        if table_names is not None and table.name not in table_names:
+            continue
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+def migration_001_baseline(conn):
+    """Schema as of the introduction of versioned migrations.
+
+    Databases created before then were built with create_all plus ad hoc column
+    and index additions, so this brings any of them (or an empty one) up to date.
+    """
+    Base.metadata.create_all(bind=conn)
+    add_missing_columns(conn)
+    add_missing_indexes(conn)
+
+def migration_002_multi_process(conn):
+    """Stored scrape jobs, the scheduler leader lease and the shared cache generation"""
+    for table in (ScrapeJob.__table__, SchedulerLease.__table__, DataGeneration.__table__):
+        table.create(bind=conn, checkfirst=True)
+    add_missing_indexes(conn, {ScrapeJob.__tablename__})
+    if conn.execute(select(DataGeneration.id)).first() is None:
+        conn.execute(DataGeneration.__table__.insert().values(id=1, generation=0))
+
+def migration_003_search_index(conn):
+    """Full-text index over property addresses, towns and descriptions"""
+    create_search_index(conn)
+
+def migration_004_spatial_index(conn):
+    """Property coordinates and a spatial index over them"""
+    add_missing_columns(conn, {Property.__tablename__})
+    create_spatial_index(conn)
+
+def migration_005_scrape_runs(conn):
+    """Scrape run ledger, backfilled from finished jobs, and the stored property counts"""
+    for table in (ScrapeRun.__table__, PropertyStats.__table__):
+        table.create(bind=conn, checkfirst=True)
+    add_missing_indexes(conn, {ScrapeRun.__tablename__})
+    if conn.execute(select(ScrapeRun.id).limit(1)).first() is None:
+        jobs = conn.execute(select(ScrapeJob.__table__)
+                            .where(ScrapeJob.status.in_(('succeeded', 'failed')), ScrapeJob.started_at.isnot(None))
+                            .order_by(ScrapeJob.started_at)).all()
+        for job in jobs:
+            duration = (job.finished_at - job.started_at).total_seconds() if job.finished_at else None
+            conn.execute(ScrapeRun.__table__.insert().values(
+                job_id=job.id, trigger=job.trigger, status=job.status,
+                started_at=job.started_at, finished_at=job.finished_at, duration_seconds=duration,
+                rows_processed=job.rows_processed, added=job.added, changed=job.changed, unchanged=job.unchanged,
+                error_count=1 if job.error else 0, errors=json.dumps([job.error]) if job.error else None
+            ))
+    refresh_property_stats(conn)
+
+def migration_006_incremental_scrape(conn):
+    """Search location watermarks for incremental scraping, and off-market counts in the run ledger"""
+    add_missing_columns(conn, {SearchLocation.__tablename__, ScrapeRun.__tablename__})
+
+def migration_007_market_aggregates(conn):
+    """Market analytics aggregates, computed from the stored listings"""
+    MarketAggregate.__table__.create(bind=conn, checkfirst=True)
+    rebuild_market_aggregates(conn)
+
+def migration_008_property_events(conn):
+    """Feed of listing changes for the /events stream"""
+    PropertyEvent.__table__.create(bind=conn, checkfirst=True)
+
+def migration_009_row_version(conn):
+    """Per-row change version behind /properties/changes; existing rows start at version 0"""
+    add_missing_columns(conn, {Property.__tablename__})
+    conn.execute(update(Property.__table__).where(Property.__table__.c.row_version.is_(None)).values(row_version=0))
+    add_missing_indexes(conn, {Property.__tablename__})
+
+# Ordered (version, name, function). Append new migrations here; never edit or renumber
+# one that has shipped. Since the baseline creates tables from the current models,
+# later migrations must tolerate their change already being present.
+MIGRATIONS = [
+    (1, 'baseline', migration_001_baseline),
+    (2, 'multi_process', migration_002_multi_process),
+    (3, 'search_index', migration_003_search_index),
+    (4, 'spatial_index', migration_004_spatial_index),
+    (5, 'scrape_runs', migration_005_scrape_runs),
+    (6, 'incremental_scrape', migration_006_incremental_scrape),
+    (7, 'market_aggregates', migration_007_market_aggregates),
+    (8, 'property_events', migration_008_property_events),
+    (9, 'row_version', migration_009_row_version),
+]
+
+def current_version(conn):
+    """Highest applied migration version, or 0 for a database without migrations"""
+    schema_migrations.create(bind=conn, checkfirst=True)
+    version = conn.execute(text('SELECT MAX(version) FROM schema_migrations')).scalar()
+    return version or 0
+
+def upgrade(db_engine, target=None):
+    """Apply every pending migration in order, each in its own transaction.
+
+    Returns the schema version afterwards.
+    """
+    version = 0
+    for number, name, migrate in MIGRATIONS:
+        if target is not None and number > target:
+            break
+        with db_engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                # Several workers may start at once; the others wait here and then skip
+                conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            version = current_version(conn)
+            if number <= version:
+                continue
+            logger.info(f"Applying migration {number}: {name}")
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            version = number
+    return version
+
+if __name__ == '__main__':
+    import argparse
+    from models import engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Apply pending database migrations')
+    parser.add_argument('--target', type=int, help='stop after this version')
+    parser.add_argument('--status', action='store_true', help='only print the current version')
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.begin() as conn:
+            print(f"Schema version {current_version(conn)} of {MIGRATIONS[-1][0]}")
+    else:
+        print(f"Schema version {upgrade(engine, args.target)}")
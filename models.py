@@ -1,13 +1,91 @@
-from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, Text, Boolean
+from sqlalchemy import create_engine, event, BigInteger, Column, String, Integer, Float, DateTime, Text, Boolean, Index
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from metrics import TimedQueuePool
 from datetime import datetime
+import json
+import math
 import os
+import sqlite3
 
-# Database setup
-DATABASE_URL = "sqlite:///properties.db"
-engine = create_engine(DATABASE_URL, echo=False)
+# Database setup; DATABASE_PATH puts the SQLite file somewhere else (e.g. a Docker volume)
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'properties.db')
+DATABASE_URL = os.environ.get('DATABASE_URL', f"sqlite:///{DATABASE_PATH}")
+
+# Applied to every SQLite connection. WAL lets readers run while a scrape commits;
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),  # negative means KiB rather than pages
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# Read-only connections kept open for API requests
+READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8))
+
+# Server databases (PostgreSQL) take concurrent writers, so the writer engine pools too
+WRITE_POOL_SIZE = int(os.environ.get('DB_WRITE_POOL_SIZE', 5))
+
+# Reads can go to a replica; by default they use the same database
+DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL', DATABASE_URL)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record, read_only=False):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def _register_sqlite_math(dbapi_connection):
+    # Distance queries use SQL math functions, which SQLite only has when built with them
+    try:
+        dbapi_connection.execute("SELECT sin(0)")
+    except sqlite3.OperationalError:
+        for name in ('sin', 'cos', 'asin', 'sqrt', 'radians'):
+            dbapi_connection.create_function(name, 1, getattr(math, name), deterministic=True)
+
+def _create_engine(url, read_only=False):
+    if not url.startswith('sqlite'):
+        pool_size = READ_POOL_SIZE if read_only else WRITE_POOL_SIZE
+        db_engine = create_engine(url, echo=False, pool_pre_ping=True, pool_size=pool_size, max_overflow=pool_size)
+        if read_only and db_engine.dialect.name == 'postgresql':
+            db_engine = db_engine.execution_options(postgresql_readonly=True)
+        return db_engine
+    
+    # The pool shares connections across request and scraper threads; SQLite's
+    # busy_timeout handles the locking between them
+    options = {'check_same_thread': False}
+    if read_only:
+        db_engine = create_engine(url, echo=False, connect_args=options,
+                                  pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_SIZE)
+    else:
+        # SQLite allows one writer at a time, so writers queue for a single connection
+        # here instead of contending for the database lock (the wait is measured as
+        # the lock wait metric)
+        db_engine = create_engine(url, echo=False, connect_args=options, poolclass=TimedQueuePool,
+                                  pool_size=1, max_overflow=0, pool_timeout=60)
+    event.listen(db_engine, 'connect', lambda conn, record: _set_sqlite_pragmas(conn, record, read_only))
+    event.listen(db_engine, 'connect', lambda conn, record: _register_sqlite_math(conn))
+    return db_engine
+
+# Writer engine for scrapes and other updates, and a separate pooled engine for reads
+engine = _create_engine(DATABASE_URL)
+read_engine = _create_engine(DATABASE_READ_URL, read_only=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+def dialect_insert(table, dialect_name=None):
+    """INSERT construct for the backend (the app's engine by default) with native ON CONFLICT support"""
+    if (dialect_name or engine.dialect.name) == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 Base = declarative_base()
 
 class Settings(Base):
@@ -20,6 +98,7 @@ class Settings(Base):
     update_interval = Column(Integer, default=1)  # hours
     search_radius = Column(Integer, default=30)   # miles
     search_time_range = Column(Integer, default=365)  # days
+    scrape_mode = Column(String, default='single_pass')  # 'single_pass' or 'radius_sweep'
     
     # Tracking fields
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -30,11 +109,23 @@ class Settings(Base):
             'update_interval': self.update_interval,
             'search_radius': self.search_radius,
             'search_time_range': self.search_time_range,
+            'scrape_mode': self.scrape_mode,
             'last_updated': self.last_updated.isoformat() if self.last_updated else None
         }
 
 class Property(Base):
     __tablename__ = "properties"
+    __table_args__ = (
+        # (column, property_id) indexes back filtering and keyset pagination on each sort key
+        Index('ix_properties_list_price_property_id', 'list_price', 'property_id'),
+        Index('ix_properties_sqft_property_id', 'sqft', 'property_id'),
+        Index('ix_properties_lot_acre_property_id', 'lot_acre', 'property_id'),
+        Index('ix_properties_beds_property_id', 'beds', 'property_id'),
+        Index('ix_properties_estdist_property_id', 'estdist', 'property_id'),
+        Index('ix_properties_favorited_property_id', 'favorited', 'property_id'),
+        # Backs /properties/changes, which pages through rows changed after a (row_version, property_id) token
+        Index('ix_properties_row_version_property_id', 'row_version', 'property_id'),
+    )
     
     # Primary key
     property_id = Column(String, primary_key=True, index=True)
@@ -57,6 +148,8 @@ class Property(Base):
     parking_garage = Column(Float)
     favorited = Column(Boolean, default=False)
     estdist = Column(Integer)  # Estimated distance in miles from search center
+    latitude = Column(Float)   # Indexed spatially; see spatial.py
+    longitude = Column(Float)
     
     # Listing information
     listing_date = Column(String)
@@ -66,8 +159,10 @@ class Property(Base):
     status = Column(String)
     
     # Tracking fields
+    content_hash = Column(String)  # Fingerprint of the scraped fields, used to skip unchanged rows
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     first_seen = Column(DateTime, default=datetime.utcnow)
+    row_version = Column(BigInteger, default=0)  # Data generation of the last change; see /properties/changes
     
     def to_dict(self):
         """Convert Property object to dictionary for JSON serialization"""
@@ -88,6 +183,8 @@ class Property(Base):
             'parking_garage': self.parking_garage,
             'favorited': self.favorited,
             'estdist': self.estdist,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
             'listing_date': self.listing_date,
             'primary_photo': self.primary_photo,
             'description': self.description,
@@ -97,9 +194,233 @@ class Property(Base):
             'first_seen': self.first_seen.isoformat() if self.first_seen else None
         }
 
+# Fields a client can request from the property endpoints, in to_dict() order
+PROPERTY_FIELDS = [
+    'property_id', 'address', 'city', 'state', 'zip_code', 'sqft', 'lot_acre',
+    'list_price', 'beds', 'baths', 'year_built', 'property_type', 'stories',
+    'parking_garage', 'favorited', 'estdist', 'latitude', 'longitude', 'listing_date', 'primary_photo',
+    'description', 'url', 'status', 'last_updated', 'first_seen'
+]
+
+# Lightweight list representation: everything a property card shows except the description
+SUMMARY_FIELDS = [field for field in PROPERTY_FIELDS if field not in ('description', 'listing_date')]
+
+class PropertyHistory(Base):
+    __tablename__ = "property_history"
+    __table_args__ = (
+        Index('ix_property_history_property_id_ts', 'property_id', 'ts'),
+    )
+    
+    # Append-only: one compact row per detected change, never updated
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    property_id = Column(String, nullable=False)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    changed_fields = Column(String)  # Comma-separated Property column names, or 'listed' for a new listing
+    
+    old_price = Column(Integer)
+    new_price = Column(Integer)
+    old_status = Column(String)
+    new_status = Column(String)
+    
+    def to_dict(self):
+        """Convert PropertyHistory object to dictionary for JSON serialization"""
+        return {
+            'property_id': self.property_id,
+            'ts': self.ts.isoformat() if self.ts else None,
+            'changed_fields': self.changed_fields.split(',') if self.changed_fields else [],
+            'old_price': self.old_price,
+            'new_price': self.new_price,
+            'old_status': self.old_status,
+            'new_status': self.new_status
+        }
+
+class SearchLocation(Base):
+    __tablename__ = "search_locations"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    location = Column(String, nullable=False)  # Anything homeharvest accepts: address, city, zip
+    
+    # Per-location overrides; NULL uses the global settings
+    radius = Column(Integer)  # miles
+    time_range = Column(Integer)  # days
+    
+    listing_types = Column(String, default='for_sale')  # Comma-separated homeharvest listing types
+    enabled = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Incremental scraping: when the last complete fetch and the last full fetch started,
+    # and the search parameters they used (changing them forces a full fetch)
+    watermark = Column(DateTime)
+    reconciled_at = Column(DateTime)
+    fetch_key = Column(String)
+    
+    def listing_type_list(self):
+        """Listing types as a list"""
+        return [t.strip() for t in (self.listing_types or '').split(',') if t.strip()]
+    
+    def to_dict(self):
+        """Convert SearchLocation object to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'location': self.location,
+            'radius': self.radius,
+            'time_range': self.time_range,
+            'listing_types': self.listing_type_list(),
+            'enabled': self.enabled,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'reconciled_at': self.reconciled_at.isoformat() if self.reconciled_at else None
+        }
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+    
+    # Status and progress of one scrape run, manual or scheduled. Jobs are stored so any
+    # web worker can submit or report on them while the scraper worker runs them.
+    id = Column(String, primary_key=True)  # uuid4 hex
+    trigger = Column(String, nullable=False)  # 'manual', 'scheduled' or 'startup'
+    status = Column(String, nullable=False, default='queued', index=True)  # queued -> running -> succeeded/failed
+    stage = Column(String)
+    current_batch = Column(String)
+    rows_processed = Column(Integer, default=0)
+    added = Column(Integer, default=0)
+    changed = Column(Integer, default=0)
+    unchanged = Column(Integer, default=0)
+    error = Column(Text)
+    submitted_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+    
+    def to_dict(self):
+        """Convert ScrapeJob object to dictionary for JSON serialization"""
+        return {
+            'job_id': self.id,
+            'trigger': self.trigger,
+            'status': self.status,
+            'stage': self.stage,
+            'current_batch': self.current_batch,
+            'rows_processed': self.rows_processed,
+            'added': self.added,
+            'changed': self.changed,
+            'unchanged': self.unchanged,
+            'error': self.error,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ScrapeRun(Base):
+    __tablename__ = "scrape_runs"
+
+    # Ledger of finished scrape jobs, one row each, written once when the job ends.
+    # Unlike scrape_jobs rows it keeps what the run fetched, skipped and spent its time on.
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, index=True)
+    trigger = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # 'succeeded' or 'failed'
+    scrape_mode = Column(String)
+    params = Column(Text)  # JSON: settings and search locations the run used
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime)
+    duration_seconds = Column(Float)
+    rows_fetched = Column(Integer, default=0)
+    duplicates = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)  # Listings without a valid id
+    rows_processed = Column(Integer, default=0)
+    added = Column(Integer, default=0)
+    changed = Column(Integer, default=0)
+    unchanged = Column(Integer, default=0)
+    off_market = Column(Integer, default=0)  # Vanished listings marked off-market by a full fetch
+    error_count = Column(Integer, default=0)
+    errors = Column(Text)  # JSON list of messages
+    stage_timings = Column(Text)  # JSON {stage: seconds}
+
+    def to_dict(self):
+        """Convert ScrapeRun object to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'trigger': self.trigger,
+            'status': self.status,
+            'scrape_mode': self.scrape_mode,
+            'params': json.loads(self.params) if self.params else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration_seconds,
+            'rows_fetched': self.rows_fetched,
+            'duplicates': self.duplicates,
+            'skipped': self.skipped,
+            'rows_processed': self.rows_processed,
+            'added': self.added,
+            'changed': self.changed,
+            'unchanged': self.unchanged,
+            'off_market': self.off_market,
+            'error_count': self.error_count,
+            'errors': json.loads(self.errors) if self.errors else [],
+            'stage_timings': json.loads(self.stage_timings) if self.stage_timings else {}
+        }
+
+class PropertyStats(Base):
+    __tablename__ = "property_stats"
+
+    # Single row of property counts, adjusted in the same transaction as each change to
+    # properties so /stats and /metrics never count the whole table
+    id = Column(Integer, primary_key=True, default=1)
+    total = Column(Integer, nullable=False, default=0)
+    favorited = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+class MarketAggregate(Base):
+    __tablename__ = "market_aggregates"
+    
+    # Listing counts and sums per group and price bucket, adjusted as listings are stored
+    # (see analytics.py) so market analytics read O(groups) rows rather than every listing
+    dimension = Column(String, primary_key=True)  # 'all', 'city', 'zip_code', 'property_type' or 'estdist_band'
+    group_key = Column(String, primary_key=True)
+    price_bucket = Column(Integer, primary_key=True)  # Log-spaced list price bucket; -1 for no price
+    listings = Column(Integer, nullable=False, default=0)
+    price_sum = Column(BigInteger, nullable=False, default=0)
+    # Listings with both a price and square footage, for price per square foot
+    sqft_listings = Column(Integer, nullable=False, default=0)
+    sqft_price_sum = Column(BigInteger, nullable=False, default=0)
+    sqft_sum = Column(BigInteger, nullable=False, default=0)
+
+class PropertyEvent(Base):
+    __tablename__ = "property_events"
+    # AUTOINCREMENT so SQLite never reuses the ids of pruned events, which clients resume from
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    # Append-only feed of listing changes pushed by GET /events (see events.py); the id
+    # is the SSE event id. Pruned after EVENT_RETENTION_HOURS
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    event_type = Column(String, nullable=False)  # 'added', 'changed', 'removed' or 'favorite'
+    payload = Column(Text, nullable=False)  # JSON
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+    
+    # A named lock that expires unless renewed, so a dead holder is replaced
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class DataGeneration(Base):
+    __tablename__ = "data_generation"
+    
+    # Single row; bumped whenever stored data changes so every process's response cache can tell
+    id = Column(Integer, primary_key=True, default=1)
+    generation = Column(Integer, nullable=False, default=0)
+
 def create_tables():
-    """Create all tables in the database"""
-    Base.metadata.create_all(bind=engine)
+    """Create or upgrade the database schema by applying pending migrations"""
+    from migrations import upgrade
+    upgrade(engine)
 
 def get_db():
     """Get database session"""
@@ -0,0 +1,496 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from urllib.request import Request, urlopen
+from models import DATABASE_PATH
+from metrics import PHOTO_CACHE_EVICTIONS, PHOTO_CACHE_LOOKUPS
+import hashlib
+import io
+import logging
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is a requirement, but without it the CDN's resized rendition is cached as is
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails live next to the database by default, so Docker keeps them on the data volume
+PHOTO_CACHE_DIR = os.environ.get('PHOTO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'photo_cache'))
+PHOTO_CACHE_MAX_BYTES = int(os.environ.get('PHOTO_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Eviction trims the cache to this fraction of its limit so it doesn't run on every store
+PHOTO_CACHE_LOW_WATER = 0.9
+
+# Remote photos larger than this are refused rather than cached
+MAX_PHOTO_BYTES = 5 * 1024 * 1024
+
+# Thumbnails fit within this box; realtor.com's CDN resizes to the w query parameter
+THUMBNAIL_WIDTH = int(os.environ.get('THUMBNAIL_WIDTH', 480))
+THUMBNAIL_HEIGHT = THUMBNAIL_WIDTH * 3 // 4
+
+PHOTO_FETCH_TIMEOUT = float(os.environ.get('PHOTO_FETCH_TIMEOUT', 10))
+
+# A photo that failed to fetch isn't tried again for this long, so a throttling CDN
+# isn't hit again on every view; at most this many failures are remembered
+PHOTO_RETRY_SECONDS = float(os.environ.get('PHOTO_RETRY_SECONDS', 300))
+MAX_REMEMBERED_FAILURES = 10_000
+
+# Background threads fetching thumbnails of newly scraped listings, and how many
+# photos may wait for them; past that prefetches are dropped and fetched on first view
+PHOTO_PREFETCH_WORKERS = int(os.environ.get('PHOTO_PREFETCH_WORKERS', 4))
+PHOTO_PREFETCH_QUEUE_SIZE = 50_000
+
+# Fetch photos from this origin (scheme://host:port) instead of the one in their URL,
+# e.g. the local stand-in server (python photos.py stand-in) in development
+PHOTO_ORIGIN = os.environ.get('PHOTO_ORIGIN')
+
+# Browsers may reuse a thumbnail this long without asking again. A photo requested with
+# ?v=<version of its URL> never changes, since a new photo URL means a new version
+PHOTO_MAX_AGE = 7 * 24 * 3600
+PHOTO_VERSIONED_MAX_AGE = 365 * 24 * 3600
+
+# Temporary files older than this were left by a process that died mid-write
+STALE_TEMP_SECONDS = 3600
+
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF8', 'gif'),
+)
+PHOTO_MIMETYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+class PhotoFetchError(Exception):
+    """A photo could not be fetched from its origin, or wasn't an image"""
+
+def image_format(data):
+    """File extension of an image's format from its leading bytes, or None if it isn't one we serve"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+def photo_mimetype(path):
+    """Content type of a cached thumbnail, from its extension"""
+    return PHOTO_MIMETYPES.get(path.rsplit('.', 1)[-1], 'application/octet-stream')
+
+def thumbnail_url(url):
+    """The URL of url's thumbnail-sized rendition, fetched from PHOTO_ORIGIN when set"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query)
+    if any(name == 'w' for name, _ in query):
+        query = [(name, str(THUMBNAIL_WIDTH) if name == 'w' else value) for name, value in query]
+    scheme, netloc = parts.scheme, parts.netloc
+    if PHOTO_ORIGIN:
+        origin = urlsplit(PHOTO_ORIGIN)
+        scheme, netloc = origin.scheme, origin.netloc
+    return urlunsplit((scheme, netloc, parts.path, urlencode(query), ''))
+
+def make_thumbnail(data):
+    """Shrink an image to fit THUMBNAIL_WIDTH x THUMBNAIL_HEIGHT with Pillow, if installed.
+
+    Images already that small, or that Pillow can't read, are kept as they are.
+    """
+    if Image is None:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width <= THUMBNAIL_WIDTH and image.height <= THUMBNAIL_HEIGHT:
+                return data
+            image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='WEBP', quality=80)
+            return output.getvalue()
+    except Exception as e:
+        logger.debug(f"Keeping photo as fetched, Pillow could not resize it: {str(e)}")
+        return data
+
+def _write_atomic(path, data):
+    """Write a file under a temporary name and rename it into place"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class PhotoCache:
+    """Content-addressed on-disk cache of listing photo thumbnails, bounded in size with LRU eviction.
+
+    Each distinct thumbnail is stored once as blobs/<sha256 of its bytes>.<format>, and
+    each photo URL points at its blob through a small file under urls/<sha256 of the URL>.
+    Lookups touch both files, so their modification times order eviction. Files are
+    written under temporary names and renamed into place, so web workers and the scraper
+    worker can share one directory; every process evicts once it sees the cache too big.
+    """
+
+    def __init__(self, directory=PHOTO_CACHE_DIR, max_bytes=PHOTO_CACHE_MAX_BYTES,
+                 fetch_timeout=PHOTO_FETCH_TIMEOUT, prefetch_workers=PHOTO_PREFETCH_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetch_timeout = fetch_timeout
+        self.prefetch_workers = prefetch_workers
+        self._size_bytes = None  # Counted on first use, then tracked and recounted by each eviction
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._fetching = {}  # URL -> Event set once its fetch ends, so concurrent misses fetch once
+        self._failed_at = {}  # URL -> when its last fetch failed
+        self._prefetch_queue = None
+        self.hits = 0
+        self.fetched = 0
+        self.failed = 0
+        self.evictions = 0
+
+    def _blob_path(self, name):
+        return os.path.join(self.directory, 'blobs', name[:2], name)
+
+    def _pointer_path(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, 'urls', digest[:2], digest)
+
+    def contains(self, url):
+        """Whether url's thumbnail is cached, without counting as a use"""
+        return os.path.exists(self._pointer_path(url))
+
+    def lookup(self, url):
+        """(path, content hash) of url's cached thumbnail, marked as just used; None if not cached"""
+        pointer = self._pointer_path(url)
+        try:
+            with open(pointer) as f:
+                name = f.read().strip()
+            path = self._blob_path(name)
+            os.utime(path)
+            os.utime(pointer)
+        except OSError:
+            # Not cached, or evicted by another process since
+            return None
+        return path, name.split('.')[0]
+
+    def get(self, url):
+        """(path, content hash) of url's thumbnail, fetching and storing it if it isn't cached.
+
+        Raises PhotoFetchError when it isn't cached and can't be fetched.
+        """
+        cached = self.lookup(url)
+        if cached is not None:
+            self.hits += 1
+            PHOTO_CACHE_LOOKUPS.labels('hit').inc()
+            return cached
+
+        with self._lock:
+            failed_at = self._failed_at.get(url)
+            if failed_at is not None and time.monotonic() - failed_at < PHOTO_RETRY_SECONDS:
+                raise PhotoFetchError(f"Photo {url} failed to fetch recently, not retrying yet")
+            pending = self._fetching.get(url)
+            fetching = pending is None
+            if fetching:
+                pending = self._fetching[url] = threading.Event()
+        if not fetching:
+            # Another thread is already fetching this photo; use its result
+            pending.wait(self.fetch_timeout * 2)
+            cached = self.lookup(url)
+            if cached is None:
+                raise PhotoFetchError(f"Could not fetch photo {url}")
+            return cached
+
+        try:
+            stored = self.store(url, make_thumbnail(self.fetch(url)))
+            self.fetched += 1
+            PHOTO_CACHE_LOOKUPS.labels('fetched').inc()
+            return stored
+        except PhotoFetchError:
+            with self._lock:
+                if len(self._failed_at) >= MAX_REMEMBERED_FAILURES:
+                    self._failed_at.clear()
+                self._failed_at[url] = time.monotonic()
+            self.failed += 1
+            PHOTO_CACHE_LOOKUPS.labels('failed').inc()
+            raise
+        finally:
+            with self._lock:
+                del self._fetching[url]
+            pending.set()
+
+    def fetch(self, url):
+        """Download the thumbnail-sized rendition of a photo URL"""
+        source = thumbnail_url(url)
+        try:
+            with urlopen(Request(source, headers={'User-Agent': 'homescraper-photo-cache'}), timeout=self.fetch_timeout) as response:
+                data = response.read(MAX_PHOTO_BYTES + 1)
+        except (OSError, ValueError) as e:
+            # HTTP errors (e.g. 429 from a throttling CDN), timeouts and malformed URLs
+            raise PhotoFetchError(f"Error fetching photo {source}: {str(e)}")
+        if len(data) > MAX_PHOTO_BYTES:
+            raise PhotoFetchError(f"Photo {source} is larger than {MAX_PHOTO_BYTES} bytes")
+        if image_format(data) is None:
+            raise PhotoFetchError(f"Photo {source} is not a PNG, JPEG, GIF or WebP image")
+        return data
+
+    def store(self, url, data):
+        """Cache a thumbnail for url, returning (path, content hash) like lookup"""
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{image_format(data)}"
+        path = self._blob_path(name)
+        added = 0
+        if os.path.exists(path):
+            # The same image under another URL (or a re-fetch) is stored once
+            os.utime(path)
+        else:
+            _write_atomic(path, data)
+            added = len(data)
+        _write_atomic(self._pointer_path(url), name.encode())
+
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = sum(size for _, size, _ in self._scan_blobs())
+            else:
+                self._size_bytes += added
+            over_limit = self._size_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+        return path, digest
+
+    def _scan_blobs(self):
+        """(modification time, size, path) of every cached thumbnail"""
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith('.tmp'):
+                    if time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+                        os.remove(path)
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+        return blobs
+
+    def evict(self):
+        """Remove the least recently used thumbnails until the cache is back under its low-water mark.
+
+        Returns the number removed. Pointers to removed thumbnails are removed too.
+        """
+        if not self._evict_lock.acquire(blocking=False):
+            return 0  # Another thread is already evicting
+        try:
+            blobs = sorted(self._scan_blobs())
+            total = sum(size for _, size, _ in blobs)
+            target = self.max_bytes * PHOTO_CACHE_LOW_WATER
+            removed = set()
+            for _, size, path in blobs:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.add(os.path.basename(path))
+
+            if removed:
+                self._remove_dangling_pointers()
+                self.evictions += len(removed)
+                PHOTO_CACHE_EVICTIONS.inc(len(removed))
+                logger.info(f"Evicted {len(removed)} cached photos, {total} bytes remain")
+            with self._lock:
+                self._size_bytes = total
+            return len(removed)
+        finally:
+            self._evict_lock.release()
+
+    def _remove_dangling_pointers(self):
+        """Remove URL pointers whose thumbnail is gone (evicted here or by another process)"""
+        for root, _, files in os.walk(os.path.join(self.directory, 'urls')):
+            for name in files:
+                pointer = os.path.join(root, name)
+                try:
+                    with open(pointer) as f:
+                        target = f.read().strip()
+                    if not name.endswith('.tmp') and not os.path.exists(self._blob_path(target)):
+                        os.remove(pointer)
+                except OSError:
+                    continue
+
+    def prefetch(self, urls):
+        """Queue the thumbnails of photo URLs that aren't cached yet for the background fetchers.
+
+        Returns the number queued; when the queue is full the rest are left for their first view.
+        """
+        if self.prefetch_workers < 1:
+            return 0
+        with self._lock:
+            if self._prefetch_queue is None:
+                self._prefetch_queue = queue.Queue(maxsize=PHOTO_PREFETCH_QUEUE_SIZE)
+                for index in range(self.prefetch_workers):
+                    # Daemon threads, so pending prefetches never hold up shutdown
+                    threading.Thread(target=self._prefetch_loop, name=f'photo-prefetch-{index}', daemon=True).start()
+        queued = 0
+        for url in dict.fromkeys(urls):
+            if not url or self.contains(url):
+                continue
+            try:
+                self._prefetch_queue.put_nowait(url)
+            except queue.Full:
+                logger.warning("Photo prefetch queue is full, leaving the remaining photos for their first view")
+                break
+            queued += 1
+        return queued
+
+    def _prefetch_loop(self):
+        while True:
+            url = self._prefetch_queue.get()
+            try:
+                if not self.contains(url):
+                    self.get(url)
+            except PhotoFetchError as e:
+                logger.debug(f"Photo prefetch failed: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error prefetching photo {url}: {str(e)}")
+            finally:
+                self._prefetch_queue.task_done()
+
+    def wait_for_prefetch(self):
+        """Block until every queued prefetch has finished"""
+        if self._prefetch_queue is not None:
+            self._prefetch_queue.join()
+
+    def stats(self):
+        """Hit/fetch/eviction counts and the cache's size as this process last counted it"""
+        with self._lock:
+            size_bytes = self._size_bytes
+            lookups = self.hits + self.fetched + self.failed
+            return {
+                'directory': self.directory,
+                'size_bytes': size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'fetched': self.fetched,
+                'failed': self.failed,
+                'evictions': self.evictions,
+                'prefetch_pending': self._prefetch_queue.qsize() if self._prefetch_queue is not None else 0,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+            }
+
+# Global photo cache instance
+photo_cache = PhotoCache()
+
+def solid_png(width, height, rgb, grain=0):
+    """A width x height PNG of one color, with grain bytes of noise per row to make it realistically large"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    pixel = bytes(rgb)
+    grain = min(grain, width * 3)
+    noise = hashlib.shake_128(pixel).digest(grain * height) if grain else b''
+    fill = (pixel * width)[grain:]
+    rows = b''.join(b'\x00' + noise[y * grain:(y + 1) * grain] + fill for y in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows, 1)) + chunk(b'IEND', b'')
+
+class StandInPhotoHandler(BaseHTTPRequestHandler):
+    """Serves a generated PNG for any path, standing in for the photo CDN.
+
+    The image is as wide as the w query parameter (1080 by default) at 4:3, colored by
+    the path. The server's delay and throttle attributes add latency and make a
+    fraction of requests fail with 429, as a throttling CDN would.
+    """
+
+    # Headers and body go out in separate writes; don't let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        with server.lock:
+            server.requests += 1
+            throttled = server.throttle and server.requests % round(1 / server.throttle) == 0
+        if throttled:
+            self.send_error(429, 'Too Many Requests')
+            return
+        width = int(dict(parse_qsl(parts.query)).get('w', 1080))
+        rgb = hashlib.sha256(parts.path.encode()).digest()[:3]
+        body = solid_png(width, width * 3 // 4, rgb, server.grain)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Stand-in photo server: {format % args}")
+
+def start_stand_in_server(port=0, delay=0.0, throttle=0.0, grain=256):
+    """Start the stand-in photo server on a background thread; returns the server (see server_address)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInPhotoHandler)
+    server.delay = delay
+    server.throttle = throttle
+    server.grain = grain
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='stand-in-photos', daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Manage the photo thumbnail cache, or serve stand-in photos locally')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stand_in = commands.add_parser('stand-in', help='serve generated photos for any URL; point PHOTO_ORIGIN at it')
+    stand_in.add_argument('--port', type=int, default=8765)
+    stand_in.add_argument('--delay', type=float, default=0.0, help='seconds added to every response')
+    stand_in.add_argument('--throttle', type=float, default=0.0, help='fraction of requests answered with 429')
+    stand_in.add_argument('--grain', type=int, default=256, help='noisy bytes per row, so images don\'t compress to nothing')
+
+    commands.add_parser('prefetch', help='fetch the thumbnail of every stored listing that isn\'t cached yet')
+    commands.add_parser('evict', help='trim the cache to its size limit now')
+    commands.add_parser('stats', help='count the cached thumbnails and their size')
+
+    args = parser.parse_args()
+
+    if args.command == 'stand-in':
+        server = start_stand_in_server(args.port, args.delay, args.throttle, args.grain)
+        print(f"Serving stand-in photos on http://127.0.0.1:{server.server_address[1]}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.command == 'prefetch':
+        from models import Property, ReadSessionLocal
+
+        db = ReadSessionLocal()
+        try:
+            urls = [url for (url,) in db.query(Property.primary_photo).filter(Property.primary_photo.isnot(None))]
+        finally:
+            db.close()
+        started_at = time.perf_counter()
+        print(f"Queued {photo_cache.prefetch(urls)} of {len(urls)} photos")
+        photo_cache.wait_for_prefetch()
+        stats = photo_cache.stats()
+        print(f"Fetched {stats['fetched']} ({stats['failed']} failed) in {time.perf_counter() - started_at:.1f}s, cache holds {stats['size_bytes']} bytes")
+    elif args.command == 'evict':
+        print(f"Evicted {photo_cache.evict()} photos")
+    else:
+        blobs = photo_cache._scan_blobs()
+        print(f"{len(blobs)} thumbnails, {sum(size for _, size, _ in blobs)} of {photo_cache.max_bytes} bytes in {photo_cache.directory}")
@@ -0,0 +1,259 @@
+from sqlalchemy import and_, or_, tuple_
+from models import Property, PROPERTY_FIELDS, SUMMARY_FIELDS
+from spatial import apply_spatial_filters
+from ingest import OFF_MARKET_STATUS
+from datetime import datetime
+import base64
+import json
+
+# (parameter, column, comparison, default) - a filter only applies when its value differs
+# from the default, so the defaults themselves mean "no limit"
+PROPERTY_FILTERS = [
+    ('min_price', Property.list_price, '>=', 0),
+    ('max_price', Property.list_price, '<=', 10000000),
+    ('min_sqft', Property.sqft, '>=', 0),
+    ('max_sqft', Property.sqft, '<=', 10000),
+    ('min_lot_acre', Property.lot_acre, '>=', 0),
+    ('max_lot_acre', Property.lot_acre, '<=', 100),
+    ('min_beds', Property.beds, '>=', 0),
+    ('max_beds', Property.beds, '<=', 10),
+    ('min_baths', Property.baths, '>=', 0),
+    ('max_baths', Property.baths, '<=', 10),
+    ('min_stories', Property.stories, '>=', 0),
+    ('max_stories', Property.stories, '<=', 10),
+    ('min_garage', Property.parking_garage, '>=', 0),
+    ('max_garage', Property.parking_garage, '<=', 10),
+    ('min_distance', Property.estdist, '>=', 0),
+    ('max_distance', Property.estdist, '<=', 100),
+]
+
+# Sort keys; each is backed by a (column, property_id) index on Property
+SORT_COLUMNS = {
+    'property_id': Property.property_id,
+    'list_price': Property.list_price,
+    'sqft': Property.sqft,
+    'lot_acre': Property.lot_acre,
+    'beds': Property.beds,
+    'estdist': Property.estdist,
+}
+
+# Sort keys computed per request rather than stored; 'distance' needs a lat/lon reference point
+COMPUTED_SORT_KEYS = ('distance',)
+
+MAX_PAGE_LIMIT = 1000
+
+# Rows per /properties/changes page when the client doesn't give a limit
+CHANGES_DEFAULT_LIMIT = 500
+
+def parse_fields(fields):
+    """Turn a fields parameter into a list of Property field names.
+
+    Accepts 'summary', 'full' (the default) or a comma-separated list of fields.
+    """
+    if not fields or fields == 'full':
+        return list(PROPERTY_FIELDS)
+    if fields == 'summary':
+        return list(SUMMARY_FIELDS)
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in PROPERTY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+def select_properties(db, fields, sort_key='property_id'):
+    """Query only the given Property columns, rather than loading full ORM entities.
+
+    property_id and the sort column are always selected so pages can build a cursor
+    (computed sort keys are added by whoever computes them).
+    """
+    columns = list(fields)
+    for required in ('property_id', sort_key):
+        if required not in columns and required in SORT_COLUMNS:
+            columns.append(required)
+    return db.query(*[Property.__table__.c[column] for column in columns])
+
+def rows_to_dicts(rows, fields):
+    """Serialize column rows from select_properties, keeping only the requested fields"""
+    dicts = []
+    for row in rows:
+        mapping = row._mapping
+        item = {}
+        for field in fields:
+            value = mapping[field]
+            item[field] = value.isoformat() if isinstance(value, datetime) else value
+        dicts.append(item)
+    return dicts
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def apply_property_filters(query, params):
+    """Apply the min/max filters, optional favorited flag and spatial filters from a request dict to a query.
+
+    params may be a JSON body or request.args; values are coerced to numbers and
+    a ValueError is raised for anything that isn't one.
+    """
+    for name, column, comparison, default in PROPERTY_FILTERS:
+        value = params.get(name)
+        if value is None or value == '':
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {name}: {value}")
+        if comparison == '>=' and value > default:
+            query = query.filter(column >= value)
+        elif comparison == '<=' and value < default:
+            query = query.filter(column <= value)
+
+    favorited = params.get('favorited')
+    if favorited is not None and favorited != '':
+        query = query.filter(Property.favorited == _parse_bool(favorited))
+
+    return apply_spatial_filters(query, params)
+
+def parse_sort(sort):
+    """Parse a sort parameter like 'list_price' or '-list_price' into (key, descending)"""
+    sort = sort or 'property_id'
+    descending = sort.startswith('-')
+    key = sort.lstrip('-')
+    if key not in SORT_COLUMNS and key not in COMPUTED_SORT_KEYS:
+        raise ValueError(f"Invalid sort key: {key}. Must be one of: {', '.join(list(SORT_COLUMNS) + list(COMPUTED_SORT_KEYS))}")
+    return key, descending
+
+def parse_limit(limit):
+    """Parse a page limit, clamped to MAX_PAGE_LIMIT; None means no paging"""
+    if limit is None or limit == '':
+        return None
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {limit}")
+    if limit < 1:
+        raise ValueError("Limit must be at least 1")
+    return min(limit, MAX_PAGE_LIMIT)
+
+def encode_cursor(sort_value, property_id):
+    """Encode the sort key and property_id of the last row of a page as an opaque cursor"""
+    raw = json.dumps([sort_value, property_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor into (sort_value, property_id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, property_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_value, property_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def apply_sort_and_cursor(query, sort_key, descending, cursor=None, column=None):
+    """Order a query by (sort column, property_id) and seek past the cursor row.
+
+    NULLs sort first ascending and last descending (SQLite's default order, made
+    explicit for other backends), and the seek condition follows that order so
+    rows with a NULL sort value are paged too. column is the expression to sort
+    by for a computed sort key.
+    """
+    if column is None:
+        column = SORT_COLUMNS[sort_key]
+    tie_breaker = Property.property_id
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if sort_key == 'property_id':
+            query = query.filter(column < last_id if descending else column > last_id)
+        elif descending:
+            if last_value is None:
+                query = query.filter(and_(column.is_(None), tie_breaker < last_id))
+            else:
+                query = query.filter(or_(
+                    column < last_value,
+                    and_(column == last_value, tie_breaker < last_id),
+                    column.is_(None)
+                ))
+        else:
+            if last_value is None:
+                query = query.filter(or_(
+                    and_(column.is_(None), tie_breaker > last_id),
+                    column.isnot(None)
+                ))
+            else:
+                query = query.filter(or_(
+                    column > last_value,
+                    and_(column == last_value, tie_breaker > last_id)
+                ))
+
+    if sort_key == 'property_id':
+        return query.order_by(column.desc() if descending else column.asc())
+    # NULL placement is spelled out since PostgreSQL's default is the opposite of SQLite's
+    if descending:
+        return query.order_by(column.desc().nulls_last(), tie_breaker.desc())
+    return query.order_by(column.asc().nulls_first(), tie_breaker.asc())
+
+def paginate(query, params, sort_column=None):
+    """Sort and page a query using the sort, limit and cursor request parameters.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page. Without a
+    limit every matching row is returned, as before paging existed. sort_column
+    is the expression for a computed sort key, selected under the key's name.
+    """
+    sort_key, descending = parse_sort(params.get('sort'))
+    limit = parse_limit(params.get('limit'))
+    query = apply_sort_and_cursor(query, sort_key, descending, params.get('cursor'), sort_column)
+
+    if limit is None:
+        return query.all(), None
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_key), last.property_id)
+
+def decode_changes_token(token):
+    """(row_version, property_id) a /properties/changes token resumes after; no token starts from the beginning"""
+    if not token:
+        return -1, ''
+    try:
+        row_version, property_id = decode_cursor(token)
+    except ValueError:
+        raise ValueError("Invalid since token")
+    if not isinstance(row_version, int) or not isinstance(property_id, str):
+        raise ValueError("Invalid since token")
+    return row_version, property_id
+
+def changes_since(db, fields, token, limit):
+    """A page of properties changed after a /properties/changes token.
+
+    Rows are read in (row_version, property_id) order from its index, so a sync
+    reads only what changed since its token however large the table is. Off-market
+    listings are listed by id under 'removed' rather than with the others. Returns
+    (properties rows, removed ids, next token, whether more changes follow).
+    """
+    last_version, last_id = decode_changes_token(token)
+    columns = list(fields)
+    for required in ('property_id', 'status', 'row_version'):
+        if required not in columns:
+            columns.append(required)
+    table = Property.__table__
+    rows = (db.query(*[table.c[column] for column in columns])
+            # A row value comparison, unlike the equivalent OR, is an index seek on PostgreSQL as well as SQLite
+            .filter(tuple_(table.c.row_version, table.c.property_id) > tuple_(last_version, last_id))
+            .order_by(table.c.row_version, table.c.property_id)
+            .limit(limit + 1)
+            .all())
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        token = encode_cursor(rows[-1].row_version, rows[-1].property_id)
+    elif not token:
+        token = encode_cursor(last_version, last_id)
+    current = [row for row in rows if row.status != OFF_MARKET_STATUS]
+    removed = [row.property_id for row in rows if row.status == OFF_MARKET_STATUS]
+    return current, removed, token, has_more
@@ -0,0 +1,282 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+from geo import haversine_miles
+from spatial import MILES_PER_DEGREE_LAT
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Set one of these to record every homeharvest result to a directory, or to replay
+# recorded results instead of calling realtor.com (see PropertyScraper._fetch_radius)
+SCRAPE_RECORD_DIR = os.environ.get('SCRAPE_RECORD_DIR')
+SCRAPE_REPLAY_DIR = os.environ.get('SCRAPE_REPLAY_DIR')
+
+MANIFEST_NAME = 'manifest.json'
+FRAMES_DIR = 'frames'
+
+def recording_params(location, listing_type, past_days, radius, updated_since=None):
+    """The scrape_property arguments a recording is keyed by, in a canonical form"""
+    listing_types = [listing_type] if isinstance(listing_type, str) else sorted(listing_type)
+    params = {
+        'location': location,
+        'listing_type': listing_types,
+        'past_days': int(past_days),
+        'radius': int(radius),
+    }
+    # Incremental fetches are recorded separately so they never replace a full one
+    if updated_since is not None:
+        params['updated_since'] = updated_since.isoformat()
+    return params
+
+def filter_updated_since(frame, updated_since):
+    """Listings last updated at or after updated_since, as homeharvest filters them client-side.
+
+    Listings without a last_update_date are dropped, like homeharvest does; a frame
+    without the column at all (e.g. an old recording) is returned unfiltered. A naive
+    updated_since is UTC, as the scraper's watermarks are.
+    """
+    if 'last_update_date' not in frame.columns:
+        return frame
+    updated = pd.to_datetime(frame['last_update_date'], errors='coerce', utc=True)
+    since = pd.Timestamp(updated_since)
+    since = since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+    return frame[updated >= since]
+
+def recording_key(params):
+    """File-name-safe key: readable location and radius, plus a hash of every parameter"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    slug = re.sub(r'[^a-z0-9]+', '-', params['location'].lower()).strip('-')[:40]
+    return f"{slug}_{params['radius']}mi_{digest}"
+
+def _parquet_safe(frame):
+    """Stringify object columns pyarrow can't type (homeharvest mixes scalars, dicts and lists)"""
+    frame = frame.copy()
+    for name in frame.columns[frame.dtypes == object]:
+        try:
+            pa.array(frame[name], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            frame[name] = frame[name].map(lambda value: None if value is None else str(value))
+    return frame
+
+class _RecordingDirectory:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def frame_path(self, key):
+        return os.path.join(self.directory, FRAMES_DIR, f"{key}.parquet")
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'frames': {}, 'geocodes': {}}
+
+class ScrapeRecorder(_RecordingDirectory):
+    """Saves each homeharvest result as Parquet, keyed by location, radius and the other parameters.
+
+    manifest.json lists every recorded frame and geocoded search center, so a
+    ScrapeReplayer can feed the same run back without network access.
+    """
+
+    def save_frame(self, params, frame):
+        """Record one scrape_property result, replacing any earlier recording with the same parameters"""
+        key = recording_key(params)
+        path = self.frame_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _parquet_safe(frame).to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        self._update_manifest(lambda manifest: manifest['frames'].__setitem__(key, {
+            'params': params,
+            'rows': len(frame),
+            'recorded_at': datetime.utcnow().isoformat()
+        }))
+        logger.info(f"Recorded {len(frame)} properties for {params['location']} {params['radius']} miles as {key}")
+
+    def save_geocode(self, location, center):
+        """Record the search center a location geocoded to"""
+        self._update_manifest(lambda manifest: manifest['geocodes'].__setitem__(location, list(center)))
+
+    def _update_manifest(self, update):
+        # Locations are fetched concurrently, so manifest updates are serialized
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            manifest = self.read_manifest()
+            update(manifest)
+            with open(self.manifest_path + '.tmp', 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+class ScrapeReplayer(_RecordingDirectory):
+    """Serves recorded homeharvest results in place of live requests"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.manifest = self.read_manifest()
+        if not self.manifest['frames']:
+            logger.warning(f"No recorded scrape results in {directory}")
+
+    def load_frame(self, params):
+        """The recorded result for these parameters, or an empty frame (as for a search with no results).
+
+        An incremental fetch without its own recording is served from the full
+        recording, keeping the listings updated since its watermark.
+        """
+        key = recording_key(params)
+        if key not in self.manifest['frames'] and 'updated_since' in params:
+            full_params = {name: value for name, value in params.items() if name != 'updated_since'}
+            return filter_updated_since(self.load_frame(full_params), datetime.fromisoformat(params['updated_since']))
+        if key not in self.manifest['frames']:
+            logger.warning(f"No recording for {params['location']} {params['radius']} miles ({key}), replaying no results")
+            return pd.DataFrame()
+        return pd.read_parquet(self.frame_path(key))
+
+    def load_geocode(self, location):
+        """The recorded search center for a location, or None"""
+        center = self.manifest['geocodes'].get(location)
+        return tuple(center) if center else None
+
+def synthetic_listings(rows, center, radius, seed=0, changed_fraction=0.0):
+    """Generate a homeharvest-shaped DataFrame of rows listings within radius miles of center.
+
+    The same seed always gives the same listings. changed_fraction of them get a
+    different price and status, to stand in for a later scrape of the same area.
+    """
+    rng = np.random.default_rng(seed)
+    lat, lon = center
+
+    # Uniform over the disc around the center
+    distance = radius * np.sqrt(rng.random(rows))
+    bearing = rng.random(rows) * 2 * np.pi
+    latitude = lat + distance * np.cos(bearing) / MILES_PER_DEGREE_LAT
+    longitude = lon + distance * np.sin(bearing) / (MILES_PER_DEGREE_LAT * np.cos(np.radians(lat)))
+
+    towns = np.array(['New Columbia', 'Lewisburg', 'Milton', 'Watsontown', 'Mifflinburg', 'Montandon', 'Turbotville', 'Allenwood'])
+    streets = np.array(['Main St', 'Market St', 'Old Rte 15', 'Creek Rd', 'Ridge Rd', 'Church St', 'Mill St', 'Orchard Ln'])
+    features = np.array([
+        'wraparound porch', 'updated kitchen', 'pole barn', 'finished basement', 'creek frontage',
+        'two car garage', 'hardwood floors', 'mountain views', 'large deck', 'fenced yard'
+    ])
+    styles = np.array(['SINGLE_FAMILY', 'SINGLE_FAMILY', 'SINGLE_FAMILY', 'TOWNHOMES', 'CONDOS', 'MOBILE', 'LAND', 'FARM'])
+
+    property_ids = (10_000_000_000 + np.arange(rows)).astype(str)
+    house_numbers = rng.integers(1, 9999, rows)
+    street = np.char.add(np.char.add(house_numbers.astype(str), ' '), rng.choice(streets, rows))
+    beds = rng.integers(1, 7, rows)
+    sqft = (beds * 500 + rng.normal(0, 300, rows)).clip(400, 9000).astype(int)
+    list_price = (sqft * rng.uniform(80, 250, rows)).round(-3).astype(int)
+    list_date = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    status = np.full(rows, 'FOR_SALE', dtype=object)
+    text = np.char.add(np.char.add(np.char.add(beds.astype(str), ' bedroom home with '),
+                                   rng.choice(features, rows)), np.char.add(' and ', rng.choice(features, rows)))
+
+    # A later scrape sees some listings re-priced or gone pending, updated as of now
+    changed = rng.random(rows) < changed_fraction
+    list_price = np.where(changed, (list_price * rng.uniform(0.9, 1.05, rows)).round(-3).astype(int), list_price)
+    status = np.where(changed & (rng.random(rows) < 0.3), 'PENDING', status)
+    last_update_date = (list_date + pd.to_timedelta(rng.integers(0, 30 * 24, rows), unit='h')).where(
+        ~changed, pd.Timestamp(datetime.utcnow()).floor('s'))
+
+    return pd.DataFrame({
+        'property_url': np.char.add('https://www.realtor.com/realestateandhomes-detail/M', property_ids),
+        'property_id': property_ids,
+        'status': status,
+        'text': text,
+        'style': rng.choice(styles, rows),
+        'street': street,
+        'city': rng.choice(towns, rows),
+        'state': 'PA',
+        'zip_code': rng.integers(17800, 17900, rows).astype(str),
+        'beds': beds,
+        'full_baths': rng.integers(1, 4, rows),
+        'sqft': sqft,
+        'year_built': rng.integers(1850, 2025, rows),
+        'list_price': list_price,
+        'list_date': list_date.strftime('%Y-%m-%d'),
+        'last_update_date': last_update_date,
+        'lot_sqft': rng.lognormal(9.5, 1.2, rows).round(),
+        'latitude': latitude,
+        'longitude': longitude,
+        'stories': rng.integers(1, 4, rows).astype(float),
+        'parking_garage': np.where(rng.random(rows) < 0.5, np.nan, rng.integers(1, 4, rows)),
+        'primary_photo': np.char.add(np.char.add('https://ap.rdcpix.com/synthetic/', property_ids), '.webp?w=1080&q=75'),
+    })
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import uuid
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Generate recorded scrape results or replay them into the database')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synthesize = commands.add_parser('synthesize', help='write a synthetic recording for the default search location')
+    synthesize.add_argument('directory')
+    synthesize.add_argument('--rows', type=int, default=100_000)
+    synthesize.add_argument('--seed', type=int, default=0)
+    synthesize.add_argument('--changed', type=float, default=0.0, help='fraction of listings re-priced relative to the same seed')
+    synthesize.add_argument('--center', default='41.04,-76.86', help='lat,lon the listings are spread around')
+    synthesize.add_argument('--radius', type=int, help='defaults to the scraper\'s search radius setting')
+    synthesize.add_argument('--time-range', type=int, help='defaults to the scraper\'s search time range setting')
+    synthesize.add_argument('--sweep', action='store_true', help='also record every smaller radius, for radius_sweep mode')
+
+    replay = commands.add_parser('replay', help='run a scrape job against the configured database from a recording')
+    replay.add_argument('directory')
+    replay.add_argument('--mode', help='scrape mode; defaults to the stored setting')
+    replay.add_argument('--full', action='store_true', help='fetch in full rather than since the last replay\'s watermark')
+
+    args = parser.parse_args()
+
+    # Imported here since the scraper itself uses this module
+    from models import ScrapeJob, create_tables
+    from scraper import scraper, LOCATION
+    from worker import load_settings
+
+    if args.command == 'synthesize':
+        search_location = scraper.default_search_location()
+        radius = args.radius or search_location['radius']
+        time_range = args.time_range or search_location['time_range']
+        center = tuple(float(value) for value in args.center.split(','))
+
+        recorder = ScrapeRecorder(args.directory)
+        frame = synthetic_listings(args.rows, center, radius, args.seed, args.changed)
+        params = recording_params(LOCATION, search_location['listing_types'], time_range, radius)
+        recorder.save_frame(params, frame)
+        recorder.save_geocode(LOCATION, center)
+        if args.sweep:
+            # A radius sweep asks for every radius up to the maximum; give each the listings within it
+            distances = haversine_miles(frame['latitude'], frame['longitude'], *center)
+            for sweep_radius in range(1, radius):
+                recorder.save_frame(recording_params(LOCATION, search_location['listing_types'], time_range, sweep_radius),
+                                    frame[distances <= sweep_radius])
+    else:
+        create_tables()
+        load_settings()
+        if args.mode:
+            scraper.settings['scrape_mode'] = args.mode
+        if args.full:
+            scraper.reconcile_hours = 0
+        scraper.recorder = None
+        scraper.replayer = ScrapeReplayer(args.directory)
+
+        now = datetime.utcnow()
+        job = ScrapeJob(id=uuid.uuid4().hex, trigger='replay', status='running', submitted_at=now, started_at=now)
+        started_at = time.perf_counter()
+        scraper.run_scrape_job(job)
+        elapsed = time.perf_counter() - started_at
+        rate = (job.rows_processed or 0) / elapsed if elapsed else 0
+        print(f"Replayed {job.rows_processed or 0} properties in {elapsed:.1f}s ({rate:,.0f}/s): "
+              f"{job.added or 0} added, {job.changed or 0} changed, {job.unchanged or 0} unchanged, job {job.status}")
@@ -0,0 +1,134 @@
+from flask import request, Response
+from queries import rows_to_dicts
+import json
+import logging
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Rows fetched from the database cursor and serialized per streamed chunk
+STREAM_BATCH_SIZE = 500
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSIBLE_MIMETYPES = ('application/json', NDJSON_MIMETYPE, 'text/csv', 'text/html', 'text/css', 'application/javascript')
+
+def wants_ndjson():
+    """True if the client asked for newline-delimited JSON (Accept header or format=ndjson)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    accepted = request.accept_mimetypes
+    return accepted[NDJSON_MIMETYPE] > accepted['application/json']
+
+def negotiate_encoding():
+    """Pick the best supported Content-Encoding from Accept-Encoding: 'br', 'gzip' or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def encoded_etag(etag, encoding):
+    """Strong ETags must differ per content-coding, so compressed variants get a suffix"""
+    return f"{etag}-{encoding}" if encoding else etag
+
+def _compressor(encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of chunks incrementally, flushing after each so bytes go out as they're produced"""
+    process, flush, finish = _compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encode eligible responses, including streamed ones"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = negotiate_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < MIN_COMPRESS_BYTES:
+            return response
+        process, _, finish = _compressor(encoding)
+        response.set_data(process(body) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak=weak)
+    return response
+
+def stream_properties(db, rows, fields, describe, ndjson=False):
+    """Stream property rows from a server-side cursor as JSON or NDJSON.
+
+    rows should be a yield_per query so only one batch is in memory at a time.
+    The JSON envelope matches the non-streamed responses; total_found and message
+    come last since they're only known once every row has been sent. db is closed
+    when the stream finishes.
+    """
+    def generate():
+        total = 0
+        try:
+            if not ndjson:
+                yield '{"properties":['
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    yield _encode_batch(batch, fields, total, ndjson)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                yield _encode_batch(batch, fields, total, ndjson)
+                total += len(batch)
+            if not ndjson:
+                yield f'],"total_found":{total},"next_cursor":null,"message":{json.dumps(describe(total))}}}'
+        except Exception as e:
+            # Headers are already sent, so the error can only be logged
+            logger.error(f"Error streaming properties: {str(e)}")
+            raise
+        finally:
+            db.close()
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    response = Response(generate(), mimetype=mimetype)
+    # The generator's finally doesn't run if the client disconnects before it starts
+    response.call_on_close(db.close)
+    return response
+
+def _encode_batch(batch, fields, already_sent, ndjson):
+    items = [json.dumps(item, separators=(',', ':')) for item in rows_to_dicts(batch, fields)]
+    if ndjson:
+        return ''.join(item + '\n' for item in items)
+    prefix = ',' if already_sent else ''
+    return prefix + ','.join(items)
@@ -1,9 +1,29 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from homeharvest import scrape_property
 import pandas as pd
-from models import Property, Settings, SessionLocal, create_tables
-from datetime import datetime
+import numpy as np
+from models import Property, ReadSessionLocal, ScrapeJob, ScrapeRun, SearchLocation, Settings, SessionLocal
+from geo import geocode_location, haversine_miles
+from ingest import normalize_properties, detect_changes, load_properties, mark_off_market, record_history, upsert_properties, OFF_MARKET_STATUS, SCRAPED_COLUMNS
+from analytics import ANALYTICS_COLUMNS, stored_values, update_market_aggregates
+from cache import response_cache
+from photos import photo_cache
+from stats import adjust_property_stats
+from events import prune_events, record_listing_events, record_removed_events
+from metrics import FETCH_RETRIES, SCRAPE_ERRORS, SCRAPE_JOB_SECONDS, SCRAPE_ROWS, StageTimings
+from recordings import ScrapeRecorder, ScrapeReplayer, SCRAPE_RECORD_DIR, SCRAPE_REPLAY_DIR, recording_key, recording_params
+from spatial import apply_spatial_filters
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import json
 import logging
+import queue
+import random
+import threading
+import time
+import uuid
+import os
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,17 +32,125 @@ logger = logging.getLogger(__name__)
 # Hardcoded address as requested
 LOCATION = "2821 Old Rte 15, New Columbia, PA"
 
+# 'single_pass' fetches once at the max radius; 'radius_sweep' is the original 1..N mile sweep
+SCRAPE_MODES = ('single_pass', 'radius_sweep')
+
+# Recent jobs listed by GET /scrape-jobs
+MAX_LISTED_JOBS = 50
+
+# How often the scheduler leader looks for queued scrape jobs and settings changes
+JOB_POLL_SECONDS = 5
+SETTINGS_SYNC_SECONDS = 30
+
+# homeharvest listing types a search location may request
+LISTING_TYPES = ('for_sale', 'for_rent', 'pending', 'sold', 'off_market', 'new_community', 'other', 'ready_to_build')
+
+# Search locations fetched concurrently, and fetched batches buffered for the single writer
+SCRAPE_WORKERS = int(os.environ.get('SCRAPE_WORKERS', 4))
+SCRAPE_QUEUE_SIZE = 8
+
+# homeharvest talks to realtor.com; space requests out and back off on failure
+REALTOR_HOST = 'realtor.com'
+REQUEST_MIN_INTERVAL = float(os.environ.get('SCRAPE_MIN_INTERVAL', 1.0))  # seconds between requests per host
+FETCH_ATTEMPTS = 3
+FETCH_BACKOFF_SECONDS = 5
+
+# Routine scrapes only fetch listings updated since each location's watermark (the start
+# of its last complete fetch, less WATERMARK_OVERLAP for clock skew). At least every
+# SCRAPE_RECONCILE_HOURS a location is fetched in full instead, which also marks listings
+# that have vanished from its search as off-market; 0 makes every scrape a full one.
+SCRAPE_RECONCILE_HOURS = float(os.environ.get('SCRAPE_RECONCILE_HOURS', 24))
+WATERMARK_OVERLAP = timedelta(hours=1)
+
+# Listings near the edge of a search (realtor.com may geocode its center slightly
+# differently) or the start of its time window are never marked off-market
+RECONCILE_EDGE_MILES = 0.5
+RECONCILE_EDGE_DAYS = 2
+
+# A full fetch that returns less than this share of the listings stored for its search
+# (an empty or blocked response rather than an error) is not trusted to reconcile from
+RECONCILE_MIN_RETURNED = float(os.environ.get('SCRAPE_RECONCILE_MIN_RETURNED', 0.5))
+
+# Stored statuses a search for a listing type returns, where not just the type itself;
+# for_sale results include listings under contract
+LISTING_TYPE_STATUSES = {
+    'for_sale': ('FOR_SALE', 'PENDING', 'CONTINGENT'),
+    'pending': ('PENDING', 'CONTINGENT'),
+    'off_market': (),
+}
+
+class HostRateLimiter:
+    """Enforce a minimum interval between requests to the same host across threads"""
+    
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+    
+    def wait(self, host):
+        """Block until a request to host is allowed, then reserve the next slot"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_allowed.get(host, now))
+            self._next_allowed[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+realtor_rate_limiter = HostRateLimiter(REQUEST_MIN_INTERVAL)
+
+class ScrapeRunTally:
+    """Row counts, errors and stage timings of the running scrape, saved to scrape_runs when it ends.
+
+    Fetch threads add to it concurrently with the writer.
+    """
+    
+    def __init__(self):
+        self.timings = StageTimings()
+        self.counts = Counter()
+        self.errors = []
+        self.params = {}
+        self.search_locations = []
+        self.failed_locations = set()  # ids of search locations not completely fetched
+        self.unreconciled_locations = set()  # ids of search locations whose full fetch looked incomplete
+        self._lock = threading.Lock()
+    
+    def count(self, outcome, rows):
+        with self._lock:
+            self.counts[outcome] += rows
+    
+    def error(self, message, search_location=None):
+        with self._lock:
+            self.errors.append(message)
+            if search_location is not None:
+                self.failed_locations.add(search_location['id'])
+    
+    def reconcile_skipped(self, message, search_location):
+        with self._lock:
+            self.errors.append(message)
+            self.unreconciled_locations.add(search_location['id'])
+
 class PropertyScraper:
     def __init__(self):
+        # Only started in the process holding the scheduler lease (see worker.py); other
+        # processes just submit jobs to the database
         self.scheduler = BackgroundScheduler()
-        # Ensure tables exist
-        create_tables()
+        
+        # The job this process is running, if any, and its tally for the run ledger
+        self.current_job = None
+        self.current_run = None
+        
+        # Optionally record every homeharvest result, or replay recorded ones offline
+        self.recorder = ScrapeRecorder(SCRAPE_RECORD_DIR) if SCRAPE_RECORD_DIR else None
+        self.replayer = ScrapeReplayer(SCRAPE_REPLAY_DIR) if SCRAPE_REPLAY_DIR else None
+        
+        self.reconcile_hours = SCRAPE_RECONCILE_HOURS
         
         # Default settings - will be loaded from database
         self.settings = {
             'update_interval': 1,  # hours
             'search_radius': 30,   # miles
-            'search_time_range': 365  # days
+            'search_time_range': 365,  # days
+            'scrape_mode': os.environ.get('SCRAPE_MODE', 'single_pass')
         }
         
     def load_settings_from_db(self, db_settings):
@@ -33,7 +161,8 @@ class PropertyScraper:
         # Filter out non-scraping settings (like last_updated)
         scraping_settings = {
             key: value for key, value in db_settings.items() 
-            if key in ['update_interval', 'search_radius', 'search_time_range']
+            if key in ['update_interval', 'search_radius', 'search_time_range', 'scrape_mode']
+            and value is not None
         }
         
         self.settings.update(scraping_settings)
@@ -48,11 +177,15 @@ class PropertyScraper:
             logger.warning(f"Invalid search_radius: {self.settings.get('search_radius')}, using default 30")
             self.settings['search_radius'] = 30
         
+        if self.settings.get('scrape_mode') not in SCRAPE_MODES:
+            logger.warning(f"Invalid scrape_mode: {self.settings.get('scrape_mode')}, using default single_pass")
+            self.settings['scrape_mode'] = 'single_pass'
+        
     def get_settings(self):
         """Get current scraper settings"""
         return self.settings.copy()
     
-    def update_settings(self, update_interval=None, search_radius=None, search_time_range=None):
+    def update_settings(self, update_interval=None, search_radius=None, search_time_range=None, scrape_mode=None):
         """Update scraper settings and restart scheduler with new interval"""
         if update_interval is not None:
             self.settings['update_interval'] = update_interval
@@ -60,212 +193,584 @@ class PropertyScraper:
             self.settings['search_radius'] = search_radius
         if search_time_range is not None:
             self.settings['search_time_range'] = search_time_range
+        if scrape_mode is not None:
+            self.settings['scrape_mode'] = scrape_mode
         
         logger.info(f"Settings updated: {self.settings}")
         
-        # Restart scheduler with new interval if it's running
+        # Reschedule with the new interval if this process runs the scheduler
         if self.scheduler.running and update_interval is not None:
-            self.stop_scheduler()
-            self.start_scheduler()
+            self._schedule_interval_scrape()
+    
+    def sync_settings(self):
+        """Pick up settings changed through the API by another process"""
+        db = ReadSessionLocal()
+        try:
+            settings = db.query(Settings).filter(Settings.id == 1).first()
+            if settings is None:
+                return
+            interval_changed = settings.update_interval != self.settings['update_interval']
+            self.load_settings_from_db(settings.to_dict())
+        finally:
+            db.close()
+        if interval_changed and self.scheduler.running:
+            self._schedule_interval_scrape()
             
-    def scrape_and_store_properties(self):
-        """Scrape properties using incremental radius searches and store/update them in the database"""
+    def default_search_location(self):
+        """The hardcoded LOCATION, using the global radius/time range settings"""
+        return {
+            'id': None,
+            'location': LOCATION,
+            'radius': self.settings['search_radius'],
+            'time_range': self.settings['search_time_range'],
+            'listing_types': ['for_sale'],
+            'updated_since': None
+        }
+    
+    def load_search_locations(self):
+        """Load the enabled search locations, seeding the table with LOCATION if it's empty.
+        
+        Per-location radius/time range fall back to the global settings when unset.
+        Each carries the updated_since time to fetch from, or None for a full fetch.
+        """
+        db = SessionLocal()
         try:
-            logger.info("Starting property scraping with incremental radius...")
-            logger.info(f"Current scraper settings: {self.settings}")
+            if db.query(SearchLocation).count() == 0:
+                db.add(SearchLocation(location=LOCATION, listing_types='for_sale', enabled=True))
+                db.commit()
+            
+            locations = []
+            for row in db.query(SearchLocation).filter(SearchLocation.enabled == True).order_by(SearchLocation.id):
+                search_location = {
+                    'id': row.id,
+                    'location': row.location,
+                    'radius': row.radius or self.settings['search_radius'],
+                    'time_range': row.time_range or self.settings['search_time_range'],
+                    'listing_types': row.listing_type_list() or ['for_sale']
+                }
+                search_location['updated_since'] = self._updated_since(row, search_location)
+                locations.append(search_location)
+            return locations
+        finally:
+            db.close()
+    
+    def _updated_since(self, row, search_location):
+        """When an incremental fetch of a location should start from, or None if it is due a full fetch"""
+        if row.watermark is None or row.reconciled_at is None or row.fetch_key != fetch_key(search_location):
+            return None
+        if datetime.utcnow() - row.reconciled_at >= timedelta(hours=self.reconcile_hours):
+            return None
+        return row.watermark - WATERMARK_OVERLAP
+    
+    def _fetch_radius(self, radius, search_location=None):
+        """Run a single homeharvest search around a search location at the given radius.
+        
+        Calls are rate limited per host and retried with jittered exponential backoff.
+        With a replayer the recorded result is returned instead, without any request.
+        Incremental fetches only ask for listings updated since the location's watermark.
+        """
+        search_location = search_location or self.default_search_location()
+        updated_since = search_location.get('updated_since')
+        if self.current_job is not None:
+            self.current_job.stage = 'fetching'
+            self.current_job.current_batch = f"{search_location['location']} {radius} miles"
+        
+        listing_types = search_location['listing_types']
+        params = recording_params(search_location['location'], listing_types, search_location['time_range'], radius, updated_since)
+        if self.replayer is not None:
+            with self._stage('fetch'):
+                properties = self.replayer.load_frame(params)
+            self._count_rows('fetched', len(properties))
+            return properties
+        
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            realtor_rate_limiter.wait(REALTOR_HOST)
+            try:
+                with self._stage('fetch'):
+                    properties = scrape_property(
+                        location=search_location['location'],
+                        listing_type=listing_types[0] if len(listing_types) == 1 else listing_types,
+                        past_days=search_location['time_range'],
+                        radius=radius,
+                        # Watermarks are naive UTC, which homeharvest would read as local time
+                        updated_since=updated_since.replace(tzinfo=timezone.utc) if updated_since is not None else None,
+                        return_type="pandas"
+                    )
+            except Exception as e:
+                if attempt == FETCH_ATTEMPTS:
+                    raise
+                FETCH_RETRIES.inc()
+                delay = FETCH_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"Fetch for {search_location['location']} at {radius} miles failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._count_rows('fetched', len(properties))
+            if self.recorder is not None:
+                self.recorder.save_frame(params, properties)
+            return properties
+    
+    def _stage(self, name):
+        """Time a scrape stage, counting it towards the running scrape's totals if there is one"""
+        return (self.current_run.timings if self.current_run is not None else StageTimings()).stage(name)
+    
+    def _count_rows(self, outcome, rows):
+        """Count scraped rows by outcome in the metrics and the running scrape's tally"""
+        SCRAPE_ROWS.labels(outcome).inc(rows)
+        if self.current_run is not None:
+            self.current_run.count(outcome, rows)
+    
+    def _count_error(self, stage, radius, message, search_location=None):
+        """Count a failed fetch or batch write in the metrics and the running scrape's tally.
+        
+        A failed fetch marks its search location as incompletely fetched.
+        """
+        SCRAPE_ERRORS.labels(stage, radius).inc()
+        if self.current_run is not None:
+            self.current_run.error(message, search_location)
+    
+    def _geocode(self, location):
+        """Search center for a location, recorded and replayed along with the scrape results"""
+        if self.replayer is not None:
+            return self.replayer.load_geocode(location)
+        center = geocode_location(location, use_env_override=location == LOCATION)
+        if self.recorder is not None and center is not None:
+            self.recorder.save_geocode(location, center)
+        return center
+    
+    def iter_property_batches(self, mode=None, search_location=None):
+        """Yield (label, DataFrame) batches of scraped properties, each row carrying an estdist column.
+        
+        'single_pass' fetches once at the maximum radius and derives estdist from each
+        listing's coordinates; 'radius_sweep' runs the original 1..N mile sweep where
+        estdist is the smallest radius a listing was first seen in. Without a
+        search_location the hardcoded LOCATION is scraped.
+        """
+        mode = mode or self.settings.get('scrape_mode', 'single_pass')
+        search_location = search_location or self.default_search_location()
+        if mode == 'single_pass':
+            center = self._geocode(search_location['location'])
+            if center is not None:
+                yield from self._iter_single_pass(center, search_location)
+                return
+            logger.warning(f"Could not geocode {search_location['location']}, falling back to radius sweep")
+        yield from self._iter_radius_sweep(search_location)
+    
+    def _iter_single_pass(self, center, search_location):
+        """Fetch once at the maximum radius and bucket listings by haversine distance"""
+        max_radius = search_location['radius']
+        label = f"{search_location['location']} {max_radius} miles"
+        logger.info(f"Scraping once with radius: {label}")
+        
+        try:
+            properties = self._fetch_radius(max_radius, search_location)
+        except Exception as e:
+            logger.error(f"Error scraping radius {label}: {str(e)}")
+            self._count_error('fetch', str(max_radius), f"Error scraping radius {label}: {str(e)}", search_location)
+            return
+        
+        if not properties.size > 0:
+            logger.info(f"No properties found for radius {label}")
+            return
+        
+        initial_count = len(properties)
+        with self._stage('dedup'):
+            properties = properties.drop_duplicates(subset=['property_id'], keep='first')
+        duplicates_removed = initial_count - len(properties)
+        self._count_rows('duplicate', duplicates_removed)
+        if duplicates_removed > 0:
+            logger.info(f"Removed {duplicates_removed} duplicate properties from radius {label}")
+        
+        # Round up to whole miles so estdist matches the smallest integer radius a sweep
+        # would have found the listing in. Listings without coordinates get the max radius.
+        distances = haversine_miles(properties['latitude'], properties['longitude'], *center)
+        estdist = np.clip(np.ceil(distances), 1, max_radius)
+        properties = properties.assign(estdist=np.where(np.isnan(estdist), max_radius, estdist).astype(int))
+        
+        yield label, properties
+    
+    def _iter_radius_sweep(self, search_location):
+        """Scrape in incremental radius steps from 1 mile to max_radius"""
+        max_radius = search_location['radius']
+        
+        # Keep track of all property IDs found so far so estdist comes from the smallest radius
+        seen_property_ids = set()
+        
+        for current_radius in range(1, max_radius + 1):
+            label = f"{search_location['location']} {current_radius} miles"
+            logger.info(f"Scraping with radius: {label}")
+            
+            try:
+                properties = self._fetch_radius(current_radius, search_location)
+            except Exception as e:
+                logger.error(f"Error scraping radius {label}: {str(e)}")
+                self._count_error('fetch', str(current_radius), f"Error scraping radius {label}: {str(e)}", search_location)
+                # Continue with next radius even if this one fails
+                continue
+            
+            if not properties.size > 0:
+                logger.info(f"No properties found for radius {label}")
+                continue
+            
+            # Remove duplicates from scraped properties for this radius
+            initial_count = len(properties)
+            with self._stage('dedup'):
+                properties = properties.drop_duplicates(subset=['property_id'], keep='first')
+                duplicates_removed = initial_count - len(properties)
+                
+                # Also filter out properties we've already seen in this scraping session
+                properties_before_session_filter = len(properties)
+                properties = properties[~properties['property_id'].isin(seen_property_ids)]
+                session_duplicates_removed = properties_before_session_filter - len(properties)
+            self._count_rows('duplicate', duplicates_removed + session_duplicates_removed)
             
-            max_radius = self.settings['search_radius']
-            search_time_range = self.settings['search_time_range']
+            if duplicates_removed > 0:
+                logger.info(f"Removed {duplicates_removed} duplicate properties from radius {label}")
             
-            # Keep track of all property IDs found in this scraping session
-            all_scraped_property_ids = set()
+            if session_duplicates_removed > 0:
+                logger.info(f"Removed {session_duplicates_removed} properties already seen in this scraping session")
+            
+            seen_property_ids.update(properties['property_id'])
+            yield label, properties.assign(estdist=current_radius)
+    
+    def iter_all_location_batches(self, mode=None):
+        """Fetch every enabled search location concurrently and yield their batches as they arrive.
+        
+        Fetching runs on a bounded worker pool; batches are handed back through a
+        queue so the caller, the single writer, stores them one at a time. Total time
+        is bounded by the slowest location rather than the sum of all of them.
+        """
+        search_locations = self.load_search_locations()
+        if self.current_run is not None:
+            self.current_run.search_locations = search_locations
+        if not search_locations:
+            logger.info("No enabled search locations")
+            return
+        
+        batches = queue.Queue(maxsize=SCRAPE_QUEUE_SIZE)
+        cancelled = threading.Event()
+        done = object()
+        
+        def put(item):
+            # Give up if the consumer has gone away, so workers never block on a full queue
+            while not cancelled.is_set():
+                try:
+                    batches.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def fetch_location(search_location):
+            try:
+                for batch in self.iter_property_batches(mode, search_location):
+                    if cancelled.is_set():
+                        break
+                    put(batch)
+            except Exception as e:
+                logger.error(f"Error scraping {search_location['location']}: {str(e)}")
+                if self.current_run is not None:
+                    self.current_run.error(f"Error scraping {search_location['location']}: {str(e)}", search_location)
+            finally:
+                put(done)
+        
+        with ThreadPoolExecutor(max_workers=min(SCRAPE_WORKERS, len(search_locations)),
+                                thread_name_prefix='scrape') as pool:
+            try:
+                for search_location in search_locations:
+                    pool.submit(fetch_location, search_location)
+                
+                remaining = len(search_locations)
+                while remaining:
+                    batch = batches.get()
+                    if batch is done:
+                        remaining -= 1
+                        continue
+                    yield batch
+            finally:
+                cancelled.set()
+    
+    def submit_scrape(self, trigger='manual'):
+        """Queue a scrape job unless one is already queued or running.
+        
+        Returns (job, created); when a scrape is already in flight that job is
+        returned instead of starting another. The job is stored in the database and
+        run by whichever process holds the scheduler lease.
+        """
+        db = SessionLocal()
+        try:
+            # Lock the settings row (on backends that support it) so concurrent
+            # submissions from several web workers can't both create a job
+            db.query(Settings).filter(Settings.id == 1).with_for_update().first()
+            active = (db.query(ScrapeJob)
+                      .filter(ScrapeJob.status.in_(('queued', 'running')))
+                      .order_by(ScrapeJob.submitted_at.desc())
+                      .first())
+            if active is not None:
+                logger.info(f"Scrape job {active.id} already {active.status}, not submitting a {trigger} scrape")
+                db.expunge(active)
+                return active, False
+            
+            job = ScrapeJob(id=uuid.uuid4().hex, trigger=trigger, status='queued', submitted_at=datetime.utcnow())
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        
+        logger.info(f"Submitted {trigger} scrape job {job.id}")
+        if self.scheduler.running:
+            self.start_queued_job()
+        return job, True
+    
+    def get_job(self, job_id):
+        """Get a scrape job by id, or None"""
+        if self.current_job is not None and self.current_job.id == job_id:
+            return self.current_job  # Has progress not yet written to the database
+        db = ReadSessionLocal()
+        try:
+            return db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+        finally:
+            db.close()
+    
+    def list_jobs(self):
+        """Recent scrape jobs, most recently submitted first"""
+        db = ReadSessionLocal()
+        try:
+            return db.query(ScrapeJob).order_by(ScrapeJob.submitted_at.desc()).limit(MAX_LISTED_JOBS).all()
+        finally:
+            db.close()
+    
+    def start_queued_job(self):
+        """Scheduler leader only: claim the queued job, if any, and run it in the background"""
+        db = SessionLocal()
+        try:
+            job = db.query(ScrapeJob).filter(ScrapeJob.status == 'queued').order_by(ScrapeJob.submitted_at).first()
+            if job is None:
+                return
+            # Claim it atomically so it can only ever start once
+            claimed = (db.query(ScrapeJob)
+                       .filter(ScrapeJob.id == job.id, ScrapeJob.status == 'queued')
+                       .update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session='fetch'))
+            db.commit()
+            if not claimed:
+                return
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        
+        self.scheduler.add_job(
+            func=self.run_scrape_job,
+            args=[job],
+            trigger="date",
+            id=f'scrape_job_{job.id}',
+            name=f'{job.trigger.capitalize()} property scrape'
+        )
+    
+    def fail_orphaned_jobs(self):
+        """Mark jobs left running by a scraper process that died as failed.
+        
+        Only the lease holder runs jobs, so when a process takes over the lease
+        nothing can legitimately still be running.
+        """
+        db = SessionLocal()
+        try:
+            orphaned = (db.query(ScrapeJob)
+                        .filter(ScrapeJob.status == 'running')
+                        .update({
+                            'status': 'failed',
+                            'stage': None,
+                            'error': 'Scraper worker stopped before the job finished',
+                            'finished_at': datetime.utcnow()
+                        }, synchronize_session=False))
+            db.commit()
+            if orphaned:
+                logger.warning(f"Marked {orphaned} orphaned scrape job(s) as failed")
+        finally:
+            db.close()
+    
+    def scrape_due(self):
+        """True if no scrape has succeeded within the update interval"""
+        db = ReadSessionLocal()
+        try:
+            last = (db.query(ScrapeJob.finished_at)
+                    .filter(ScrapeJob.status == 'succeeded')
+                    .order_by(ScrapeJob.finished_at.desc())
+                    .first())
+        finally:
+            db.close()
+        if last is None or last.finished_at is None:
+            return True
+        return datetime.utcnow() - last.finished_at >= timedelta(hours=self.settings['update_interval'])
+    
+    def _save_job(self, job):
+        """Write a job's status and progress to the database"""
+        db = SessionLocal()
+        try:
+            db.merge(job)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving scrape job {job.id}: {str(e)}")
+        finally:
+            db.close()
+    
+    def _record_run(self, job, run, duration):
+        """Add a finished job's tally to the scrape_runs ledger"""
+        errors = list(run.errors)
+        if job.error and job.error not in errors:
+            errors.append(job.error)
+        db = SessionLocal()
+        try:
+            params = {**run.params, 'search_locations': run.search_locations}
+            db.add(ScrapeRun(
+                job_id=job.id,
+                trigger=job.trigger,
+                status=job.status,
+                scrape_mode=run.params.get('scrape_mode'),
+                params=json.dumps(params, default=datetime.isoformat),
+                started_at=job.started_at,
+                finished_at=job.finished_at,
+                duration_seconds=round(duration, 3),
+                rows_fetched=run.counts['fetched'],
+                duplicates=run.counts['duplicate'],
+                skipped=run.counts['skipped'],
+                rows_processed=job.rows_processed or 0,
+                added=job.added or 0,
+                changed=job.changed or 0,
+                unchanged=job.unchanged or 0,
+                off_market=run.counts['off_market'],
+                error_count=len(errors),
+                errors=json.dumps(errors) if errors else None,
+                stage_timings=json.dumps({stage: round(seconds, 3) for stage, seconds in run.timings.totals.items()})
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error recording scrape run for job {job.id}: {str(e)}")
+        finally:
+            db.close()
+    
+    def run_scrape_job(self, job):
+        """Run a claimed scrape job to completion, recording its outcome and its run in the ledger"""
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.utcnow()
+        self.current_job = job
+        run = self.current_run = ScrapeRunTally()
+        started_at = time.perf_counter()
+        try:
+            self.scrape_and_store_properties(job)
+        finally:
+            self.current_job = None
+            self.current_run = None
+            duration = time.perf_counter() - started_at
+            job.stage = None
+            job.finished_at = datetime.utcnow()
+            job.status = 'failed' if job.error else 'succeeded'
+            SCRAPE_JOB_SECONDS.labels(job.trigger, job.status).observe(duration)
+            self._save_job(job)
+            self._record_run(job, run, duration)
+            logger.info(f"Scrape job {job.id} {job.status}")
+    
+    def scrape_and_store_properties(self, job=None):
+        """Scrape properties and store/update them in the database.
+        
+        When run as part of a ScrapeJob, progress and any error are recorded on it.
+        Afterwards fully fetched locations are reconciled and watermarks advanced.
+        """
+        owns_run = self.current_run is None
+        if owns_run:
+            self.current_run = ScrapeRunTally()
+        try:
+            scrape_mode = self.settings.get('scrape_mode', 'single_pass')
+            logger.info(f"Starting property scraping in {scrape_mode} mode...")
+            logger.info(f"Current scraper settings: {self.settings}")
+            started_at = time.perf_counter()
+            fetch_started_at = datetime.utcnow()
+            run = self.current_run
+            timings = run.timings
+            run.params.update(scrape_mode=scrape_mode, settings=dict(self.settings))
             
             db = SessionLocal()
             try:
-                # Get all existing property IDs to avoid database lookups in the loop
-                existing_property_ids = set(db.query(Property.property_id).all())
-                existing_property_ids = {pid[0] for pid in existing_property_ids}
+                # Load every stored fingerprint so added/changed/unchanged can be told apart without per-row lookups
+                known_hashes = dict(db.query(Property.property_id, Property.content_hash))
+                # End the read transaction so the writer connection isn't held while fetching
+                db.rollback()
                 
                 properties_processed = 0
-                properties_updated = 0
                 properties_added = 0
+                properties_changed = 0
+                properties_unchanged = 0
                 
-                # Scrape in incremental radius steps from 1 mile to max_radius
-                for current_radius in range(1, max_radius + 1):
-                    logger.info(f"Scraping with radius: {current_radius} miles")
-                    
+                # Every listing fetched, and whether any batch failed to store
+                seen_property_ids = set()
+                store_failed = False
+                
+                for batch_label, properties in self.iter_all_location_batches(scrape_mode):
                     try:
-                        # Scrape properties for current radius
-                        properties = scrape_property(
-                            location=LOCATION,
-                            listing_type="for_sale",
-                            past_days=search_time_range,
-                            radius=current_radius,
-                            return_type="pandas"
-                        )
+                        logger.info(f"Processing {len(properties)} unique properties from radius {batch_label}")
+                        if job is not None:
+                            job.stage = 'storing'
+                            job.current_batch = batch_label
                         
-                        if not properties.size > 0:
-                            logger.info(f"No properties found for radius {current_radius} miles")
-                            continue
+                        with timings.stage('normalize'):
+                            normalized = normalize_properties(properties)
+                        seen_property_ids.update(normalized['property_id'])
+                        skipped = len(properties) - len(normalized)
+                        if skipped > 0:
+                            logger.warning(f"Skipping {skipped} properties without a valid ID from radius {batch_label}")
                         
-                        # Remove duplicates from scraped properties for this radius
-                        initial_count = len(properties)
-                        properties = properties.drop_duplicates(subset=['property_id'], keep='first')
-                        duplicates_removed = initial_count - len(properties)
+                        with timings.stage('detect'):
+                            added, changed, unchanged = detect_changes(normalized, known_hashes)
                         
-                        if duplicates_removed > 0:
-                            logger.info(f"Removed {duplicates_removed} duplicate properties from radius {current_radius} miles")
+                        # Unchanged listings are not written at all; written ones are stamped with the new generation
+                        now = datetime.utcnow()
+                        row_version = response_cache.bump_generation(db) if len(added) or len(changed) else None
+                        with timings.stage('upsert'):
+                            previous = load_properties(db, changed['property_id'], SCRAPED_COLUMNS + ['estdist'])
+                            record_history(db, added, changed, now, previous)
+                            upsert_properties(db, pd.concat([added, changed]), now, row_version)
                         
-                        # Also filter out properties we've already seen in this scraping session
-                        properties_before_session_filter = len(properties)
-                        properties = properties[~properties['property_id'].isin(all_scraped_property_ids)]
-                        session_duplicates_removed = properties_before_session_filter - len(properties)
+                        if len(added) or len(changed):
+                            with timings.stage('aggregate'):
+                                update_market_aggregates(db, previous, pd.concat([added, stored_values(changed, previous)]))
+                                adjust_property_stats(db, total=len(added))
+                            with timings.stage('events'):
+                                record_listing_events(db, added['property_id'], changed['property_id'], now)
                         
-                        if session_duplicates_removed > 0:
-                            logger.info(f"Removed {session_duplicates_removed} properties already seen in this scraping session")
+                        # Commit after each batch to avoid losing data if a later radius fails
+                        with timings.stage('commit'):
+                            db.commit()
                         
-                        logger.info(f"Processing {len(properties)} unique properties from radius {current_radius} miles")
+                        # Warm the photo cache in the background so new listing cards load from it;
+                        # replays stay offline (synthetic recordings' photo URLs don't exist anyway)
+                        if self.replayer is None:
+                            photo_cache.prefetch(pd.concat([added, changed])['primary_photo'].dropna())
                         
-                        # Process each property
-                        for idx, prop in properties.iterrows():
-                            # Get property ID
-                            property_id = prop.get('property_id')
-                            if not property_id or pd.isna(property_id) or property_id == 'N/A':
-                                logger.warning(f"Skipping property without valid ID: {prop.get('street', 'Unknown address')}")
-                                continue
-                            
-                            # Skip if we've already processed this property in this scraping session
-                            # This ensures we only set estdist once per scraping session (from the smallest radius it was found in)
-                            if property_id in all_scraped_property_ids:
-                                logger.warning(f"Property {property_id} already processed in this session, skipping")
-                                continue
-                            
-                            # Add to our session tracking immediately to prevent duplicate processing
-                            all_scraped_property_ids.add(property_id)
-                            
-                            # Format property type
-                            raw_property_type = prop.get('style', 'N/A')
-                            if raw_property_type != 'N/A' and isinstance(raw_property_type, str):
-                                formatted_property_type = raw_property_type.replace('_', ' ').title()
-                            else:
-                                formatted_property_type = raw_property_type
-                            
-                            # Calculate lot acres
-                            lot_sqft = prop.get('lot_sqft', 0)
-                            if pd.isna(lot_sqft) or lot_sqft == 0:
-                                lot_acre = None
-                            else:
-                                lot_acre = round(lot_sqft / 43560, 2)
-                            
-                            # Check if property already exists using the pre-loaded set
-                            if property_id in existing_property_ids:
-                                # Get existing property for update
-                                existing_property = db.query(Property).filter(Property.property_id == property_id).first()
-                                if existing_property:
-                                    # Update existing property (DO NOT update estdist field)
-                                    existing_property.address = prop.get('street') if not pd.isna(prop.get('street')) else existing_property.address
-                                    existing_property.city = prop.get('city') if not pd.isna(prop.get('city')) else existing_property.city
-                                    existing_property.state = prop.get('state') if not pd.isna(prop.get('state')) else existing_property.state
-                                    existing_property.zip_code = prop.get('zip_code') if not pd.isna(prop.get('zip_code')) else existing_property.zip_code
-                                    existing_property.sqft = int(prop.get('sqft')) if not pd.isna(prop.get('sqft')) else existing_property.sqft
-                                    existing_property.lot_acre = lot_acre if lot_acre is not None else existing_property.lot_acre
-                                    existing_property.list_price = int(prop.get('list_price')) if not pd.isna(prop.get('list_price')) else existing_property.list_price
-                                    existing_property.beds = int(prop.get('beds')) if not pd.isna(prop.get('beds')) else existing_property.beds
-                                    existing_property.baths = float(prop.get('full_baths')) if not pd.isna(prop.get('full_baths')) else existing_property.baths
-                                    existing_property.year_built = int(prop.get('year_built')) if not pd.isna(prop.get('year_built')) else existing_property.year_built
-                                    existing_property.property_type = formatted_property_type if formatted_property_type != 'N/A' else existing_property.property_type
-                                    existing_property.stories = int(prop.get('stories')) if not pd.isna(prop.get('stories')) else existing_property.stories
-                                    existing_property.parking_garage = float(prop.get('parking_garage')) if not pd.isna(prop.get('parking_garage')) else existing_property.parking_garage
-                                    existing_property.listing_date = prop.get('list_date') if not pd.isna(prop.get('list_date')) else existing_property.listing_date
-                                    existing_property.primary_photo = prop.get('primary_photo') if not pd.isna(prop.get('primary_photo')) else existing_property.primary_photo
-                                    existing_property.description = prop.get('text') if not pd.isna(prop.get('text')) else existing_property.description
-                                    existing_property.url = prop.get('property_url') if not pd.isna(prop.get('property_url')) else existing_property.url
-                                    existing_property.status = prop.get('status') if not pd.isna(prop.get('status')) else existing_property.status
-                                    existing_property.last_updated = datetime.utcnow()
-                                    
-                                    properties_updated += 1
-                            else:
-                                # Double-check property doesn't exist in database before creating new one
-                                existing_check = db.query(Property).filter(Property.property_id == property_id).first()
-                                if existing_check:
-                                    logger.warning(f"Property {property_id} found in database during new property creation, updating instead")
-                                    existing_property_ids.add(property_id)  # Add to tracking set
-                                    # Update the existing property instead
-                                    existing_check.address = prop.get('street') if not pd.isna(prop.get('street')) else existing_check.address
-                                    existing_check.city = prop.get('city') if not pd.isna(prop.get('city')) else existing_check.city
-                                    existing_check.state = prop.get('state') if not pd.isna(prop.get('state')) else existing_check.state
-                                    existing_check.zip_code = prop.get('zip_code') if not pd.isna(prop.get('zip_code')) else existing_check.zip_code
-                                    existing_check.sqft = int(prop.get('sqft')) if not pd.isna(prop.get('sqft')) else existing_check.sqft
-                                    existing_check.lot_acre = lot_acre if lot_acre is not None else existing_check.lot_acre
-                                    existing_check.list_price = int(prop.get('list_price')) if not pd.isna(prop.get('list_price')) else existing_check.list_price
-                                    existing_check.beds = int(prop.get('beds')) if not pd.isna(prop.get('beds')) else existing_check.beds
-                                    existing_check.baths = float(prop.get('full_baths')) if not pd.isna(prop.get('full_baths')) else existing_check.baths
-                                    existing_check.year_built = int(prop.get('year_built')) if not pd.isna(prop.get('year_built')) else existing_check.year_built
-                                    existing_check.property_type = formatted_property_type if formatted_property_type != 'N/A' else existing_check.property_type
-                                    existing_check.stories = int(prop.get('stories')) if not pd.isna(prop.get('stories')) else existing_check.stories
-                                    existing_check.parking_garage = float(prop.get('parking_garage')) if not pd.isna(prop.get('parking_garage')) else existing_check.parking_garage
-                                    existing_check.listing_date = prop.get('list_date') if not pd.isna(prop.get('list_date')) else existing_check.listing_date
-                                    existing_check.primary_photo = prop.get('primary_photo') if not pd.isna(prop.get('primary_photo')) else existing_check.primary_photo
-                                    existing_check.description = prop.get('text') if not pd.isna(prop.get('text')) else existing_check.description
-                                    existing_check.url = prop.get('property_url') if not pd.isna(prop.get('property_url')) else existing_check.url
-                                    existing_check.status = prop.get('status') if not pd.isna(prop.get('status')) else existing_check.status
-                                    existing_check.last_updated = datetime.utcnow()
-                                    properties_updated += 1
-                                    continue
-                                
-                                # Create new property with estdist set to current radius
-                                try:
-                                    new_property = Property(
-                                        property_id=property_id,
-                                        address=prop.get('street') if not pd.isna(prop.get('street')) else None,
-                                        city=prop.get('city') if not pd.isna(prop.get('city')) else None,
-                                        state=prop.get('state') if not pd.isna(prop.get('state')) else None,
-                                        zip_code=prop.get('zip_code') if not pd.isna(prop.get('zip_code')) else None,
-                                        sqft=int(prop.get('sqft')) if not pd.isna(prop.get('sqft')) else None,
-                                        lot_acre=lot_acre,
-                                        list_price=int(prop.get('list_price')) if not pd.isna(prop.get('list_price')) else None,
-                                        beds=int(prop.get('beds')) if not pd.isna(prop.get('beds')) else None,
-                                        baths=float(prop.get('full_baths')) if not pd.isna(prop.get('full_baths')) else None,
-                                        year_built=int(prop.get('year_built')) if not pd.isna(prop.get('year_built')) else None,
-                                        property_type=formatted_property_type if formatted_property_type != 'N/A' else None,
-                                        stories=int(prop.get('stories')) if not pd.isna(prop.get('stories')) else None,
-                                        parking_garage=float(prop.get('parking_garage')) if not pd.isna(prop.get('parking_garage')) else None,
-                                        favorited=False,
-                                        estdist=current_radius,  # Set estimated distance to current search radius
-                                        listing_date=prop.get('list_date') if not pd.isna(prop.get('list_date')) else None,
-                                        primary_photo=prop.get('primary_photo') if not pd.isna(prop.get('primary_photo')) else None,
-                                        description=prop.get('text') if not pd.isna(prop.get('text')) else None,
-                                        url=prop.get('property_url') if not pd.isna(prop.get('property_url')) else None,
-                                        status=prop.get('status') if not pd.isna(prop.get('status')) else None,
-                                        first_seen=datetime.utcnow(),
-                                        last_updated=datetime.utcnow()
-                                    )
-                                    db.add(new_property)
-                                    existing_property_ids.add(property_id)  # Add to our tracking set to prevent duplicates
-                                    properties_added += 1
-                                except Exception as add_error:
-                                    logger.error(f"Error adding property {property_id}: {str(add_error)}")
-                                    # If it's an integrity error, the property might already exist
-                                    if "UNIQUE constraint failed" in str(add_error):
-                                        logger.warning(f"Property {property_id} appears to already exist, skipping")
-                                        existing_property_ids.add(property_id)
-                                    else:
-                                        # Re-raise if it's not a duplicate error
-                                        raise add_error
-                            
-                            properties_processed += 1
+                        self._count_rows('skipped', skipped)
+                        self._count_rows('added', len(added))
+                        self._count_rows('changed', len(changed))
+                        self._count_rows('unchanged', len(unchanged))
                         
-                        # Commit after each radius to avoid losing data if later radius fails
-                        try:
-                            db.commit()
-                            logger.info(f"Completed radius {current_radius} miles: {len(properties)} properties processed")
-                        except Exception as commit_error:
-                            logger.error(f"Error committing radius {current_radius} miles: {str(commit_error)}")
-                            db.rollback()
-                            raise commit_error
+                        known_hashes.update(zip(normalized['property_id'], normalized['content_hash']))
+                        
+                        properties_processed += len(normalized)
+                        properties_added += len(added)
+                        properties_changed += len(changed)
+                        properties_unchanged += len(unchanged)
+                        if job is not None:
+                            job.rows_processed = properties_processed
+                            job.added = properties_added
+                            job.changed = properties_changed
+                            job.unchanged = properties_unchanged
+                            self._save_job(job)
+                        logger.info(f"Completed radius {batch_label}: {len(normalized)} properties processed, {len(added)} added, {len(changed)} changed, {len(unchanged)} unchanged")
                         
                     except Exception as e:
-                        logger.error(f"Error scraping radius {current_radius} miles: {str(e)}")
+                        logger.error(f"Error storing radius {batch_label}: {str(e)}")
+                        self._count_error('store', batch_radius(batch_label), f"Error storing radius {batch_label}: {str(e)}")
+                        store_failed = True
                         # Rollback any pending changes for this radius
                         try:
                             db.rollback()
@@ -274,7 +779,16 @@ class PropertyScraper:
                         # Continue with next radius even if this one fails
                         continue
                 
-                logger.info(f"Incremental scraping completed: {properties_processed} total processed, {properties_added} added, {properties_updated} updated")
+                if store_failed:
+                    # Leave the watermarks where they were so the next scrape fetches this window again
+                    logger.warning("Not advancing scrape watermarks after a failed batch write")
+                    properties_off_market = 0
+                else:
+                    properties_off_market = self._finish_fetches(db, run, seen_property_ids, fetch_started_at)
+                
+                elapsed = time.perf_counter() - started_at
+                logger.info(f"Scraping ({scrape_mode}) completed in {elapsed:.1f}s: {properties_processed} total processed, {properties_added} added, {properties_changed} changed, {properties_unchanged} unchanged, {properties_off_market} marked off-market")
+                logger.info(f"Scrape stage timings: {timings.summary()}")
                 
             except Exception as e:
                 db.rollback()
@@ -282,38 +796,181 @@ class PropertyScraper:
                 raise
             finally:
                 db.close()
+                if owns_run:
+                    self.current_run = None
                 
         except Exception as e:
             logger.error(f"Error during property scraping: {str(e)}")
+            if job is not None:
+                job.error = str(e)
     
-    def start_scheduler(self):
-        """Start the background scheduler"""
-        # Schedule scraping based on current settings
+    def _finish_fetches(self, db, run, seen_property_ids, fetched_at):
+        """Reconcile each fully fetched location and advance the watermark of every completely fetched one.
+        
+        Returns the number of listings marked off-market.
+        """
+        removed_ids = []
+        for search_location in run.search_locations:
+            if search_location['id'] in run.failed_locations:
+                logger.warning(f"Not advancing the watermark of {search_location['location']}, which was not completely fetched")
+                continue
+            values = {'watermark': fetched_at, 'fetch_key': fetch_key(search_location)}
+            if search_location['updated_since'] is None:
+                with self._stage('reconcile'):
+                    removed = self._reconcile_location(db, search_location, seen_property_ids)
+                if removed is None:
+                    # Leave the watermark so the next scrape fetches this location in full again
+                    continue
+                removed_ids.extend(removed)
+                values['reconciled_at'] = fetched_at
+            db.query(SearchLocation).filter(SearchLocation.id == search_location['id']).update(values, synchronize_session=False)
+        
+        if removed_ids:
+            record_removed_events(db, removed_ids, fetched_at)
+        prune_events(db)
+        db.commit()
+        self._count_rows('off_market', len(removed_ids))
+        return len(removed_ids)
+    
+    def _reconcile_location(self, db, search_location, seen_property_ids):
+        """Mark listings within a fully fetched location's search that it no longer returned as off-market.
+        
+        Returns the IDs of the listings marked, or None if the fetch returned less than
+        RECONCILE_MIN_RETURNED of the stored listings, which is left unreconciled.
+        """
+        statuses = listing_statuses(search_location['listing_types'])
+        center = self._geocode(search_location['location'])
+        if center is None or not statuses:
+            logger.info(f"Not reconciling {search_location['location']}: no search center or no reconcilable listing types")
+            return []
+        
+        now = datetime.utcnow()
+        # listing_date is the scraped date as text, so compares as a string
+        listed_after = (now - timedelta(days=search_location['time_range'] - RECONCILE_EDGE_DAYS)).strftime('%Y-%m-%d')
+        columns = ['property_id'] + ANALYTICS_COLUMNS
+        query = (db.query(*[getattr(Property, column) for column in columns])
+                 .filter(Property.status.in_(statuses), Property.listing_date >= listed_after))
+        query = apply_spatial_filters(query, {
+            'lat': center[0],
+            'lon': center[1],
+            'radius_miles': max(search_location['radius'] - RECONCILE_EDGE_MILES, RECONCILE_EDGE_MILES)
+        })
+        stored = pd.DataFrame(query.all(), columns=columns, dtype=object)
+        vanished = stored[~stored['property_id'].isin(seen_property_ids)]
+        if vanished.empty:
+            return []
+        returned = len(stored) - len(vanished)
+        if returned == 0 or returned < RECONCILE_MIN_RETURNED * len(stored):
+            message = (f"Not reconciling {search_location['location']}: its full fetch returned only {returned} "
+                       f"of {len(stored)} stored listings, so it looks incomplete")
+            logger.warning(message)
+            SCRAPE_ERRORS.labels('reconcile', str(search_location['radius'])).inc()
+            if self.current_run is not None:
+                self.current_run.reconcile_skipped(message, search_location)
+            return None
+        
+        row_version = response_cache.bump_generation(db)
+        marked = mark_off_market(db, vanished, now, row_version)
+        update_market_aggregates(db, vanished, vanished.assign(status=OFF_MARKET_STATUS))
+        logger.info(f"Marked {marked} listings no longer found around {search_location['location']} as off-market")
+        return vanished['property_id'].tolist()
+    
+    def _schedule_interval_scrape(self):
         self.scheduler.add_job(
-            func=self.scrape_and_store_properties,
+            func=self.submit_scrape,
+            kwargs={'trigger': 'scheduled'},
             trigger="interval",
             hours=self.settings['update_interval'],
             id='property_scraper',
             name=f'Scrape properties every {self.settings["update_interval"]} hour(s)',
             replace_existing=True
         )
+    
+    def start_scheduler(self):
+        """Start the background scheduler.
+        
+        Call only in the process holding the scheduler lease (see worker.py), so
+        exactly one scheduler runs however many web workers there are.
+        """
+        self.fail_orphaned_jobs()
         
-        # Run once immediately on startup
+        # Schedule scraping based on current settings; runs go through submit_scrape
+        # so they never overlap a manual scrape
+        self._schedule_interval_scrape()
+        
+        # Run queued jobs submitted by web workers, and follow settings changes
         self.scheduler.add_job(
-            func=self.scrape_and_store_properties,
-            trigger="date",
-            id='initial_scrape',
-            name='Initial property scrape on startup'
+            func=self.start_queued_job,
+            trigger="interval",
+            seconds=JOB_POLL_SECONDS,
+            id='start_queued_job',
+            name='Start queued scrape jobs',
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            func=self.sync_settings,
+            trigger="interval",
+            seconds=SETTINGS_SYNC_SECONDS,
+            id='sync_settings',
+            name='Reload scraper settings',
+            replace_existing=True
         )
         
+        # Scrape right away only if the last successful scrape is older than the
+        # interval, so restarts and failovers don't each trigger a full scrape
+        if self.scrape_due():
+            self.scheduler.add_job(
+                func=self.submit_scrape,
+                kwargs={'trigger': 'startup'},
+                trigger="date",
+                id='initial_scrape',
+                name='Initial property scrape on startup',
+                replace_existing=True
+            )
+        
         self.scheduler.start()
         logger.info(f"Property scraper scheduler started with {self.settings['update_interval']} hour interval")
     
     def stop_scheduler(self):
-        """Stop the background scheduler"""
+        """Stop the background scheduler, waiting for a running scrape to finish"""
         if self.scheduler.running:
             self.scheduler.shutdown()
+            self.scheduler.remove_all_jobs()
             logger.info("Property scraper scheduler stopped")
 
-# Global scraper instance
+def fetch_key(search_location):
+    """Key of the search parameters a location's watermark holds for"""
+    return recording_key(recording_params(search_location['location'], search_location['listing_types'],
+                                          search_location['time_range'], search_location['radius']))
+
+def listing_statuses(listing_types):
+    """Stored statuses a search for these listing types returns"""
+    statuses = set()
+    for listing_type in listing_types:
+        statuses.update(LISTING_TYPE_STATUSES.get(listing_type, (listing_type.upper(),)))
+    return sorted(statuses)
+
+def batch_radius(batch_label):
+    """The radius of a '<location> <radius> miles' batch label, as a metric label value"""
+    parts = batch_label.rsplit(' ', 2)
+    return parts[-2] if len(parts) == 3 else 'unknown'
+
+def get_or_create_settings(db):
+    """Get settings from database or create default settings"""
+    settings = db.query(Settings).filter(Settings.id == 1).first()
+    if not settings:
+        # Create default settings
+        settings = Settings(
+            id=1,
+            update_interval=1,
+            search_radius=30,
+            search_time_range=365,
+            scrape_mode=scraper.settings['scrape_mode']
+        )
+        db.add(settings)
+        db.commit()
+        db.refresh(settings)
+    return settings
+
+# Global scraper instance; cheap to create, nothing runs until start_scheduler()
 scraper = PropertyScraper()
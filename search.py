@@ -0,0 +1,166 @@
+from sqlalchemy import func, literal_column, table, column, text
+from models import Property
+from queries import apply_property_filters, select_properties, rows_to_dicts, MAX_PAGE_LIMIT
+import base64
+import html
+import json
+import re
+
+# Text columns covered by the full-text index, in FTS5 column order
+SEARCH_COLUMNS = ('address', 'city', 'description')
+
+# bm25 weights per column: an address/town hit counts for more than a mention in the
+# description (PostgreSQL gets the same effect from setweight A/B in PG_SEARCH_DDL)
+SEARCH_WEIGHTS = (4.0, 2.0, 1.0)
+
+DEFAULT_SEARCH_LIMIT = 50
+
+# Snippet markers that can't appear in listing text; swapped for <mark> after HTML-escaping
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+SNIPPET_TOKENS = 16
+
+# SQLite: FTS5 table indexing properties' text columns by rowid, with porter stemming
+# so "creeks" finds "creek". Triggers keep it in step with every insert, upsert and delete.
+SQLITE_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='properties', content_rowid='rowid',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS properties_fts_insert AFTER INSERT ON properties BEGIN
+        INSERT INTO properties_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.rowid, {', '.join(f'new.{c}' for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS properties_fts_delete AFTER DELETE ON properties BEGIN
+        INSERT INTO properties_fts(properties_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.rowid, {', '.join(f'old.{c}' for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS properties_fts_update AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON properties BEGIN
+        INSERT INTO properties_fts(properties_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.rowid, {', '.join(f'old.{c}' for c in SEARCH_COLUMNS)});
+        INSERT INTO properties_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.rowid, {', '.join(f'new.{c}' for c in SEARCH_COLUMNS)});
+    END""",
+]
+
+# PostgreSQL: the same search over a stored tsvector column (kept up to date by
+# PostgreSQL itself) with a GIN index. It isn't on the Property model since SQLite has no equivalent.
+PG_SEARCH_DDL = [
+    f"""ALTER TABLE properties ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(address, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(city, '')), 'B') ||
+        to_tsvector('english'::regconfig, coalesce(description, ''))
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_properties_search_vector ON properties USING GIN (search_vector)",
+]
+
+def create_search_index(conn):
+    """Create the full-text index for the connection's backend and index existing rows"""
+    if conn.dialect.name == 'postgresql':
+        for statement in PG_SEARCH_DDL:
+            conn.execute(text(statement))
+    else:
+        for statement in SQLITE_SEARCH_DDL:
+            conn.execute(text(statement))
+        rebuild_search_index(conn)
+
+def rebuild_search_index(conn):
+    """Re-index every property from scratch (SQLite only; PostgreSQL's index needs no upkeep).
+
+    The FTS5 index is keyed on properties' implicit rowid, which VACUUM may renumber,
+    so run this after vacuuming the database.
+    """
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text("INSERT INTO properties_fts(properties_fts) VALUES ('rebuild')"))
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query: quoted phrases and bare words, all required.
+
+    Each term is quoted so punctuation in user input can't be parsed as FTS5
+    syntax; a trailing * on a word still makes it a prefix search.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', q):
+        if phrase.strip():
+            terms.append('"' + phrase.strip() + '"')
+        elif word:
+            prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '')
+            if word:
+                terms.append('"' + word + '"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    return ' '.join(terms)
+
+def search_properties(db, q, fields, params):
+    """Query properties matching q, best match first, with the numeric filters from params applied.
+
+    Each row carries the requested fields plus 'snippet' and 'rank' columns.
+    """
+    query = select_properties(db, fields)
+    if db.get_bind().dialect.name == 'postgresql':
+        tsquery = func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+        document = literal_column('properties.search_vector')
+        rank = func.ts_rank_cd(document, tsquery)
+        snippet = func.ts_headline(
+            literal_column("'english'::regconfig"),
+            func.coalesce(Property.description, Property.address, ''),
+            tsquery,
+            f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords={SNIPPET_TOKENS}, MinWords=6, MaxFragments=1, FragmentDelimiter=…'
+        )
+        query = query.add_columns(snippet.label('snippet'), rank.label('rank')).filter(document.op('@@')(tsquery))
+        order = rank.desc()
+    else:
+        fts = table('properties_fts', column('rowid'))
+        fts_table = literal_column('properties_fts')
+        # bm25 is lower for better matches; -1 picks the best-matching column for the snippet
+        rank = func.bm25(fts_table, *SEARCH_WEIGHTS)
+        snippet = func.snippet(fts_table, -1, _MARK_START, _MARK_END, '…', SNIPPET_TOKENS)
+        query = (query.add_columns(snippet.label('snippet'), rank.label('rank'))
+                 .join(fts, fts.c.rowid == literal_column('properties.rowid'))
+                 .filter(fts_table.op('MATCH')(build_match_query(q))))
+        order = rank.asc()
+    return apply_property_filters(query, params).order_by(order, Property.property_id)
+
+def format_snippet(snippet):
+    """HTML-escape a snippet and wrap matched terms in <mark>"""
+    if not snippet:
+        return snippet
+    return html.escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def search_rows_to_dicts(rows, fields):
+    """Serialize search rows: the requested fields plus an HTML snippet and relevance score"""
+    items = rows_to_dicts(rows, fields)
+    for item, row in zip(items, rows):
+        item['snippet'] = format_snippet(row.snippet)
+        item['rank'] = round(abs(row.rank), 4) if row.rank is not None else None
+    return items
+
+def encode_offset_cursor(offset):
+    """Results are ranked rather than keyed, so search cursors carry an offset"""
+    raw = json.dumps({'offset': offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_offset_cursor(cursor):
+    """Decode a cursor produced by encode_offset_cursor; no cursor means the first page"""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded.encode()))['offset']
+        return max(0, int(offset))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_search_limit(limit):
+    """Page size for search results, defaulting to DEFAULT_SEARCH_LIMIT"""
+    if limit is None or limit == '':
+        return DEFAULT_SEARCH_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {limit}")
+    if limit < 1:
+        raise ValueError("Limit must be at least 1")
+    return min(limit, MAX_PAGE_LIMIT)
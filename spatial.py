@@ -0,0 +1,149 @@
+from sqlalchemy import and_, func, literal_column, select, table, column, text
+from models import Property
+from geo import EARTH_RADIUS_MILES
+import math
+
+MILES_PER_DEGREE_LAT = 2 * math.pi * EARTH_RADIUS_MILES / 360
+
+# SQLite: R*Tree over property coordinates keyed by properties' rowid, kept in step by
+# triggers. R*Tree stores 32-bit floats and rounds boxes outward, so matches are
+# re-checked against the exact columns.
+SQLITE_SPATIAL_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS properties_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """CREATE TRIGGER IF NOT EXISTS properties_rtree_insert AFTER INSERT ON properties
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO properties_rtree VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS properties_rtree_update AFTER UPDATE OF latitude, longitude ON properties BEGIN
+        DELETE FROM properties_rtree WHERE id = old.rowid;
+        INSERT INTO properties_rtree SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS properties_rtree_delete AFTER DELETE ON properties BEGIN
+        DELETE FROM properties_rtree WHERE id = old.rowid;
+    END""",
+]
+
+# PostgreSQL: GiST index on the built-in point type; the expression matches _pg_point()
+PG_SPATIAL_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_properties_location ON properties USING GIST (point(longitude, latitude))",
+]
+
+def create_spatial_index(conn):
+    """Create the spatial index for the connection's backend and index existing rows"""
+    if conn.dialect.name == 'postgresql':
+        for statement in PG_SPATIAL_DDL:
+            conn.execute(text(statement))
+    else:
+        for statement in SQLITE_SPATIAL_DDL:
+            conn.execute(text(statement))
+        rebuild_spatial_index(conn)
+
+def rebuild_spatial_index(conn):
+    """Re-index every property's coordinates (SQLite only; run after VACUUM like the search index)"""
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text("DELETE FROM properties_rtree"))
+        conn.execute(text(
+            "INSERT INTO properties_rtree SELECT rowid, latitude, latitude, longitude, longitude "
+            "FROM properties WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        ))
+
+def _parse_float(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value}")
+
+def parse_point(params):
+    """The reference point from lat and lon parameters, or None if neither is given"""
+    lat = _parse_float(params, 'lat')
+    lon = _parse_float(params, 'lon')
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None:
+        raise ValueError("lat and lon must be given together")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat must be between -90 and 90 and lon between -180 and 180")
+    return lat, lon
+
+def parse_bbox(params):
+    """A bbox parameter 'min_lat,min_lon,max_lat,max_lon' as (min_lat, max_lat, min_lon, max_lon), or None"""
+    bbox = params.get('bbox')
+    if bbox is None or bbox == '':
+        return None
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(value) for value in str(bbox).split(','))
+    except ValueError:
+        raise ValueError("bbox must be min_lat,min_lon,max_lat,max_lon")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not exceed its maximums")
+    return min_lat, max_lat, min_lon, max_lon
+
+def bounding_box(lat, lon, miles):
+    """(min_lat, max_lat, min_lon, max_lon) of a box containing every point within miles of (lat, lon)"""
+    dlat = miles / MILES_PER_DEGREE_LAT
+    # Longitude degrees shrink towards the poles; near them, take every longitude
+    cos_lat = math.cos(math.radians(min(89.0, abs(lat) + dlat)))
+    dlon = 180.0 if cos_lat <= 0 else min(180.0, miles / (MILES_PER_DEGREE_LAT * cos_lat))
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), max(-180.0, lon - dlon), min(180.0, lon + dlon)
+
+def distance_miles(lat, lon):
+    """SQL expression for the haversine distance in miles from (lat, lon) to each property"""
+    dlat = func.radians(Property.latitude - lat) / 2
+    dlon = func.radians(Property.longitude - lon) / 2
+    a = (func.sin(dlat) * func.sin(dlat)
+         + math.cos(math.radians(lat)) * func.cos(func.radians(Property.latitude)) * func.sin(dlon) * func.sin(dlon))
+    return 2 * EARTH_RADIUS_MILES * func.asin(func.sqrt(a))
+
+def _pg_point():
+    return func.point(Property.longitude, Property.latitude)
+
+def _within_box(query, box):
+    """Restrict a query to properties inside (min_lat, max_lat, min_lon, max_lon) using the spatial index"""
+    min_lat, max_lat, min_lon, max_lon = box
+    if query.session.get_bind().dialect.name == 'postgresql':
+        query = query.filter(_pg_point().op('<@')(func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat))))
+    else:
+        rtree = table('properties_rtree', column('id'), column('min_lat'), column('max_lat'), column('min_lon'), column('max_lon'))
+        candidates = select(rtree.c.id).where(
+            rtree.c.max_lat >= min_lat, rtree.c.min_lat <= max_lat,
+            rtree.c.max_lon >= min_lon, rtree.c.min_lon <= max_lon
+        )
+        query = query.filter(literal_column('properties.rowid').in_(candidates))
+    return query.filter(and_(
+        Property.latitude.between(min_lat, max_lat),
+        Property.longitude.between(min_lon, max_lon)
+    ))
+
+def apply_spatial_filters(query, params):
+    """Apply the bbox and radius_miles (around lat/lon) filters from a request dict to a query"""
+    box = parse_bbox(params)
+    if box is not None:
+        query = _within_box(query, box)
+
+    radius = _parse_float(params, 'radius_miles')
+    if radius is not None:
+        point = parse_point(params)
+        if point is None:
+            raise ValueError("radius_miles needs lat and lon")
+        if radius <= 0:
+            raise ValueError("radius_miles must be positive")
+        # Index seek on the enclosing box, then the exact distance on those candidates
+        query = _within_box(query, bounding_box(*point, radius))
+        query = query.filter(distance_miles(*point) <= radius)
+
+    return query
+
+def add_distance(query, fields, params):
+    """Select each property's distance in miles from lat/lon, if given, as a 'distance' field.
+
+    Returns (query, fields, distance expression or None).
+    """
+    point = parse_point(params)
+    if point is None:
+        return query, fields, None
+    distance = distance_miles(*point)
+    return query.add_columns(distance.label('distance')), fields + ['distance'], distance
@@ -0,0 +1,71 @@
+from sqlalchemy import case, delete, func, select, update
+from models import Property, PropertyStats, ScrapeRun
+from datetime import datetime
+
+# Runs averaged over for /stats' typical run duration
+RECENT_RUNS = 20
+
+# Runs listed by GET /scrape-runs by default, and at most
+DEFAULT_RUN_LIMIT = 50
+MAX_RUN_LIMIT = 500
+
+def adjust_property_stats(db, total=0, favorited=0):
+    """Add to the stored property counts as part of db's transaction.
+
+    Call alongside every insert, delete or favorite change, before db.commit(), so
+    the counts move atomically with the rows.
+    """
+    if not total and not favorited:
+        return
+    db.execute(update(PropertyStats).where(PropertyStats.id == 1).values(
+        total=PropertyStats.total + total,
+        favorited=PropertyStats.favorited + favorited,
+        updated_at=datetime.utcnow()
+    ))
+
+def refresh_property_stats(conn):
+    """Recount the stored property counts from the properties table.
+
+    Only needed to initialize them or after changing properties outside the app.
+    """
+    total, favorited = conn.execute(select(
+        func.count(),
+        func.coalesce(func.sum(case((Property.favorited == True, 1), else_=0)), 0)
+    ).select_from(Property)).one()
+    conn.execute(delete(PropertyStats))
+    conn.execute(PropertyStats.__table__.insert().values(id=1, total=total, favorited=favorited, updated_at=datetime.utcnow()))
+
+def property_counts(db):
+    """(total, favorited) stored properties"""
+    row = db.query(PropertyStats.total, PropertyStats.favorited).filter(PropertyStats.id == 1).first()
+    return (row.total, row.favorited) if row else (0, 0)
+
+def scrape_run_summary(db, recent=RECENT_RUNS):
+    """Run counts by status, plus the average duration and throughput of the latest runs"""
+    counts = dict(db.query(ScrapeRun.status, func.count()).group_by(ScrapeRun.status).all())
+    latest = (db.query(ScrapeRun.duration_seconds, ScrapeRun.rows_processed)
+              .filter(ScrapeRun.status == 'succeeded')
+              .order_by(ScrapeRun.started_at.desc())
+              .limit(recent)
+              .subquery())
+    seconds, rows = db.query(func.sum(latest.c.duration_seconds), func.sum(latest.c.rows_processed)).one()
+    run_count = db.query(func.count()).select_from(latest).scalar()
+    return {
+        'total': sum(counts.values()),
+        'succeeded': counts.get('succeeded', 0),
+        'failed': counts.get('failed', 0),
+        'recent_average_seconds': round(seconds / run_count, 1) if run_count and seconds is not None else None,
+        'recent_rows_per_second': round(rows / seconds, 1) if seconds and rows is not None else None
+    }
+
+def parse_run_limit(limit):
+    """Number of runs to list, defaulting to DEFAULT_RUN_LIMIT"""
+    if limit is None or limit == '':
+        return DEFAULT_RUN_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {limit}")
+    if limit < 1:
+        raise ValueError("Limit must be at least 1")
+    return min(limit, MAX_RUN_LIMIT)
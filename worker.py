@@ -0,0 +1,70 @@
+from models import SessionLocal, create_tables
+from scraper import scraper, get_or_create_settings
+from leader import LeaderLease, LEASE_TTL_SECONDS
+from metrics import start_worker_metrics_server
+import atexit
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Renew well inside the TTL so a slow database round trip doesn't lose the lease
+LEASE_RENEW_SECONDS = max(1, LEASE_TTL_SECONDS // 3)
+
+def load_settings():
+    """Load settings from the database into the scraper, creating the defaults if needed"""
+    db = SessionLocal()
+    try:
+        scraper.load_settings_from_db(get_or_create_settings(db).to_dict())
+    finally:
+        db.close()
+
+def run(stop_event):
+    """Run the scheduler whenever this process holds the scheduler lease, until stop_event is set.
+
+    Any number of these may run (separate worker processes or threads inside web
+    servers); the database lease makes sure only one of them schedules scrapes.
+    """
+    create_tables()
+    load_settings()
+    lease = LeaderLease('scheduler')
+    logger.info(f"Scraper worker {lease.holder} waiting for the scheduler lease")
+    try:
+        while not stop_event.is_set():
+            if lease.try_acquire():
+                if not scraper.scheduler.running:
+                    logger.info(f"Scraper worker {lease.holder} acquired the scheduler lease")
+                    scraper.sync_settings()
+                    scraper.start_scheduler()
+            elif scraper.scheduler.running:
+                logger.warning(f"Scraper worker {lease.holder} lost the scheduler lease, stopping scheduler")
+                scraper.stop_scheduler()
+            stop_event.wait(LEASE_RENEW_SECONDS)
+    finally:
+        scraper.stop_scheduler()
+        lease.release()
+
+def run_in_background():
+    """Run the worker loop on a daemon thread, for single-process deployments (python app.py).
+
+    Returns the event that stops it.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run, args=(stop_event,), name='scraper-worker', daemon=True)
+    thread.start()
+    
+    # Release the lease on exit so a replacement process can take over right away
+    def stop():
+        stop_event.set()
+        thread.join(timeout=30)
+    atexit.register(stop)
+    return stop_event
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    start_worker_metrics_server()
+    run(stop_event)